@@ -0,0 +1,102 @@
+"""Asyncio API for uploading files or in-memory bytes from async services.
+
+Example:
+    async with B2Uploader("fal-bucket") as uploader:
+        url = await uploader.upload(image_bytes, "renders/001.png")
+        urls = await uploader.upload_many([(path, path.name) for path in paths], concurrency=8)
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from loguru import logger
+
+from .b2api import B2Api
+from .config import Config
+from .metadata import UploadMetadata
+from .upload import AUTO_CONTENT_TYPE, FileUploader
+
+UploadSource = Union[str, Path, bytes, bytearray, memoryview]
+
+
+class B2Uploader:
+    """Async upload client sharing one authorization and one connection per worker thread.
+
+    Transfers run on a private thread pool (the upload path is blocking
+    http.client), so the event loop is never blocked. Nothing is written to
+    USER-FILES: no output directories, logs or input scans.
+    """
+
+    def __init__(self, bucket_name: str, key_id: Optional[str] = None, application_key: Optional[str] = None,
+                 config: Optional[Config] = None, concurrency: int = 10, part_size: Optional[int] = None):
+        """Configure the client; credentials default to the B2 CLI's key or 1Password."""
+        self.bucket_name = bucket_name
+        self.key_id = key_id
+        self.application_key = application_key
+        self.config = config or Config()
+        self.concurrency = max(1, concurrency)
+        self.part_size = part_size
+        self._api: Optional[B2Api] = None
+        self._uploader: Optional[FileUploader] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self) -> 'B2Uploader':
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="b2-upload")
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._uploader = await self._run(self._connect)
+        self._api = self._uploader.api
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _connect(self) -> FileUploader:
+        """Authorize and resolve the bucket (runs on the worker pool)."""
+        if self.key_id and self.application_key:
+            api = B2Api(self.key_id, self.application_key, self.config.retry_attempts)
+            api.authorize()
+        else:
+            api = B2Api.from_config(self.config)
+        logger.debug(f"B2Uploader connected to bucket '{self.bucket_name}'")
+        return FileUploader(api, self.bucket_name, self.part_size,
+                            metadata=UploadMetadata(self.config.upload_metadata))
+
+    def _check_open(self) -> None:
+        """Raise unless the client is inside its `async with` block."""
+        if self._executor is None:
+            raise RuntimeError("B2Uploader must be used as 'async with B2Uploader(...)'")
+
+    async def _run(self, fn: Any, *args: Any) -> Any:
+        """Run a blocking call on the client's thread pool."""
+        self._check_open()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _upload_blocking(self, source: UploadSource, key: str, content_type: str) -> Dict[str, Any]:
+        """Upload a path or a bytes-like buffer."""
+        if isinstance(source, (str, Path)):
+            return self._uploader.upload_file(Path(source), key, content_type=content_type)
+        info = {"src_last_modified_millis": str(int(time.time() * 1000))}
+        return self._uploader.upload_bytes(bytes(source), key, info, content_type)
+
+    async def upload(self, source: UploadSource, key: str, content_type: str = AUTO_CONTENT_TYPE) -> str:
+        """Upload a file path or in-memory bytes to `key` and return its download URL."""
+        self._check_open()
+        async with self._semaphore:
+            await self._run(self._upload_blocking, source, key, content_type)
+        return self._api.file_url(self.bucket_name, key)
+
+    async def upload_many(self, items: Iterable[Tuple[UploadSource, str]],
+                          concurrency: Optional[int] = None) -> List[str]:
+        """Upload (source, key) pairs with at most `concurrency` in flight; URLs come back in input order."""
+        limiter = asyncio.Semaphore(concurrency or self.concurrency)
+
+        async def upload_one(source: UploadSource, key: str) -> str:
+            async with limiter:
+                return await self.upload(source, key)
+
+        return await asyncio.gather(*(upload_one(source, key) for source, key in items))
@@ -0,0 +1,141 @@
+"""Post-sync archiving: move verified uploads out of the input tree into 06.DONE."""
+
+import errno
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from loguru import logger
+
+from .engine import run_bounded
+from .hashcache import HashCache
+from .listing import PAGE_SIZE, ListingCache, RemoteFile
+
+# Constants
+ARCHIVABLE_ACTIONS = ('upload', 'update', 'skip')
+
+
+class ArchiveIndex:
+    """Keys whose local file was archived to 06.DONE; their bucket copies are kept, not mirrored away."""
+
+    def __init__(self, db_path: Path):
+        """Open (and create if needed) the index database."""
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS archived (key TEXT PRIMARY KEY, archived_at REAL);
+        """)
+
+    @classmethod
+    def for_bucket(cls, cache_dir: Path, bucket_name: str) -> 'ArchiveIndex':
+        """Open the archive index for a bucket."""
+        return cls(cache_dir / f"archive_{bucket_name}.sqlite")
+
+    def add(self, keys: List[str]) -> None:
+        """Record keys as archived."""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO archived VALUES (?, ?)", [(key, now) for key in keys])
+
+    def clear(self) -> None:
+        """Forget every archived key."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM archived")
+
+    def iter_keys(self) -> Iterator[str]:
+        """Stream archived keys in key order."""
+        last_key = ""
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    f"SELECT key FROM archived WHERE key > ? ORDER BY key LIMIT {PAGE_SIZE}", (last_key,)
+                ).fetchall()
+            yield from (row[0] for row in rows)
+            if len(rows) < PAGE_SIZE:
+                return
+            last_key = rows[-1][0]
+
+
+def without_archived(remote_files: Iterable[RemoteFile], archived_keys: Iterable[str]) -> Iterator[RemoteFile]:
+    """Anti-join two key-ordered streams: drop archived objects from a listing."""
+    keys = iter(archived_keys)
+    archived = next(keys, None)
+    for remote in remote_files:
+        while archived is not None and archived < remote.key:
+            archived = next(keys, None)
+        if remote.key != archived:
+            yield remote
+
+
+def protect_archived(plan: Iterable[Dict[str, Any]], done_dir: Path, index: ArchiveIndex) -> Iterator[Dict[str, Any]]:
+    """Drop planned deletes of keys whose file is in 06.DONE (guards against a lost or stale index)."""
+    for entry in plan:
+        if entry['action'] == 'delete' and (done_dir / entry['b2_key']).is_file():
+            logger.warning(f"Keeping {entry['b2_key']}: it is archived in {done_dir} but was missing from the index")
+            index.add([entry['b2_key']])
+            continue
+        yield entry
+
+
+class Archiver:
+    """Move files whose bucket copy matches them from the input tree into 06.DONE, preserving structure."""
+
+    def __init__(self, input_dir: Path, done_dir: Path, listing_cache: ListingCache,
+                 hash_cache: HashCache, index: ArchiveIndex, threads: int):
+        """Initialize with both trees, the caches used for verification and the archive index."""
+        self.input_dir = input_dir
+        self.done_dir = done_dir
+        self.listing_cache = listing_cache
+        self.hash_cache = hash_cache
+        self.index = index
+        self.threads = max(1, threads)
+
+    def archive(self, files_processed: List[Dict[str, Any]]) -> int:
+        """Archive every successfully synced file that verifies; returns how many were moved."""
+        candidates = [f for f in files_processed
+                      if f.get('status') == 'success' and f.get('action') in ARCHIVABLE_ACTIONS
+                      and 'variant_of' not in f]
+        archived = [key for key in run_bounded(self._archive_one, candidates, self.threads) if key]
+        self.index.add(archived)
+        self.hash_cache.flush()
+        self._prune_empty_dirs({(self.input_dir / key).parent for key in archived})
+        logger.info(f"Archived {len(archived)} files to {self.done_dir}")
+        return len(archived)
+
+    def _archive_one(self, entry: Dict[str, Any]) -> Optional[str]:
+        """Verify one file against its stored SHA1 and rename it into 06.DONE."""
+        key = entry['b2_key']
+        source, target = self.input_dir / key, self.done_dir / key
+        remote = self.listing_cache.get(key)
+        expected_sha1 = remote and (remote.src_sha1 or remote.sha1)
+        if not expected_sha1:
+            logger.debug(f"Not archiving {key}: no stored SHA1 to verify against")
+            return None
+        try:
+            if self.hash_cache.sha1_of(source) != expected_sha1:
+                logger.warning(f"Not archiving {key}: local content differs from the bucket copy")
+                return None
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.rename(source, target)
+        except OSError as e:
+            if e.errno == errno.EXDEV:
+                logger.error(f"Cannot archive {key}: {self.done_dir} must be on the same filesystem as the input")
+            else:
+                logger.error(f"Failed to archive {key}: {e}")
+            return None
+        entry['archived_to'] = str(target)
+        return key
+
+    def _prune_empty_dirs(self, directories: Iterable[Path]) -> None:
+        """Remove input directories left empty by archiving, deepest first."""
+        for directory in sorted(directories, key=lambda d: len(d.parts), reverse=True):
+            while directory != self.input_dir and self.input_dir in directory.parents:
+                try:
+                    directory.rmdir()
+                except OSError:
+                    break
+                directory = directory.parent
@@ -8,6 +8,9 @@ from loguru import logger
 
 from .config import Config
 
+# Constants
+RESOLVED_BUCKET_FILE = "resolved_bucket.json"
+
 
 class B2AuthError(Exception):
     """Custom exception for B2 authentication errors."""
@@ -179,4 +182,21 @@ def authenticate_b2(config: Config) -> B2Auth:
     """Convenience function to authenticate with B2."""
     auth = B2Auth(config)
     auth.authenticate()
-    return auth
\ No newline at end of file
+    return auth
+
+
+def save_resolved_bucket(cache_dir: Path, config: Config, bucket_name: str) -> None:
+    """Remember which bucket the configured name resolved to, for runs that skip authentication."""
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    with open(cache_dir / RESOLVED_BUCKET_FILE, 'w') as f:
+        json.dump({"config_bucket": config.bucket_name, "bucket": bucket_name}, f)
+
+
+def resolved_bucket(cache_dir: Path, config: Config) -> Optional[str]:
+    """The bucket saved by an earlier run for the current config, or None if unknown."""
+    try:
+        with open(cache_dir / RESOLVED_BUCKET_FILE) as f:
+            saved = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return saved.get("bucket") if saved.get("config_bucket") == config.bucket_name else None
@@ -0,0 +1,221 @@
+"""Run history and auto-tuning of upload concurrency and large-file part size."""
+
+import json
+import os
+import statistics
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from loguru import logger
+
+# Constants
+HISTORY_FILE_NAME = "run_history.jsonl"
+HISTORY_MAX_RUNS = 200  # Older runs are dropped when the history is appended to
+HISTORY_WINDOW = 20  # Recent runs considered when picking starting values
+SIZE_BUCKETS = (("small", 1024 * 1024), ("medium", 100 * 1024 * 1024), ("large", None))
+MAX_AUTO_THREADS = 64
+ADJUST_WINDOW_SECONDS = 15.0
+STEP_RATIO = 0.25
+RATE_TOLERANCE = 0.1  # Relative throughput change treated as noise
+MAX_ERROR_RATE = 0.05
+TARGET_PART_SECONDS = 30  # Aim for parts that take this long on one connection
+MIN_AUTO_PART_SIZE = 5 * 1024 * 1024  # B2 minimum part size
+MAX_AUTO_PART_SIZE = 1024 * 1024 * 1024
+BYTES_PER_MB = 1024 * 1024
+
+
+def size_bucket(size: int) -> str:
+    """Name of the file-size bucket a transfer falls in."""
+    for name, limit in SIZE_BUCKETS:
+        if limit is None or size < limit:
+            return name
+    return SIZE_BUCKETS[-1][0]
+
+
+class RunHistory:
+    """Compact per-run throughput measurements, one JSON line per run."""
+
+    def __init__(self, path: Path):
+        """Use the given history file (created on first record)."""
+        self.path = path
+
+    @classmethod
+    def for_dir(cls, cache_dir: Path) -> 'RunHistory':
+        """Open the run history kept in a cache directory."""
+        return cls(cache_dir / HISTORY_FILE_NAME)
+
+    def runs(self) -> List[Dict[str, Any]]:
+        """All recorded runs, oldest first (unreadable lines are skipped)."""
+        if not self.path.exists():
+            return []
+        runs = []
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    runs.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return runs
+
+    def record(self, run: Dict[str, Any]) -> None:
+        """Append one run, keeping only the most recent HISTORY_MAX_RUNS."""
+        runs = self.runs()[-(HISTORY_MAX_RUNS - 1):] + [run]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(temp_path, 'w') as f:
+            f.writelines(json.dumps(r, separators=(',', ':')) + "\n" for r in runs)
+        os.replace(temp_path, self.path)
+
+    def last_bytes_per_sec(self) -> Optional[float]:
+        """Upload throughput of the most recent run that transferred anything."""
+        for run in reversed(self.runs()):
+            if run.get('bytes_per_sec'):
+                return run['bytes_per_sec']
+        return None
+
+    def start_threads(self) -> Optional[int]:
+        """Median concurrency that recent auto-tuned runs settled on."""
+        finals = [run['threads'] for run in self.runs()[-HISTORY_WINDOW:] if run.get('auto_threads')]
+        return round(statistics.median(finals)) if finals else None
+
+    def stream_bytes_per_sec(self, bucket: str) -> Optional[float]:
+        """Recent single-connection throughput for one size bucket."""
+        total_bytes = total_seconds = 0.0
+        for run in self.runs()[-HISTORY_WINDOW:]:
+            stats = run.get('buckets', {}).get(bucket, {})
+            if stats.get('seconds'):
+                total_bytes += stats['bytes']
+                total_seconds += stats['seconds']
+        return total_bytes / total_seconds if total_seconds else None
+
+
+class AutoTuner:
+    """Pick starting values from run history and hill-climb concurrency while the run goes.
+
+    Every finished transfer is observed with its duration. Each window, the
+    concurrency keeps moving in the same direction while throughput improves,
+    turns back when it drops, and steps down when errors or stalls pile up.
+    Observations are kept per size bucket for the run history either way.
+    """
+
+    def __init__(self, history: RunHistory, threads: int, part_size: int,
+                 auto_threads: bool, auto_part_size: bool):
+        """Start from the configured values, replacing the 'auto' ones with what the history suggests."""
+        self.auto_threads = auto_threads
+        self.auto_part_size = auto_part_size
+        self.threads = min(history.start_threads() or threads, MAX_AUTO_THREADS) if auto_threads else threads
+        self.part_size = self._part_size_from(history, part_size) if auto_part_size else part_size
+        self.start_threads = self.threads
+        self.min_seen = self.max_seen = self.threads
+        self.adjustments = 0
+        self.buckets: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._direction = 1
+        self._last_rate: Optional[float] = None
+        self._reset_window()
+        if auto_threads or auto_part_size:
+            logger.info(f"Auto-tuning: starting with {self.threads} threads, "
+                        f"{self.part_size // BYTES_PER_MB} MB parts")
+
+    @staticmethod
+    def _part_size_from(history: RunHistory, default: int) -> int:
+        """Size parts so each takes about TARGET_PART_SECONDS at the measured large-file speed."""
+        rate = history.stream_bytes_per_sec("large")
+        if not rate:
+            return default
+        part_size = int(rate * TARGET_PART_SECONDS) // BYTES_PER_MB * BYTES_PER_MB
+        return max(MIN_AUTO_PART_SIZE, min(part_size, MAX_AUTO_PART_SIZE))
+
+    @property
+    def max_threads(self) -> int:
+        """Worker pool size: the ceiling when adjusting, else the fixed thread count."""
+        return MAX_AUTO_THREADS if self.auto_threads else self.threads
+
+    def concurrency(self) -> int:
+        """Transfers allowed in flight right now."""
+        return self.threads
+
+    def _reset_window(self) -> None:
+        """Start a new measurement window."""
+        self._window_start = time.monotonic()
+        self._window_bytes = self._window_files = self._window_errors = 0
+
+    def observe(self, entry: Dict[str, Any], seconds: float) -> None:
+        """Record one finished upload/update (including failed and requeued attempts)."""
+        size = entry.get('file_size_bytes', 0)
+        failed = entry['status'] in ('failed', 'requeue')
+        with self._lock:
+            stats = self.buckets.setdefault(size_bucket(size),
+                                            {'files': 0, 'bytes': 0, 'seconds': 0.0, 'errors': 0})
+            stats['files'] += 1
+            stats['seconds'] += seconds
+            stats['errors'] += failed
+            self._window_files += 1
+            self._window_errors += failed
+            if not failed:
+                stats['bytes'] += size
+                self._window_bytes += size
+            if self.auto_threads:
+                self._maybe_adjust()
+
+    def _maybe_adjust(self) -> None:
+        """Take one hill-climbing step once the window is long and full enough."""
+        elapsed = time.monotonic() - self._window_start
+        if elapsed < ADJUST_WINDOW_SECONDS or self._window_files < self.threads:
+            return
+        rate = self._window_bytes / elapsed
+        if self._window_errors / self._window_files > MAX_ERROR_RATE:
+            self._direction = -1
+        elif self._last_rate is not None and rate < self._last_rate * (1 - RATE_TOLERANCE):
+            self._direction = -self._direction or -1
+        elif self._last_rate is not None and rate <= self._last_rate * (1 + RATE_TOLERANCE):
+            self._direction = 0
+        elif self._direction == 0:
+            self._direction = 1
+        step = max(1, round(self.threads * STEP_RATIO)) * self._direction
+        threads = max(1, min(self.threads + step, MAX_AUTO_THREADS))
+        if threads != self.threads:
+            logger.debug(f"Auto-tuning: {self.threads} -> {threads} threads "
+                         f"({rate / BYTES_PER_MB:.2f} MB/s, {self._window_errors} errors)")
+            self.threads = threads
+            self.adjustments += 1
+            self.min_seen, self.max_seen = min(self.min_seen, threads), max(self.max_seen, threads)
+        self._last_rate = rate
+        self._reset_window()
+
+    def summary(self) -> Dict[str, Any]:
+        """Chosen values for the run log."""
+        return {
+            'auto_threads': self.auto_threads,
+            'auto_part_size': self.auto_part_size,
+            'threads_start': self.start_threads,
+            'threads_final': self.threads,
+            'threads_min': self.min_seen,
+            'threads_max': self.max_seen,
+            'adjustments': self.adjustments,
+            'part_size_bytes': self.part_size
+        }
+
+
+def summarize_run(files_processed: List[Dict[str, Any]], execution_time: float, engine: str,
+                  tuner: Optional[AutoTuner] = None) -> Dict[str, Any]:
+    """One run's history record: throughput, error rate and (native engine) per-bucket stream speeds."""
+    transfers = [f for f in files_processed if f.get('action') in ('upload', 'update') and 'variant_of' not in f]
+    succeeded = [f for f in transfers if f.get('status') == 'success']
+    transferred = sum(f.get('file_size_bytes', 0) for f in succeeded)
+    run: Dict[str, Any] = {
+        'time': round(time.time()),
+        'engine': engine,
+        'files': len(succeeded),
+        'bytes': transferred,
+        'seconds': round(execution_time, 3),
+        'files_per_sec': round(len(succeeded) / execution_time, 3) if execution_time > 0 else 0,
+        'bytes_per_sec': round(transferred / execution_time) if execution_time > 0 else 0,
+        'error_rate': round((len(transfers) - len(succeeded)) / len(transfers), 4) if transfers else 0
+    }
+    if tuner is not None:
+        run.update(threads=tuner.threads, part_size=tuner.part_size, auto_threads=tuner.auto_threads,
+                   buckets={name: {**stats, 'seconds': round(stats['seconds'], 3)}
+                            for name, stats in tuner.buckets.items()})
+    return run
@@ -0,0 +1,296 @@
+"""Minimal client for the Backblaze B2 native API."""
+
+import base64
+import http.client
+import json
+import socket
+import subprocess
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import quote, urlsplit
+from loguru import logger
+
+from .config import Config
+
+# Constants
+AUTHORIZE_URL = "https://api.backblazeb2.com/b2api/v2/b2_authorize_account"
+API_PATH = "/b2api/v2/"
+HTTP_TIMEOUT_SECONDS = 120
+RETRYABLE_STATUSES = {408, 429, 500, 503}
+
+
+class _NoDelayConnection(http.client.HTTPConnection):
+    """HTTP connection with Nagle disabled, since headers and body are sent in separate writes."""
+
+    def connect(self) -> None:
+        super().connect()
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class _NoDelayHTTPSConnection(http.client.HTTPSConnection):
+    """HTTPS variant of _NoDelayConnection."""
+
+    def connect(self) -> None:
+        super().connect()
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class B2ApiError(Exception):
+    """Error response returned by the B2 native API."""
+
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(f"{status} {code}: {message}")
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+class B2Api:
+    """Thin B2 native API client keeping one HTTPS connection per host and thread."""
+
+    def __init__(self, key_id: str, application_key: str, retry_attempts: int = 3):
+        """Initialize with application key credentials."""
+        self.key_id = key_id
+        self.application_key = application_key
+        self.retry_attempts = max(1, retry_attempts)
+        self.account_id = ""
+        self.api_url = ""
+        self.download_url = ""
+        self.auth_token = ""
+        self.recommended_part_size = 100 * 1024 * 1024
+        self.allowed: Dict[str, Any] = {}
+        self._bucket_ids: Dict[str, str] = {}
+        self._auth_lock = threading.Lock()
+        self._local = threading.local()
+
+    @classmethod
+    def from_config(cls, config: Config) -> 'B2Api':
+        """Create an authorized client using the key the B2 CLI is authorized with."""
+        key_id, application_key = _read_cli_credentials()
+        if not key_id or not application_key:
+            from .auth import B2Auth
+            credentials = B2Auth(config).get_1password_credentials()
+            key_id, application_key = credentials['keyID'], credentials['applicationKey']
+        api = cls(key_id, application_key, config.retry_attempts)
+        api.authorize()
+        return api
+
+    def authorize(self) -> None:
+        """Authorize the account and store API/download URLs and token."""
+        basic = base64.b64encode(f"{self.key_id}:{self.application_key}".encode()).decode()
+        status, _, body = self.request("GET", AUTHORIZE_URL, {"Authorization": f"Basic {basic}"})
+        data = _decode_json(status, body)
+        with self._auth_lock:
+            self.account_id = data['accountId']
+            self.api_url = data['apiUrl']
+            self.download_url = data['downloadUrl']
+            self.auth_token = data['authorizationToken']
+            self.recommended_part_size = data.get('recommendedPartSize', self.recommended_part_size)
+            self.allowed = data.get('allowed') or {}
+        logger.debug(f"Authorized B2 native API at {self.api_url}")
+
+    def _connection(self, scheme: str, host: str) -> http.client.HTTPConnection:
+        """Get this thread's keep-alive connection for a host."""
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        key = (scheme, host)
+        if key not in connections:
+            connection_class = _NoDelayHTTPSConnection if scheme == 'https' else _NoDelayConnection
+            connections[key] = connection_class(host, timeout=HTTP_TIMEOUT_SECONDS)
+        return connections[key]
+
+    def _drop_connection(self, scheme: str, host: str) -> None:
+        """Close and forget this thread's connection for a host."""
+        connection = getattr(self._local, 'connections', {}).pop((scheme, host), None)
+        if connection is not None:
+            connection.close()
+
+    def connection_for(self, url: str) -> http.client.HTTPConnection:
+        """Get the connection this thread will use for a URL."""
+        parts = urlsplit(url)
+        return self._connection(parts.scheme, parts.netloc)
+
+    def reset_connections(self) -> None:
+        """Close this thread's connections, e.g. after abandoning a half-read response."""
+        for connection in getattr(self._local, 'connections', {}).values():
+            connection.close()
+        self._local.connections = {}
+
+    def request(self, method: str, url: str, headers: Dict[str, str],
+                body: Any = None) -> Tuple[int, Dict[str, str], bytes]:
+        """Send a single HTTP request over the pooled connection for the URL's host."""
+        parts = urlsplit(url)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        connection = self._connection(parts.scheme, parts.netloc)
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self._drop_connection(parts.scheme, parts.netloc)
+            raise
+        return response.status, {k.lower(): v for k, v in response.getheaders()}, data
+
+    def open_stream(self, url: str, headers: Dict[str, str]) -> http.client.HTTPResponse:
+        """Start a GET whose body the caller streams; it must be read fully before reusing the thread's connection."""
+        parts = urlsplit(url)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        connection = self._connection(parts.scheme, parts.netloc)
+        try:
+            connection.request("GET", path, headers=headers)
+            return connection.getresponse()
+        except (OSError, http.client.HTTPException):
+            self._drop_connection(parts.scheme, parts.netloc)
+            raise
+
+    def call(self, api_name: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Call a JSON API operation, retrying transient failures and expired tokens."""
+        body = json.dumps(payload).encode()
+        for attempt in range(1, self.retry_attempts + 1):
+            headers = {"Authorization": self.auth_token, "Content-Type": "application/json"}
+            try:
+                status, _, data = self.request("POST", f"{self.api_url}{API_PATH}{api_name}", headers, body)
+                return _decode_json(status, data)
+            except B2ApiError as e:
+                if attempt == self.retry_attempts or not self._should_retry(e):
+                    raise
+            except (OSError, http.client.HTTPException) as e:
+                if attempt == self.retry_attempts:
+                    raise B2ApiError(0, 'connection_error', str(e))
+            logger.debug(f"Retrying {api_name} (attempt {attempt + 1}/{self.retry_attempts})")
+            time.sleep(min(2 ** attempt, 30))
+        raise B2ApiError(0, 'retries_exhausted', api_name)
+
+    def _should_retry(self, error: B2ApiError) -> bool:
+        """Decide whether an API error is transient, re-authorizing on expired tokens."""
+        if error.status == 401 and error.code in ('expired_auth_token', 'bad_auth_token'):
+            self.authorize()
+            return True
+        return error.status in RETRYABLE_STATUSES
+
+    def get_bucket_id(self, bucket_name: str) -> str:
+        """Resolve and cache the bucket ID for a bucket name."""
+        if bucket_name not in self._bucket_ids:
+            if self.allowed.get('bucketName') == bucket_name and self.allowed.get('bucketId'):
+                self._bucket_ids[bucket_name] = self.allowed['bucketId']
+            else:
+                data = self.call("b2_list_buckets", {"accountId": self.account_id, "bucketName": bucket_name})
+                buckets = data.get('buckets', [])
+                if not buckets:
+                    raise B2ApiError(404, 'bucket_not_found', f"Bucket '{bucket_name}' not found")
+                self._bucket_ids[bucket_name] = buckets[0]['bucketId']
+        return self._bucket_ids[bucket_name]
+
+    def list_file_names(self, bucket_id: str, start_file_name: Optional[str] = None,
+                        prefix: str = "", delimiter: Optional[str] = None,
+                        max_file_count: int = 10000) -> Dict[str, Any]:
+        """Fetch one page of file names in key order."""
+        payload: Dict[str, Any] = {"bucketId": bucket_id, "maxFileCount": max_file_count, "prefix": prefix}
+        if start_file_name:
+            payload["startFileName"] = start_file_name
+        if delimiter:
+            payload["delimiter"] = delimiter
+        return self.call("b2_list_file_names", payload)
+
+    def list_file_versions(self, bucket_id: str, start_file_name: Optional[str] = None,
+                           start_file_id: Optional[str] = None, prefix: str = "",
+                           max_file_count: int = 10000) -> Dict[str, Any]:
+        """Fetch one page of file versions in key order, newest version of each key first."""
+        payload: Dict[str, Any] = {"bucketId": bucket_id, "maxFileCount": max_file_count, "prefix": prefix}
+        if start_file_name:
+            payload["startFileName"] = start_file_name
+            if start_file_id:
+                payload["startFileId"] = start_file_id
+        return self.call("b2_list_file_versions", payload)
+
+    def get_upload_url(self, bucket_id: str) -> Dict[str, Any]:
+        """Get an upload URL and token for single-part uploads."""
+        return self.call("b2_get_upload_url", {"bucketId": bucket_id})
+
+    def start_large_file(self, bucket_id: str, file_name: str, content_type: str,
+                         file_info: Dict[str, str]) -> Dict[str, Any]:
+        """Start a multi-part upload."""
+        return self.call("b2_start_large_file", {
+            "bucketId": bucket_id, "fileName": file_name,
+            "contentType": content_type, "fileInfo": file_info
+        })
+
+    def get_upload_part_url(self, file_id: str) -> Dict[str, Any]:
+        """Get an upload URL and token for the parts of a large file."""
+        return self.call("b2_get_upload_part_url", {"fileId": file_id})
+
+    def finish_large_file(self, file_id: str, part_sha1s: list) -> Dict[str, Any]:
+        """Assemble uploaded parts into the final file."""
+        return self.call("b2_finish_large_file", {"fileId": file_id, "partSha1Array": part_sha1s})
+
+    def cancel_large_file(self, file_id: str) -> None:
+        """Abandon a multi-part upload."""
+        self.call("b2_cancel_large_file", {"fileId": file_id})
+
+    def delete_file_version(self, file_name: str, file_id: str) -> Dict[str, Any]:
+        """Delete one version of a file."""
+        return self.call("b2_delete_file_version", {"fileName": file_name, "fileId": file_id})
+
+    def hide_file(self, bucket_id: str, file_name: str) -> Dict[str, Any]:
+        """Hide a file name behind a new hide marker, keeping its versions."""
+        return self.call("b2_hide_file", {"bucketId": bucket_id, "fileName": file_name})
+
+    def copy_file(self, source_file_id: str, file_name: str, content_type: str,
+                  file_info: Dict[str, str]) -> Dict[str, Any]:
+        """Copy a file server-side as a new version, replacing its content type and file info."""
+        return self.call("b2_copy_file", {
+            "sourceFileId": source_file_id, "fileName": file_name, "metadataDirective": "REPLACE",
+            "contentType": content_type, "fileInfo": file_info
+        })
+
+    def get_download_authorization(self, bucket_id: str, file_name_prefix: str, valid_seconds: int) -> str:
+        """Get a token that authorizes downloads of every file under a prefix."""
+        return self.call("b2_get_download_authorization", {
+            "bucketId": bucket_id, "fileNamePrefix": file_name_prefix,
+            "validDurationInSeconds": valid_seconds
+        })["authorizationToken"]
+
+    def open_download(self, bucket_name: str, key: str,
+                      byte_range: Optional[Tuple[int, int]] = None) -> http.client.HTTPResponse:
+        """Open a streaming download of a file by name, optionally for an inclusive byte range."""
+        headers = {"Authorization": self.auth_token}
+        if byte_range:
+            headers["Range"] = f"bytes={byte_range[0]}-{byte_range[1]}"
+        response = self.open_stream(self.file_url(bucket_name, key), headers)
+        if response.status not in (200, 206):
+            raise B2ApiError(response.status, 'download_failed', response.read()[:200].decode(errors='replace'))
+        return response
+
+    def file_url(self, bucket_name: str, key: str) -> str:
+        """Build the friendly download URL for a key."""
+        return f"{self.download_url}/file/{bucket_name}/{quote(key, safe='/')}"
+
+
+def _decode_json(status: int, body: bytes) -> Dict[str, Any]:
+    """Decode a JSON API response, raising B2ApiError for error statuses."""
+    try:
+        data = json.loads(body.decode() or "{}")
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        data = {}
+    if status != 200:
+        raise B2ApiError(status, data.get('code', 'unknown'), data.get('message', body[:200].decode(errors='replace')))
+    return data
+
+
+def _read_cli_credentials() -> Tuple[str, str]:
+    """Read the application key the B2 CLI is currently authorized with."""
+    try:
+        result = subprocess.run(
+            [Config.B2_CLI, "account", "get"],
+            capture_output=True,
+            text=True,
+            timeout=30
+        )
+        if result.returncode == 0:
+            account = json.loads(result.stdout)
+            return account.get('applicationKeyId', ''), account.get('applicationKey', '')
+    except (subprocess.TimeoutExpired, FileNotFoundError, TypeError, json.JSONDecodeError):
+        pass
+    return "", ""
@@ -38,7 +38,12 @@ def main() -> int:
 Examples:
   python -m src.cli                    # Sync files to B2 bucket
   python -m src.cli sync               # Explicit sync operation  
-  python -m src.cli sync --dry-run     # Preview sync without making changes
+  python -m src.cli sync --dry-run     # Preview sync from the cached bucket listing
+  python -m src.cli sync --dry-run --verify-remote  # Preview after re-listing the bucket
+  python -m src.cli sync --shared-dir /mnt/shared/b2sync  # Run as one worker of a distributed sync
+  python -m src.cli verify             # Compare bucket SHA1s with local files
+  python -m src.cli restore            # Download the bucket back into 04.INPUT
+  python -m src.cli restamp --dry-run  # Preview applying upload_metadata rules to existing objects
   python -m src.cli clean              # Remove all files from bucket (with confirmation)
   python -m src.cli clean --force      # Remove all files without confirmation
   python -m src.cli clean --dry-run    # Preview clean without making changes
@@ -70,6 +75,30 @@ Examples:
         action='store_true',
         help='Preview changes without making them'
     )
+    sync_parser.add_argument(
+        '--verify-remote',
+        action='store_true',
+        help='With --dry-run, re-list the bucket instead of trusting the cached listing'
+    )
+    sync_parser.add_argument(
+        '--cli-dry-run',
+        action='store_true',
+        help='With --dry-run, run the full b2 sync --dry-run instead of the local planner'
+    )
+    sync_parser.add_argument(
+        '--shared-dir',
+        type=Path,
+        help='Join a distributed sync: shared directory holding the shard leases and results'
+    )
+    sync_parser.add_argument(
+        '--shards',
+        type=int,
+        help='With --shared-dir, number of key-hash shards for a new run (default: from config)'
+    )
+    sync_parser.add_argument(
+        '--worker-id',
+        help='With --shared-dir, this worker\'s name (default: hostname-pid)'
+    )
     
     # Clean command
     clean_parser = subparsers.add_parser(
@@ -87,6 +116,45 @@ Examples:
         help='Preview what would be deleted without making changes'
     )
     
+    # Verify command
+    subparsers.add_parser(
+        'verify',
+        help='Check bucket contents against USER-FILES/04.INPUT/ using stored SHA1s'
+    )
+    
+    # Restore command
+    restore_parser = subparsers.add_parser(
+        'restore',
+        help='Download bucket contents back into USER-FILES/04.INPUT/ (or 06.DONE/)'
+    )
+    restore_parser.add_argument(
+        '--target',
+        choices=['input', 'done'],
+        default='input',
+        help='Directory to restore into (default: input)'
+    )
+    restore_parser.add_argument(
+        '--prefix',
+        default='',
+        help='Only restore keys starting with this prefix'
+    )
+    
+    # Restamp command
+    restamp_parser = subparsers.add_parser(
+        'restamp',
+        help='Apply upload_metadata rules to existing objects by server-side copy (no re-upload)'
+    )
+    restamp_parser.add_argument(
+        '--prefix',
+        default='',
+        help='Only re-stamp keys starting with this prefix'
+    )
+    restamp_parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Report which objects would be re-stamped without copying them'
+    )
+    
     # Init-config command
     subparsers.add_parser(
         'init-config',
@@ -105,6 +173,11 @@ Examples:
     if not args.command:
         args.command = 'sync'
         args.dry_run = False
+        args.verify_remote = False
+        args.cli_dry_run = False
+        args.shared_dir = None
+        args.shards = None
+        args.worker_id = None
     
     try:
         if args.command == 'init-config':
@@ -117,7 +190,26 @@ Examples:
             
         elif args.command == 'sync':
             syncer = B2Sync(config)
-            return syncer.sync_operation(dry_run=args.dry_run)
+            return syncer.sync_operation(
+                dry_run=args.dry_run,
+                verify_remote=args.verify_remote,
+                cli_dry_run=args.cli_dry_run,
+                shared_dir=args.shared_dir,
+                shards=args.shards,
+                worker_id=args.worker_id
+            )
+            
+        elif args.command == 'verify':
+            syncer = B2Sync(config)
+            return syncer.verify_operation()
+            
+        elif args.command == 'restore':
+            syncer = B2Sync(config)
+            return syncer.restore_operation(target=args.target, prefix=args.prefix)
+            
+        elif args.command == 'restamp':
+            syncer = B2Sync(config)
+            return syncer.restamp_operation(prefix=args.prefix, dry_run=args.dry_run)
             
         elif args.command == 'clean':
             syncer = B2Sync(config)
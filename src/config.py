@@ -20,23 +20,54 @@ class Config:
             "sync_threads": 10,
             "retry_attempts": 3,
             "sync_timeout": 1800,
-            "max_file_size_gb": 5
+            "max_file_size_gb": 5,
+            "listing_threads": 8,
+            "listing_cache_max_age": 3600,
+            "upload_engine": "cli",
+            "part_size_mb": 100,
+            "stall_min_bytes_per_sec": 10240,
+            "stall_window_seconds": 30,
+            "max_requeues": 3,
+            "distributed_shards": 64,
+            "lease_seconds": 300,
+            "archive_after_sync": False,
+            "link_mode": "public",
+            "link_validity_seconds": 604800,
+            "keep_versions": 0,
+            "keep_version_days": 0
         },
         "1password": {
             "item_name": "B2 Application Key Fal"
         },
         "processing": {
             "supported_formats": [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".webp"],
-            "exclude_patterns": [r".*\.DS_Store", r".*Thumbs\.db"]
+            "exclude_patterns": [r".*\.DS_Store", r".*Thumbs\.db"],
+            "optimize_images": False,
+            "jpeg_quality": 85,
+            "optimize_processes": 0,
+            "thumbnail_sizes": [],
+            "thumbnail_format": "webp",
+            "thumbnail_prefix": "_thumbs/",
+            "upload_metadata": []
+        },
+        "logging": {
+            "log_format": "json",
+            "log_compression": "none"
         }
     }
     
+    # Starting values for 'auto' settings until run history exists
+    AUTO_START_THREADS = 10
+    AUTO_START_PART_SIZE_MB = 100
+    
     # Directory Settings (following new structure)
     PROJECT_ROOT = Path(__file__).parent.parent
     USER_FILES = PROJECT_ROOT / "USER-FILES"
     CONFIG_DIR = USER_FILES / "01.CONFIG"
     INPUT_DIR = USER_FILES / "04.INPUT"
     OUTPUT_DIR = USER_FILES / "05.OUTPUT"
+    DONE_DIR = USER_FILES / "06.DONE"
+    CACHE_DIR = USER_FILES / "07.TEMP"
     
     # Config file path
     CONFIG_FILE = CONFIG_DIR / "b2_sync_config.yml"
@@ -92,8 +123,14 @@ class Config:
     
     @property
     def sync_threads(self) -> int:
-        """Get number of sync threads."""
-        return self.config_data["b2"]["sync_threads"]
+        """Get number of sync threads (the starting value when set to 'auto')."""
+        threads = self.config_data["b2"]["sync_threads"]
+        return self.AUTO_START_THREADS if threads == "auto" else threads
+    
+    @property
+    def auto_sync_threads(self) -> bool:
+        """Get whether upload concurrency is tuned from run history and adjusted during native runs."""
+        return self.config_data["b2"]["sync_threads"] == "auto"
     
     @property
     def retry_attempts(self) -> int:
@@ -111,11 +148,133 @@ class Config:
         BYTES_PER_GB = 1024 * 1024 * 1024
         return self.config_data["b2"]["max_file_size_gb"] * BYTES_PER_GB
     
+    @property
+    def listing_threads(self) -> int:
+        """Get number of concurrent bucket listing shards."""
+        return self.config_data["b2"]["listing_threads"]
+    
+    @property
+    def listing_cache_max_age(self) -> int:
+        """Get max age in seconds before the cached bucket listing is re-fetched."""
+        return self.config_data["b2"]["listing_cache_max_age"]
+    
+    @property
+    def upload_engine(self) -> str:
+        """Get upload engine: 'cli' (b2 sync) or 'native' (streaming native API uploads)."""
+        return self.config_data["b2"]["upload_engine"]
+    
+    @property
+    def part_size(self) -> int:
+        """Get large-file part size in bytes (the starting value when set to 'auto')."""
+        BYTES_PER_MB = 1024 * 1024
+        part_size_mb = self.config_data["b2"]["part_size_mb"]
+        return (self.AUTO_START_PART_SIZE_MB if part_size_mb == "auto" else part_size_mb) * BYTES_PER_MB
+    
+    @property
+    def auto_part_size(self) -> bool:
+        """Get whether the large-file part size is picked from measured large-file throughput."""
+        return self.config_data["b2"]["part_size_mb"] == "auto"
+    
+    @property
+    def stall_min_bytes_per_sec(self) -> int:
+        """Get the throughput below which an in-flight upload counts as stalled."""
+        return self.config_data["b2"]["stall_min_bytes_per_sec"]
+    
+    @property
+    def stall_window_seconds(self) -> int:
+        """Get how long an upload may stay below the stall threshold before it is aborted."""
+        return self.config_data["b2"]["stall_window_seconds"]
+    
+    @property
+    def max_requeues(self) -> int:
+        """Get how many times a stalled upload is requeued before it is reported as failed."""
+        return self.config_data["b2"]["max_requeues"]
+    
+    @property
+    def distributed_shards(self) -> int:
+        """Get how many key-hash shards a new distributed sync run is split into."""
+        return self.config_data["b2"]["distributed_shards"]
+    
+    @property
+    def lease_seconds(self) -> int:
+        """Get how long a distributed worker's shard lease lasts without renewal."""
+        return self.config_data["b2"]["lease_seconds"]
+    
+    @property
+    def archive_after_sync(self) -> bool:
+        """Get whether verified uploads are moved from 04.INPUT into 06.DONE after a sync."""
+        return self.config_data["b2"]["archive_after_sync"]
+    
+    @property
+    def link_mode(self) -> str:
+        """Get link mode: 'public' URLs or 'authorized' URLs carrying a download token."""
+        return self.config_data["b2"]["link_mode"]
+    
+    @property
+    def link_validity_seconds(self) -> int:
+        """Get how long authorized links stay valid (B2 allows at most one week)."""
+        return self.config_data["b2"]["link_validity_seconds"]
+    
+    @property
+    def keep_versions(self) -> int:
+        """Get versions kept per file, counting the current one (0 = no count limit)."""
+        return self.config_data["b2"]["keep_versions"]
+    
+    @property
+    def keep_version_days(self) -> int:
+        """Get days replaced or hidden versions are kept (0 = no age limit)."""
+        return self.config_data["b2"]["keep_version_days"]
+    
     @property
     def exclude_patterns(self) -> list:
         """Get file exclusion patterns."""
         return self.config_data["processing"]["exclude_patterns"]
     
+    @property
+    def optimize_images(self) -> bool:
+        """Get whether images are re-encoded before upload (native engine, requires Pillow)."""
+        return self.config_data["processing"]["optimize_images"]
+    
+    @property
+    def jpeg_quality(self) -> int:
+        """Get the JPEG quality used when optimizing images."""
+        return self.config_data["processing"]["jpeg_quality"]
+    
+    @property
+    def optimize_processes(self) -> int:
+        """Get number of image optimization processes (0 = one per CPU core)."""
+        return self.config_data["processing"]["optimize_processes"]
+    
+    @property
+    def thumbnail_sizes(self) -> list:
+        """Get thumbnail bounding-box sizes in pixels (empty disables thumbnails)."""
+        return self.config_data["processing"]["thumbnail_sizes"]
+    
+    @property
+    def thumbnail_format(self) -> str:
+        """Get thumbnail image format: 'webp', 'jpeg' or 'png'."""
+        return self.config_data["processing"]["thumbnail_format"]
+    
+    @property
+    def thumbnail_prefix(self) -> str:
+        """Get the key prefix thumbnails are uploaded under, mirroring the original keys."""
+        return self.config_data["processing"]["thumbnail_prefix"]
+    
+    @property
+    def upload_metadata(self) -> list:
+        """Get per-pattern upload metadata rules (pattern, content_type, cache_control, content_disposition)."""
+        return self.config_data["processing"]["upload_metadata"]
+    
+    @property
+    def log_format(self) -> str:
+        """Get run log format: 'json' (one document) or 'ndjson' (one record per line)."""
+        return self.config_data["logging"]["log_format"]
+    
+    @property
+    def log_compression(self) -> str:
+        """Get run log compression: 'none', 'gzip' or 'zstd' (requires zstandard)."""
+        return self.config_data["logging"]["log_compression"]
+    
     @classmethod
     def get_input_path(cls) -> Path:
         """Get the input directory path."""
@@ -126,6 +285,16 @@ class Config:
         """Get the output directory path."""
         return cls.OUTPUT_DIR
     
+    @classmethod
+    def get_done_path(cls) -> Path:
+        """Get the directory for files that are done being synced."""
+        return cls.DONE_DIR
+    
+    @classmethod
+    def get_cache_path(cls) -> Path:
+        """Get the directory holding local caches (bucket listing, indexes)."""
+        return cls.CACHE_DIR
+    
     @classmethod
     def validate_environment(cls) -> bool:
         """Validate that required tools and directories are available."""
@@ -0,0 +1,355 @@
+"""Multi-node sync: shard the plan by key hash and coordinate workers through leases on shared storage."""
+
+import hashlib
+import json
+import os
+import re
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from loguru import logger
+
+from .config import Config
+from .engine import NativeSyncEngine
+from .listing import RemoteListing
+from .session import SyncSession
+from .upload import FileUploader
+from .utils import create_timestamped_output_dir
+from .watchdog import TransferWatchdog
+
+# Constants
+LEASE_DB_NAME = "leases.sqlite"
+BUSY_TIMEOUT_SECONDS = 60
+POLL_INTERVAL_SECONDS = 10
+SPILL_BATCH_SIZE = 10000  # Plan entries buffered before they are appended to the shard files
+
+
+def shard_of(key: str, shards: int) -> int:
+    """Stable shard number for a B2 key, identical on every node."""
+    return int.from_bytes(hashlib.sha1(key.encode('utf-8')).digest()[:8], 'big') % shards
+
+
+class ShardPlans:
+    """A sync plan split by key-hash shard in one pass and spilled to a local NDJSON file per shard.
+
+    The plan is built when the first shard's entries are requested, so a
+    worker scans the input tree and reads the listing at most once per run.
+    """
+
+    def __init__(self, plan: Callable[[], Iterable[Dict[str, Any]]], shards: int):
+        """Initialize with a factory for the key-ordered plan and the run's shard count."""
+        self.plan = plan
+        self.shards = shards
+        self._dir: Optional[tempfile.TemporaryDirectory] = None
+
+    def __enter__(self) -> 'ShardPlans':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self._dir is not None:
+            self._dir.cleanup()
+
+    def _path(self, shard: int) -> Path:
+        """Spill file holding one shard's entries."""
+        return Path(self._dir.name) / f"shard-{shard:04d}.ndjson"
+
+    def _split(self) -> None:
+        """Route every plan entry to its shard's file, appending in batches (key order is kept)."""
+        self._dir = tempfile.TemporaryDirectory(prefix="b2sync_shards_")
+        buffered: Dict[int, List[str]] = {}
+        count = 0
+        for entry in self.plan():
+            buffered.setdefault(shard_of(entry['b2_key'], self.shards), []).append(json.dumps(entry) + "\n")
+            count += 1
+            if count >= SPILL_BATCH_SIZE:
+                self._flush(buffered)
+                buffered, count = {}, 0
+        self._flush(buffered)
+        logger.debug(f"Split the sync plan into {self.shards} shards in {self._dir.name}")
+
+    def _flush(self, buffered: Dict[int, List[str]]) -> None:
+        """Append buffered entries to their shard files."""
+        for shard, lines in buffered.items():
+            with open(self._path(shard), 'a') as f:
+                f.writelines(lines)
+
+    def entries(self, shard: int) -> Iterator[Dict[str, Any]]:
+        """Stream one shard's plan entries in key order."""
+        if self._dir is None:
+            self._split()
+        path = self._path(shard)
+        if not path.exists():
+            return
+        with open(path) as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def default_worker_id() -> str:
+    """Worker id unique to this process: host name plus PID."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def result_path(results_dir: Path, shard: int, worker_id: str) -> Path:
+    """NDJSON results file for a shard as synced by one worker."""
+    safe_worker = re.sub(r'[^\w.-]', '_', worker_id)
+    return results_dir / f"shard-{shard:04d}.{safe_worker}.ndjson"
+
+
+class LeaseStore:
+    """Shard leases for a distributed run, kept in a SQLite database on shared storage.
+
+    The rollback journal is used instead of WAL (which needs shared memory and
+    breaks over network filesystems); every change runs in BEGIN IMMEDIATE so
+    the database file lock serializes the workers.
+    """
+
+    def __init__(self, db_path: Path):
+        """Open (and create if needed) the lease database."""
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(db_path), timeout=BUSY_TIMEOUT_SECONDS,
+                                    isolation_level=None, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.executescript("""
+            PRAGMA journal_mode=DELETE;
+            CREATE TABLE IF NOT EXISTS run (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                run_id TEXT,
+                shards INTEGER,
+                started_at REAL,
+                merged_by TEXT
+            );
+            CREATE TABLE IF NOT EXISTS shards (
+                shard INTEGER PRIMARY KEY,
+                status TEXT,
+                worker_id TEXT,
+                lease_expires REAL
+            );
+        """)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run a block under the database's write lock."""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def join_run(self, shards: Optional[int], default_shards: int) -> Tuple[str, int, float]:
+        """Join the unmerged run in progress, or start a new one; returns (run_id, shards, started_at)."""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT run_id, shards, started_at, merged_by FROM run").fetchone()
+            if row and row[3] is None:
+                if shards is not None and shards != row[1]:
+                    raise ValueError(f"Run {row[0]} in progress uses {row[1]} shards, not {shards}")
+                return row[0], row[1], row[2]
+            shards = shards or default_shards
+            run_id, started_at = datetime.now().strftime("%Y%m%d_%H%M%S"), time.time()
+            conn.execute("INSERT OR REPLACE INTO run VALUES (1, ?, ?, ?, NULL)", (run_id, shards, started_at))
+            conn.execute("DELETE FROM shards")
+            conn.executemany("INSERT INTO shards VALUES (?, 'open', NULL, 0)", ((s,) for s in range(shards)))
+            logger.info(f"Started distributed run {run_id} with {shards} shards")
+            return run_id, shards, started_at
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[int]:
+        """Lease an open shard, or one whose lease has expired, to this worker."""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT shard, worker_id FROM shards "
+                "WHERE status = 'open' OR (status = 'leased' AND lease_expires < ?) ORDER BY shard LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1]:
+                logger.warning(f"Lease on shard {row[0]} held by {row[1]} expired, taking it over")
+            conn.execute("UPDATE shards SET status = 'leased', worker_id = ?, lease_expires = ? WHERE shard = ?",
+                         (worker_id, now + lease_seconds, row[0]))
+            return row[0]
+
+    def renew(self, shard: int, worker_id: str, lease_seconds: float) -> bool:
+        """Extend this worker's lease; False if the lease was lost to another worker."""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE shards SET lease_expires = ? WHERE shard = ? AND worker_id = ? AND status = 'leased'",
+                (time.time() + lease_seconds, shard, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, shard: int, worker_id: str) -> bool:
+        """Mark a shard done if this worker still holds its lease."""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE shards SET status = 'done' WHERE shard = ? AND worker_id = ? AND status = 'leased'",
+                (shard, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def remaining(self) -> int:
+        """Number of shards not yet done."""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM shards WHERE status != 'done'").fetchone()[0]
+
+    def completed(self) -> List[Tuple[int, str]]:
+        """(shard, worker_id) of every finished shard."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT shard, worker_id FROM shards WHERE status = 'done' ORDER BY shard"
+            ).fetchall()
+
+    def claim_merge(self, worker_id: str) -> bool:
+        """Elect this worker to merge results once every shard is done; only one worker wins."""
+        with self._transaction() as conn:
+            if conn.execute("SELECT COUNT(*) FROM shards WHERE status != 'done'").fetchone()[0]:
+                return False
+            cursor = conn.execute("UPDATE run SET merged_by = ? WHERE merged_by IS NULL", (worker_id,))
+            return cursor.rowcount == 1
+
+
+class DistributedWorker:
+    """Claim shards until none are left, sync each one and publish its results to the shared directory."""
+
+    def __init__(self, store: LeaseStore, results_dir: Path, worker_id: str, lease_seconds: float):
+        """Initialize with the lease store, the run's results directory and this worker's identity."""
+        self.store = store
+        self.results_dir = results_dir
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.shards_done = 0
+        self.failed = 0
+
+    def run(self, sync_shard: Callable[[int], Iterable[Dict[str, Any]]]) -> None:
+        """Work through the run, waiting on other workers' leases so expired ones can be taken over."""
+        self.results_dir.mkdir(parents=True, exist_ok=True)
+        while True:
+            shard = self.store.claim(self.worker_id, self.lease_seconds)
+            if shard is not None:
+                self._sync_shard(shard, sync_shard)
+                continue
+            remaining = self.store.remaining()
+            if not remaining:
+                return
+            logger.info(f"Waiting for {remaining} shards leased by other workers")
+            time.sleep(POLL_INTERVAL_SECONDS)
+
+    def _sync_shard(self, shard: int, sync_shard: Callable[[int], Iterable[Dict[str, Any]]]) -> None:
+        """Sync one shard, renewing its lease in the background, then publish the results."""
+        logger.info(f"Worker {self.worker_id} syncing shard {shard}")
+        path = result_path(self.results_dir, shard, self.worker_id)
+        temp_path = path.with_suffix(".partial")
+        lost = threading.Event()
+        with self._renewing(shard, lost):
+            with open(temp_path, 'w') as f:
+                for record in sync_shard(shard):
+                    f.write(json.dumps(record) + "\n")
+                    self.failed += record.get('status') == 'failed'
+                    if lost.is_set():
+                        break
+        if not lost.is_set():
+            os.replace(temp_path, path)
+            if self.store.complete(shard, self.worker_id):
+                self.shards_done += 1
+                return
+        logger.warning(f"Lost the lease on shard {shard}; another worker will redo it")
+        temp_path.unlink(missing_ok=True)
+        path.unlink(missing_ok=True)
+
+    @contextmanager
+    def _renewing(self, shard: int, lost: threading.Event) -> Iterator[None]:
+        """Renew a shard's lease every third of its duration until the block exits."""
+        stop = threading.Event()
+
+        def renew() -> None:
+            while not stop.wait(self.lease_seconds / 3):
+                try:
+                    renewed = self.store.renew(shard, self.worker_id, self.lease_seconds)
+                except Exception as e:
+                    # A dead renewer would let the shard keep syncing after its lease expires
+                    logger.error(f"Failed to renew the lease on shard {shard}: {e}")
+                    renewed = False
+                if not renewed:
+                    lost.set()
+                    return
+
+        thread = threading.Thread(target=renew, name=f"lease-{shard}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+
+def read_results(store: LeaseStore, results_dir: Path) -> Iterator[Dict[str, Any]]:
+    """Stream the published records of every finished shard."""
+    for shard, worker_id in store.completed():
+        with open(result_path(results_dir, shard, worker_id)) as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def distributed_sync(session: SyncSession, bucket_name: str, shared_dir: Path, shards: Optional[int],
+                     worker_id: str) -> int:
+    """Sync the shards this worker claims; the worker that finishes the run merges all results."""
+    config = session.config
+    listing = session.open_listing(bucket_name)
+    if listing is None:
+        logger.error("Distributed sync requires access to the B2 native API")
+        return 1
+    listing.ensure_fresh(config.listing_cache_max_age)
+
+    store = LeaseStore(shared_dir / LEASE_DB_NAME)
+    run_id, shards, started_at = store.join_run(shards, config.distributed_shards)
+    logger.info(f"Worker {worker_id} joined distributed run {run_id} ({shards} shards)")
+    if config.thumbnail_sizes:
+        logger.warning("Thumbnails are not generated by distributed runs; run a regular sync to update them")
+    if config.archive_after_sync:
+        logger.warning("Files are not archived by distributed runs; run a regular sync to archive them")
+
+    hash_cache = session.hash_cache()
+    tuner = session.auto_tuner()
+    with TransferWatchdog(config.stall_min_bytes_per_sec, config.stall_window_seconds) as watchdog, \
+            session.image_optimizer(hash_cache) as optimizer:
+        uploader = FileUploader(listing.api, bucket_name, tuner.part_size, watchdog=watchdog,
+                                metadata=session.upload_metadata(), hash_cache=hash_cache)
+        engine = NativeSyncEngine(listing.api, uploader, tuner.threads, hash_cache,
+                                  config.max_requeues, optimizer, tuner, listing.versions)
+        with ShardPlans(lambda: session.sync_plan(listing.iter_files(), bucket_name), shards) as plans:
+            worker = DistributedWorker(store, shared_dir / run_id, worker_id, config.lease_seconds)
+            worker.run(lambda shard: engine.execute(plans.entries(shard)))
+    logger.info(f"Worker {worker_id} synced {worker.shards_done} shards ({worker.failed} files failed)")
+
+    if not store.claim_merge(worker_id):
+        # Every shard is done: bring this node's listing up to date with all workers' uploads
+        listing.apply_sync_results(list(read_results(store, shared_dir / run_id)), Config.get_input_path())
+        logger.info("Another worker will merge the run's results")
+        return 1 if worker.failed else 0
+    return _merge_results(session, store, shared_dir / run_id, bucket_name, listing, started_at)
+
+
+def _merge_results(session: SyncSession, store: LeaseStore, results_dir: Path, bucket_name: str,
+                   listing: RemoteListing, started_at: float) -> int:
+    """Combine every shard's results into one JSON log, failure report and set of link files."""
+    logger.info(f"Merging distributed results from {results_dir}")
+    output_dir = create_timestamped_output_dir(Config.get_output_path())
+    files_processed = sorted(read_results(store, results_dir), key=lambda f: f['b2_key'])
+    execution_time = time.time() - started_at
+
+    listing.apply_sync_results(files_processed, Config.get_input_path())
+    files_processed.extend(session.prune_versions(listing))
+    errors = session.write_sync_outputs(output_dir, files_processed, bucket_name, execution_time, listing)
+    session.log_sync_summary(execution_time, files_processed, output_dir)
+    if errors:
+        logger.error(f"{len(errors)} files failed to sync")
+    return 1 if errors else 0
@@ -0,0 +1,218 @@
+"""Native sync engine: execute a streamed sync plan with a bounded worker pool."""
+
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, Optional, Set
+from loguru import logger
+
+from .autotune import AutoTuner
+from .b2api import B2Api, B2ApiError
+from .hashcache import HashCache
+from .optimize import ImageOptimizer, OptimizedImage
+from .upload import FileUploader
+from .watchdog import TransferStalled
+
+# Constants
+IN_FLIGHT_PER_THREAD = 2
+VERSIONS_PAGE_SIZE = 1000
+
+
+def run_bounded(fn: Callable[[Any], Any], items: Iterable[Any], threads: int,
+                concurrency: Optional[Callable[[], int]] = None) -> Iterator[Any]:
+    """Map fn over a stream with a thread pool, yielding results as they finish.
+
+    Only a few items per worker are in flight, so the input is consumed as a
+    stream rather than materialized. With `concurrency`, exactly that many
+    (re-read before each submit, at most `threads`) run at once.
+    """
+    threads = max(1, threads)
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        pending: Set[Future] = set()
+        for item in items:
+            limit = max(1, min(concurrency(), threads)) if concurrency else threads * IN_FLIGHT_PER_THREAD
+            while len(pending) >= limit:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from (future.result() for future in done)
+            pending.add(executor.submit(fn, item))
+        for future in wait(pending).done:
+            yield future.result()
+
+
+def delete_versions(api: B2Api, bucket_id: str, key: str, keep_file_id: Optional[str] = None) -> int:
+    """Delete every version of one key, hide markers included, except `keep_file_id`; returns how many."""
+    deleted = 0
+    next_name: Optional[str] = key
+    next_id: Optional[str] = None
+    while next_name == key:
+        page = api.list_file_versions(bucket_id, next_name, next_id, prefix=key, max_file_count=VERSIONS_PAGE_SIZE)
+        for version in page['files']:
+            if version['fileName'] != key:
+                return deleted
+            if version['fileId'] == keep_file_id or version.get('action') not in ('upload', 'hide'):
+                continue
+            try:
+                api.delete_file_version(key, version['fileId'])
+                deleted += 1
+            except B2ApiError as e:
+                if e.code != 'file_not_present':
+                    raise
+        next_name, next_id = page.get('nextFileName'), page.get('nextFileId')
+    return deleted
+
+
+def remove_key(api: B2Api, bucket_id: str, record: Dict[str, Any], keep_history: bool) -> None:
+    """Take a record's key out of the bucket.
+
+    With history kept, the key is hidden and its versions are left to
+    retention pruning (the hide marker is noted on the record); otherwise
+    every version is deleted, as `b2 sync --delete` does.
+    """
+    if keep_history:
+        marker = api.hide_file(bucket_id, record['b2_key'])
+        record['hide_file_id'] = marker['fileId']
+        record['hidden_at'] = marker['uploadTimestamp']
+    else:
+        delete_versions(api, bucket_id, record['b2_key'])
+
+
+def _with_requeued(plan: Iterable[Dict[str, Any]], requeued: Deque[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Feed requeued entries back in ahead of the remaining plan."""
+    for entry in plan:
+        while requeued:
+            yield requeued.popleft()
+        yield entry
+
+
+class NativeSyncEngine:
+    """Apply planned upload/update/delete actions through the native API."""
+
+    def __init__(self, api: B2Api, uploader: FileUploader, threads: int,
+                 hash_cache: Optional[HashCache] = None, max_requeues: int = 3,
+                 optimizer: Optional[ImageOptimizer] = None, tuner: Optional[AutoTuner] = None,
+                 keep_history: bool = False):
+        """Initialize with an authorized client, an uploader and the worker count.
+
+        A tuner observes every transfer and, when auto-tuning threads, sets the
+        concurrency instead of `threads`. Without `keep_history`, deleted and
+        replaced files lose all their other versions like under `b2 sync --delete`;
+        with it, they are hidden or superseded and left to retention pruning.
+        """
+        self.api = api
+        self.uploader = uploader
+        self.threads = max(1, threads)
+        self.hash_cache = hash_cache
+        self.max_requeues = max_requeues
+        self.optimizer = optimizer
+        self.tuner = tuner
+        self.keep_history = keep_history
+
+    def execute(self, plan: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Run plan entries concurrently, yielding each record once it has finished.
+
+        Stalled transfers are put back in the queue, interleaved with the rest
+        of the plan, and retried on a fresh upload URL.
+        """
+        requeued: Deque[Dict[str, Any]] = deque()
+        pending_items: Iterable[Dict[str, Any]] = _with_requeued(plan, requeued)
+        threads, concurrency = self.threads, None
+        if self.tuner is not None and self.tuner.auto_threads:
+            threads, concurrency = self.tuner.max_threads, self.tuner.concurrency
+        while True:
+            for entry in run_bounded(self._run, pending_items, threads, concurrency):
+                if entry['status'] == 'requeue':
+                    requeued.append(entry)
+                else:
+                    yield entry
+            if not requeued:
+                break
+            pending_items, requeued = list(requeued), deque()
+        if self.hash_cache is not None:
+            self.hash_cache.flush()
+
+    def _run(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute one action, recording failures on the entry instead of raising."""
+        if entry['action'] in ('upload', 'update') and self.tuner is not None:
+            started = time.monotonic()
+            result = self._run_action(entry)
+            self.tuner.observe(result, time.monotonic() - started)
+            return result
+        return self._run_action(entry)
+
+    def _run_action(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute one action without timing it."""
+        try:
+            if entry['action'] in ('upload', 'update'):
+                self._upload(entry)
+                if entry['action'] == 'update' and not self.keep_history:
+                    delete_versions(self.api, self.uploader.bucket_id, entry['b2_key'], entry['file_id'])
+            elif entry['action'] == 'delete':
+                remove_key(self.api, self.uploader.bucket_id, entry, self.keep_history)
+            logger.debug(f"{entry['action']}: {entry['b2_key']}")
+        except TransferStalled as e:
+            entry['requeues'] = entry.get('requeues', 0) + 1
+            if entry['requeues'] <= self.max_requeues:
+                logger.info(f"Requeueing {entry['b2_key']} (attempt {entry['requeues']}/{self.max_requeues})")
+                entry['status'] = 'requeue'
+                return entry
+            self._fail(entry, e)
+        except (B2ApiError, OSError) as e:
+            self._fail(entry, e)
+        return self._finish(entry)
+
+    @staticmethod
+    def _fail(entry: Dict[str, Any], error: Exception) -> None:
+        """Record a failure on a plan entry."""
+        logger.error(f"Failed to {entry['action']} {entry['b2_key']}: {error}")
+        entry['status'] = 'failed'
+        entry['error_type'] = type(error).__name__
+        entry['error_message'] = str(error)
+
+    def _upload(self, entry: Dict[str, Any]) -> None:
+        """Upload one file and remember the SHA1 computed while sending it."""
+        path = Path(entry['local_path'])
+        stat = path.stat()
+        optimized = self._prepare(path)
+        if optimized is not None:
+            self._upload_optimized(entry, stat, optimized)
+            return
+        result = self.uploader.upload_file(path, entry['b2_key'])
+        entry['file_id'] = result['fileId']
+        entry['sha1'] = result['sha1']
+        if self.hash_cache is not None:
+            self.hash_cache.put(path, stat.st_size, stat.st_mtime_ns, result['sha1'])
+
+    def _prepare(self, path: Path) -> Optional[OptimizedImage]:
+        """Optimized copy of a file to upload instead, or None to upload it as it is."""
+        if self.optimizer is None:
+            return None
+        try:
+            return self.optimizer.prepare(path)
+        except BrokenProcessPool:
+            logger.warning(f"Image optimizer worker died; uploading {path.name} unoptimized")
+            return None
+
+    def _upload_optimized(self, entry: Dict[str, Any], stat: os.stat_result, optimized: OptimizedImage) -> None:
+        """Upload an optimized copy, recording the source's size, mtime and SHA1 so the planner still matches it."""
+        file_info = {
+            "src_last_modified_millis": str(int(stat.st_mtime * 1000)),
+            "src_size_bytes": str(stat.st_size),
+            "src_sha1": optimized.source_sha1
+        }
+        result = self.uploader.upload_file(optimized.path, entry['b2_key'], file_info)
+        entry['file_id'] = result['fileId']
+        entry['sha1'] = result['sha1']
+        entry['src_sha1'] = optimized.source_sha1
+        entry['uploaded_size_bytes'] = result['contentLength']
+
+    @staticmethod
+    def _finish(entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Stamp the completion time and mark unfailed entries successful."""
+        if entry['status'] in ('pending', 'requeue'):
+            entry['status'] = 'success'
+        entry['sync_time'] = datetime.now().isoformat()
+        return entry
@@ -0,0 +1,82 @@
+"""SQLite cache of local file SHA1s, keyed by path, size and modification time."""
+
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+# Constants
+READ_CHUNK_SIZE = 1024 * 1024
+FLUSH_BATCH_SIZE = 1000
+
+
+class HashCache:
+    """Remember SHA1s of local files so unchanged files are never re-read."""
+
+    def __init__(self, db_path: Path):
+        """Open (and create if needed) the cache database."""
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self.lock = threading.Lock()
+        self._pending: List[Tuple[str, int, int, str]] = []
+        self.conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS hashes (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime_ns INTEGER,
+                sha1 TEXT
+            );
+        """)
+
+    @classmethod
+    def for_dir(cls, cache_dir: Path) -> 'HashCache':
+        """Open the hash cache stored in a cache directory."""
+        return cls(cache_dir / "hashes.sqlite")
+
+    def get(self, path: Path, size: int, mtime_ns: int) -> Optional[str]:
+        """Return the cached SHA1 if the file is unchanged since it was hashed."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT sha1 FROM hashes WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (str(path), size, mtime_ns)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, path: Path, size: int, mtime_ns: int, sha1: str) -> None:
+        """Record a file's SHA1, writing to disk in batches."""
+        with self.lock:
+            self._pending.append((str(path), size, mtime_ns, sha1))
+            if len(self._pending) >= FLUSH_BATCH_SIZE:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        """Write any buffered hashes to disk."""
+        with self.lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        """Write buffered hashes; caller holds the lock."""
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)", self._pending)
+        self._pending = []
+
+    def sha1_of(self, path: Path) -> str:
+        """Get a file's SHA1 from the cache, hashing it only if it changed."""
+        stat = path.stat()
+        cached = self.get(path, stat.st_size, stat.st_mtime_ns)
+        if cached:
+            return cached
+        sha1 = hashlib.sha1()
+        buffer = bytearray(READ_CHUNK_SIZE)
+        view = memoryview(buffer)
+        with open(path, 'rb') as f:
+            while True:
+                read = f.readinto(buffer)
+                if not read:
+                    break
+                sha1.update(view[:read])
+        digest = sha1.hexdigest()
+        self.put(path, stat.st_size, stat.st_mtime_ns, digest)
+        return digest
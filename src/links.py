@@ -0,0 +1,65 @@
+"""Download authorization for links to private buckets: one token per folder prefix."""
+
+import time
+from typing import Dict, Iterable, Tuple
+from urllib.parse import quote
+from loguru import logger
+
+from .b2api import B2Api
+from .engine import run_bounded
+from .listing import ListingCache, RemoteListing
+
+# Constants
+TOKENS_META_KEY = 'download_authorizations'
+MAX_VALID_SECONDS = 604800  # B2 limit for download authorizations (one week)
+
+
+def folder_prefix(key: str) -> str:
+    """The prefix a key's token covers: its folder with trailing slash.
+
+    Files at the bucket root get a token for their own name, since an empty
+    prefix would authorize the whole bucket.
+    """
+    return key[:key.rfind('/') + 1] or key
+
+
+class DownloadAuthorizer:
+    """Stamp links with cached per-folder download tokens, fetching missing ones concurrently."""
+
+    def __init__(self, api: B2Api, bucket_id: str, cache: ListingCache, valid_seconds: int, threads: int):
+        """Initialize with an authorized client, the bucket and the listing cache holding saved tokens."""
+        self.api = api
+        self.bucket_id = bucket_id
+        self.cache = cache
+        self.valid_seconds = min(valid_seconds, MAX_VALID_SECONDS)
+        self.threads = max(1, threads)
+        self._tokens: Dict[str, Tuple[str, float]] = {
+            prefix: tuple(value) for prefix, value in cache.get_meta(TOKENS_META_KEY, {}).items()
+        }
+
+    @classmethod
+    def for_listing(cls, listing: RemoteListing, valid_seconds: int, threads: int) -> 'DownloadAuthorizer':
+        """Build an authorizer for a listing's bucket, keeping tokens in its cache."""
+        return cls(listing.api, listing.bucket_id, listing.cache, valid_seconds, threads)
+
+    def prepare(self, keys: Iterable[str]) -> None:
+        """Ensure every folder among the keys has a token with at least half its validity left."""
+        now = time.time()
+        fresh = {prefix for prefix, (_, expires_at) in self._tokens.items()
+                 if expires_at - now >= self.valid_seconds / 2}
+        needed = sorted({folder_prefix(key) for key in keys} - fresh)
+        for prefix, token in run_bounded(self._fetch, needed, self.threads):
+            self._tokens[prefix] = (token, now + self.valid_seconds)
+        self._tokens = {prefix: value for prefix, value in self._tokens.items() if value[1] > now}
+        self.cache.set_meta(TOKENS_META_KEY, self._tokens)
+        logger.info(f"Requested {len(needed)} folder download authorizations "
+                    f"({len(self._tokens) - len(needed)} reused from cache)")
+
+    def _fetch(self, prefix: str) -> Tuple[str, str]:
+        """Request one folder's token."""
+        return prefix, self.api.get_download_authorization(self.bucket_id, prefix, self.valid_seconds)
+
+    def sign(self, url: str, key: str) -> str:
+        """Append the key's folder token to its download URL."""
+        token, _ = self._tokens[folder_prefix(key)]
+        return f"{url}?Authorization={quote(token, safe='')}"
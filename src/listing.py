@@ -0,0 +1,346 @@
+"""Prefix-sharded remote bucket listing backed by a local SQLite cache."""
+
+import json
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from loguru import logger
+
+from .b2api import B2Api
+
+# Constants
+PAGE_SIZE = 10000
+SHARDS_PER_THREAD = 4
+MIN_SHARD_FILES = 1000  # Smallest key range worth listing as a shard of its own
+INSERT_BATCH_SIZE = 5000
+
+
+class RemoteFile(NamedTuple):
+    """One object in the bucket listing."""
+    key: str
+    file_id: str
+    size: int
+    sha1: Optional[str]
+    upload_timestamp: int
+    src_mtime_ms: Optional[int]
+    src_size: Optional[int] = None
+    src_sha1: Optional[str] = None
+
+    @classmethod
+    def from_api(cls, entry: Dict[str, Any]) -> 'RemoteFile':
+        """Build from a b2_list_file_names entry, normalizing the SHA1 fields.
+
+        Optimized uploads carry the source file's size and SHA1 in their file info.
+        """
+        info = entry.get('fileInfo') or {}
+        sha1 = entry.get('contentSha1') or ''
+        if sha1.startswith('unverified:'):
+            sha1 = sha1[len('unverified:'):]
+        if not sha1 or sha1 == 'none':
+            sha1 = info.get('large_file_sha1')
+        mtime = info.get('src_last_modified_millis')
+        src_size = info.get('src_size_bytes')
+        return cls(
+            key=entry['fileName'],
+            file_id=entry.get('fileId', ''),
+            size=entry.get('contentLength', 0),
+            sha1=sha1,
+            upload_timestamp=entry.get('uploadTimestamp', 0),
+            src_mtime_ms=int(mtime) if mtime else None,
+            src_size=int(src_size) if src_size else None,
+            src_sha1=info.get('src_sha1')
+        )
+
+
+class ListingCache:
+    """Local SQLite copy of a bucket's file names, kept in B2 key order."""
+
+    def __init__(self, db_path: Path):
+        """Open (and create if needed) the cache database."""
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self.lock = threading.RLock()
+        self.conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS files (
+                key TEXT PRIMARY KEY,
+                file_id TEXT,
+                size INTEGER,
+                sha1 TEXT,
+                upload_timestamp INTEGER,
+                src_mtime_ms INTEGER,
+                src_size INTEGER,
+                src_sha1 TEXT
+            );
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+        """)
+        self._add_missing_columns()
+
+    def _add_missing_columns(self) -> None:
+        """Upgrade caches created before the source size/SHA1 columns existed."""
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(files)")}
+        with self.conn:
+            for column, column_type in (('src_size', 'INTEGER'), ('src_sha1', 'TEXT')):
+                if column not in columns:
+                    self.conn.execute(f"ALTER TABLE files ADD COLUMN {column} {column_type}")
+
+    @classmethod
+    def for_bucket(cls, cache_dir: Path, bucket_name: str) -> 'ListingCache':
+        """Open the cache file for a bucket."""
+        return cls(cache_dir / f"listing_{bucket_name}.sqlite")
+
+    def get_meta(self, name: str, default: Any = None) -> Any:
+        """Read a JSON value from the meta table."""
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, name: str, value: Any) -> None:
+        """Store a JSON value in the meta table."""
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (name, json.dumps(value)))
+
+    def age_seconds(self) -> Optional[float]:
+        """Seconds since the last full refresh, or None if never refreshed."""
+        refreshed_at = self.get_meta('refreshed_at')
+        return time.time() - refreshed_at if refreshed_at else None
+
+    def count(self) -> int:
+        """Number of cached objects."""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def get(self, key: str) -> Optional[RemoteFile]:
+        """Look up one cached object by key."""
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM files WHERE key = ?", (key,)).fetchone()
+        return RemoteFile(*row) if row else None
+
+    def upsert(self, files: List[RemoteFile]) -> None:
+        """Insert or replace cached objects."""
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)", files)
+
+    def delete(self, keys: List[str]) -> None:
+        """Remove cached objects by key."""
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM files WHERE key = ?", [(key,) for key in keys])
+
+    def clear(self) -> None:
+        """Remove every cached object and the refresh state."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM files")
+            self.conn.execute("DELETE FROM meta WHERE name IN ('refreshed_at', 'versions_listed', 'incomplete')")
+
+    def iter_files(self, prefix: str = "", start_after: str = "") -> Iterator[RemoteFile]:
+        """Stream cached objects in key order without loading them all."""
+        query = "SELECT * FROM files WHERE key > ? AND key >= ? ORDER BY key"
+        last_key = start_after
+        while True:
+            with self.lock:
+                rows = self.conn.execute(query + f" LIMIT {PAGE_SIZE}", (last_key, prefix)).fetchall()
+            for row in rows:
+                if not row[0].startswith(prefix):
+                    return
+                yield RemoteFile(*row)
+            if len(rows) < PAGE_SIZE:
+                return
+            last_key = rows[-1][0]
+
+    def learn_split_points(self, shard_count: int) -> List[str]:
+        """Pick evenly spaced keys from the cache as shard boundaries for the next refresh.
+
+        Small listings get fewer shards, down to none below 2 * MIN_SHARD_FILES keys.
+        """
+        total = self.count()
+        shard_count = min(shard_count, total // MIN_SHARD_FILES)
+        if shard_count < 2:
+            return []
+        step = total // shard_count
+        with self.lock:
+            cursor = self.conn.execute("SELECT key FROM files ORDER BY key")
+            points = [row[0] for index, row in enumerate(cursor, 1) if index % step == 0]
+        return points[:shard_count - 1]
+
+
+class RemoteListing:
+    """List a bucket concurrently by key range and persist the result in a ListingCache.
+
+    Versions mode (old versions cached for retention pruning) is the
+    VersionedListing subclass in versions.py.
+    """
+
+    versions = False
+
+    def __init__(self, api: B2Api, bucket_name: str, cache: ListingCache, threads: int = 8):
+        """Initialize with an authorized API client and cache."""
+        self.api = api
+        self.bucket_name = bucket_name
+        self.bucket_id = api.get_bucket_id(bucket_name)
+        self.cache = cache
+        self.threads = max(1, threads)
+
+    def _top_level_split_points(self) -> List[str]:
+        """Use the bucket's top-level folders as shard boundaries."""
+        points, start = [], None
+        while True:
+            page = self.api.list_file_names(self.bucket_id, start, delimiter="/")
+            points.extend(f['fileName'] for f in page['files'] if f.get('action') == 'folder')
+            start = page.get('nextFileName')
+            if not start:
+                return points
+
+    def plan_shards(self) -> List[Tuple[str, Optional[str]]]:
+        """Split the keyspace into [start, end) ranges using learned or top-level split points.
+
+        Top-level folders are only walked while nothing has been learned yet, and are kept until then.
+        """
+        points = self.cache.get_meta('split_points')
+        if points is None:
+            points = self._top_level_split_points()
+            self.cache.set_meta('split_points', points)
+        boundaries: List[Optional[str]] = [""] + sorted(set(points)) + [None]
+        return [(boundaries[i], boundaries[i + 1]) for i in range(len(boundaries) - 1)]
+
+    def _list_shard(self, start: str, end: Optional[str], pages: queue.Queue) -> int:
+        """Page through one key range, handing each page to the writer."""
+        next_name: Optional[str] = start or None
+        listed = 0
+        while True:
+            page = self.api.list_file_names(self.bucket_id, next_name, max_file_count=PAGE_SIZE)
+            files = [RemoteFile.from_api(f) for f in page['files'] if f.get('action', 'upload') == 'upload']
+            in_range = [f for f in files if end is None or f.key < end]
+            pages.put(in_range)
+            listed += len(in_range)
+            next_name = page.get('nextFileName')
+            if next_name is None or (end is not None and next_name >= end):
+                return listed
+
+    def refresh(self) -> int:
+        """Re-list the whole bucket with one worker per shard and replace the cache."""
+        start_time = time.time()
+        shards = self.plan_shards()
+        pages: queue.Queue = queue.Queue(maxsize=self.threads * 2)
+        self.cache.clear()
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            futures = [executor.submit(self._list_shard, start, end, pages) for start, end in shards]
+            self._drain_pages(pages, futures)
+            for future in futures:
+                future.result()
+        self.cache.set_meta('refreshed_at', time.time())
+        self.cache.set_meta('versions_listed', self.versions)
+        self.cache.set_meta('split_points', self.cache.learn_split_points(self.threads * SHARDS_PER_THREAD))
+        total = self.cache.count()
+        logger.info(f"Listed {total} files from '{self.bucket_name}' in {len(shards)} shards "
+                    f"({time.time() - start_time:.2f}s)")
+        return total
+
+    def _drain_pages(self, pages: queue.Queue, futures: list) -> None:
+        """Write listed pages into the cache from a single thread until all shards finish."""
+        batch: List[Any] = []
+        while not (all(f.done() for f in futures) and pages.empty()):
+            try:
+                batch.extend(pages.get(timeout=0.1))
+            except queue.Empty:
+                continue
+            if len(batch) >= INSERT_BATCH_SIZE:
+                self._write_batch(batch)
+                batch = []
+        self._write_batch(batch)
+
+    def _write_batch(self, batch: List[Any]) -> None:
+        """Store one batch of listed objects."""
+        self.cache.upsert(batch)
+
+    def ensure_fresh(self, max_age_seconds: int) -> None:
+        """Refresh the cache if it was never filled, is older than the allowed age, holds
+        entries without file IDs, or lacks the old versions that versions mode needs."""
+        age = self.cache.age_seconds()
+        if (age is None or age > max_age_seconds or self.cache.get_meta('incomplete')
+                or (self.versions and not self.cache.get_meta('versions_listed'))):
+            self.refresh()
+        else:
+            logger.info(f"Using cached bucket listing ({self.cache.count()} files, {age:.0f}s old)")
+
+    def apply_sync_results(self, files_processed: List[Dict[str, Any]], input_dir: Path) -> None:
+        """Update the cache incrementally from our own upload/update/delete results.
+
+        Results of `b2 sync` carry no file IDs: such entries mark the cache
+        incomplete, so the next run that acts on file IDs re-lists the bucket first.
+        """
+        uploaded, deleted = [], []
+        for file_info in files_processed:
+            if file_info.get('status') != 'success':
+                continue
+            if file_info.get('action') in ('upload', 'update'):
+                entry = self._local_entry(file_info, input_dir)
+                self._record_upload(entry)
+                uploaded.append(entry)
+            elif file_info.get('action') == 'delete' and not self._record_hide(file_info):
+                deleted.append(file_info['b2_key'])
+        self.cache.upsert(uploaded)
+        self.cache.delete(deleted)
+        if any(not entry.file_id for entry in uploaded):
+            self.cache.set_meta('incomplete', True)
+        logger.debug(f"Listing cache updated: {len(uploaded)} uploaded, {len(deleted)} deleted")
+
+    def _record_upload(self, entry: RemoteFile) -> None:
+        """Hook for versions mode to record the version an upload replaced."""
+
+    def _record_hide(self, file_info: Dict[str, Any]) -> bool:
+        """Hook for versions mode to record a delete's hide marker; True if it did."""
+        return False
+
+    @staticmethod
+    def _local_entry(file_info: Dict[str, Any], input_dir: Path) -> RemoteFile:
+        """Describe an object we just uploaded using what is known locally."""
+        try:
+            stat = (input_dir / file_info['b2_key']).stat()
+            size, mtime_ms = stat.st_size, int(stat.st_mtime * 1000)
+        except OSError:
+            size, mtime_ms = file_info.get('file_size_bytes', 0), None
+        optimized = 'uploaded_size_bytes' in file_info
+        return RemoteFile(
+            key=file_info['b2_key'],
+            file_id=file_info.get('file_id', ''),
+            size=file_info['uploaded_size_bytes'] if optimized else size,
+            sha1=file_info.get('sha1'),
+            upload_timestamp=int(time.time() * 1000),
+            src_mtime_ms=mtime_ms,
+            src_size=size if optimized else None,
+            src_sha1=file_info.get('src_sha1')
+        )
+
+    def stream_entries(self, prefix: str = "") -> Iterator[Dict[str, Any]]:
+        """Stream raw b2_list_file_names entries (with content type and file info) for live objects."""
+        next_name: Optional[str] = None
+        while True:
+            page = self.api.list_file_names(self.bucket_id, next_name, prefix=prefix, max_file_count=PAGE_SIZE)
+            for entry in page['files']:
+                if entry.get('action', 'upload') == 'upload':
+                    yield entry
+            next_name = page.get('nextFileName')
+            if next_name is None:
+                return
+
+    def stream_files(self, prefix: str = "") -> Iterator[RemoteFile]:
+        """Stream the live bucket listing page by page in key order, bypassing the cache."""
+        return (RemoteFile.from_api(entry) for entry in self.stream_entries(prefix))
+
+    def iter_files(self, prefix: str = "") -> Iterator[RemoteFile]:
+        """Stream the cached listing in key order."""
+        return self.cache.iter_files(prefix)
+
+
+def open_listing(api: B2Api, bucket_name: str, cache_dir: Path, threads: int,
+                 versions: bool = False) -> RemoteListing:
+    """Open the cached listing for a bucket, with old versions cached too in versions mode."""
+    if not versions:
+        return RemoteListing(api, bucket_name, ListingCache.for_bucket(cache_dir, bucket_name), threads)
+    from .versions import VersionedListing, VersionedListingCache
+    return VersionedListing(api, bucket_name, VersionedListingCache.for_bucket(cache_dir, bucket_name), threads)
@@ -0,0 +1,100 @@
+"""Per-pattern upload metadata: Content-Type, cache and disposition headers resolved per key."""
+
+import mimetypes
+import re
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+# Constants
+AUTO_CONTENT_TYPE = "b2/x-auto"
+INFO_KEYS = {"cache_control": "b2-cache-control", "content_disposition": "b2-content-disposition"}
+RULE_KEYS = {"pattern", "content_type", *INFO_KEYS}
+MAGIC_NUMBERS = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"BM", "image/bmp"),
+    (b"%PDF-", "application/pdf"),
+)
+MAGIC_HEAD_BYTES = 16
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """Content type from a file's leading bytes, if recognized."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return next((content_type for magic, content_type in MAGIC_NUMBERS if head.startswith(magic)), None)
+
+
+def detect_content_type(key: str, read_head: Callable[[], bytes]) -> str:
+    """Content type from the key's extension, else from magic bytes, else left to B2."""
+    guessed, _ = mimetypes.guess_type(PurePosixPath(key).name)
+    return guessed or sniff_content_type(read_head()) or AUTO_CONTENT_TYPE
+
+
+def local_head(path: Path) -> Callable[[], bytes]:
+    """Reader of a local file's leading bytes."""
+    def read_head() -> bytes:
+        with open(path, 'rb') as f:
+            return f.read(MAGIC_HEAD_BYTES)
+    return read_head
+
+
+def buffer_head(data: Union[bytes, BinaryIO]) -> Callable[[], bytes]:
+    """Reader of an in-memory buffer's (or an open binary file's) leading bytes."""
+    def read_head() -> bytes:
+        if hasattr(data, 'readinto'):
+            data.seek(0)
+            return data.read(MAGIC_HEAD_BYTES)
+        return bytes(memoryview(data)[:MAGIC_HEAD_BYTES])
+    return read_head
+
+
+class MetadataRule(NamedTuple):
+    """Headers for keys matching one pattern."""
+    pattern: re.Pattern
+    content_type: Optional[str]
+    file_info: Dict[str, str]
+
+
+class UploadMetadata:
+    """Resolve upload headers from ordered rules; every matching rule applies, later ones override.
+
+    A rule's `content_type` is a MIME type or 'auto' (extension, then magic
+    bytes); `cache_control` and `content_disposition` become the
+    `b2-cache-control` and `b2-content-disposition` file info B2 serves as
+    response headers.
+    """
+
+    def __init__(self, rules: List[Dict[str, str]]):
+        """Compile rules from the config."""
+        self.rules: List[MetadataRule] = []
+        for rule in rules:
+            unknown = set(rule) - RULE_KEYS
+            if unknown or 'pattern' not in rule:
+                raise ValueError(f"Invalid upload_metadata rule {rule}: needs 'pattern' and only "
+                                 f"{', '.join(sorted(RULE_KEYS - {'pattern'}))}")
+            self.rules.append(MetadataRule(re.compile(rule['pattern']), rule.get('content_type'),
+                                           {INFO_KEYS[name]: rule[name] for name in INFO_KEYS if name in rule}))
+
+    def __bool__(self) -> bool:
+        return bool(self.rules)
+
+    def matches(self, key: str) -> bool:
+        """Whether any rule applies to a key."""
+        return any(rule.pattern.match(key) for rule in self.rules)
+
+    def resolve(self, key: str, read_head: Callable[[], bytes]) -> Tuple[Optional[str], Dict[str, str]]:
+        """Content type (None when no rule sets one) and file info for a key."""
+        content_type: Optional[str] = None
+        file_info: Dict[str, str] = {}
+        for rule in self.rules:
+            if rule.pattern.match(key):
+                content_type = rule.content_type or content_type
+                file_info.update(rule.file_info)
+        if content_type == 'auto':
+            content_type = detect_content_type(key, read_head)
+        return content_type, file_info
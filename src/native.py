@@ -0,0 +1,145 @@
+"""Native-API sync runs: the native upload engine, local dry runs and the follow-ups of `b2 sync` runs."""
+
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from loguru import logger
+
+from .archive import ArchiveIndex
+from .auth import resolved_bucket
+from .autotune import RunHistory
+from .b2api import B2ApiError
+from .config import Config
+from .engine import NativeSyncEngine, delete_versions, run_bounded
+from .hashcache import HashCache
+from .listing import ListingCache, RemoteListing
+from .planner import scan_local, summarize_plan
+from .session import SyncSession
+from .upload import FileUploader
+from .variants import VariantSync
+from .watchdog import TransferWatchdog
+
+
+def native_sync(session: SyncSession, output_dir: Path, bucket_name: str, start_time: float) -> int:
+    """Plan against the cached listing and upload changed files through the native API."""
+    config = session.config
+    listing = session.open_listing(bucket_name)
+    if listing is None:
+        logger.error("The native upload engine requires access to the B2 native API")
+        return 1
+    listing.ensure_fresh(config.listing_cache_max_age)
+
+    hash_cache = session.hash_cache()
+    tuner = session.auto_tuner()
+    with TransferWatchdog(config.stall_min_bytes_per_sec, config.stall_window_seconds) as watchdog, \
+            session.image_optimizer(hash_cache) as optimizer:
+        uploader = FileUploader(listing.api, bucket_name, tuner.part_size, watchdog=watchdog,
+                                metadata=session.upload_metadata(), hash_cache=hash_cache)
+        engine = NativeSyncEngine(listing.api, uploader, tuner.threads, hash_cache,
+                                  config.max_requeues, optimizer, tuner, listing.versions)
+        files_processed = list(engine.execute(session.sync_plan(listing.iter_files(), bucket_name)))
+        files_processed.extend(_sync_variants(session, uploader, hash_cache, listing))
+    execution_time = time.time() - start_time
+
+    listing.apply_sync_results(files_processed, Config.get_input_path())
+    files_processed.extend(session.prune_versions(listing))
+    session.archive_synced(bucket_name, files_processed, listing, hash_cache)
+    errors = session.write_sync_outputs(output_dir, files_processed, bucket_name, execution_time, listing,
+                                        tuner.summary())
+    session.record_run(files_processed, execution_time, 'native', tuner)
+    session.log_sync_summary(execution_time, files_processed, output_dir)
+    if errors:
+        logger.error(f"{len(errors)} files failed to sync")
+    return 1 if errors else 0
+
+
+def _sync_variants(session: SyncSession, uploader: FileUploader, hash_cache: HashCache,
+                   listing: RemoteListing) -> List[Dict[str, str]]:
+    """Render and upload thumbnails for new or changed images, removing those of deleted images."""
+    config = session.config
+    if not config.thumbnail_sizes:
+        return []
+    images = (f for f in scan_local(Config.get_input_path(), config.exclude_patterns)
+              if config.is_supported_format(Path(f.key)))
+    with VariantSync(uploader, hash_cache, Config.get_cache_path() / "variants", config.thumbnail_sizes,
+                     config.thumbnail_format, config.thumbnail_prefix, config.sync_threads,
+                     config.optimize_processes, listing.versions) as variants:
+        archive_index = ArchiveIndex.for_bucket(Config.get_cache_path(), listing.bucket_name)
+        archived_keys = (key for key in archive_index.iter_keys() if config.is_supported_format(Path(key)))
+        return list(variants.sync(images, listing.iter_files(config.thumbnail_prefix), archived_keys))
+
+
+def local_dry_run(session: SyncSession, verify_remote: bool) -> int:
+    """Plan from the local scan and the cached listing without running `b2 sync`."""
+    logger.info("DRY RUN MODE - No actual changes will be made")
+    # The bucket may come from the credentials: reuse the name a real run resolved
+    bucket_name = resolved_bucket(Config.get_cache_path(), session.config)
+    cache = ListingCache.for_bucket(Config.get_cache_path(), bucket_name) if bucket_name else None
+    if verify_remote or cache is None or cache.age_seconds() is None:
+        bucket_name = session.resolve_bucket()
+        listing = session.open_listing(bucket_name)
+        if listing is None:
+            return 1
+        listing.refresh()
+        cache = listing.cache
+    else:
+        logger.info(f"Planning against cached listing ({cache.age_seconds():.0f}s old, "
+                    "use --verify-remote to re-list the bucket)")
+
+    summary = summarize_plan(session.sync_plan(cache.iter_files(), bucket_name))
+    _log_plan_summary(summary, RunHistory.for_dir(Config.get_cache_path()).last_bytes_per_sec())
+    return 0
+
+
+def _log_plan_summary(summary: Dict[str, int], bytes_per_sec: Optional[float]) -> None:
+    """Log what a sync would do and how long the transfer should take."""
+    size_mb = summary['bytes_to_transfer'] / (1024 * 1024)
+    logger.info(f"Would upload: {summary['upload']}, update: {summary['update']}, "
+                f"delete: {summary['delete']}, unchanged: {summary['skip']}")
+    logger.info(f"Bytes to transfer: {summary['bytes_to_transfer']} ({size_mb:.1f} MB)")
+    if bytes_per_sec:
+        eta = summary['bytes_to_transfer'] / bytes_per_sec
+        logger.info(f"Estimated transfer time: {eta:.0f}s at {bytes_per_sec / (1024 * 1024):.2f} MB/s (last run)")
+    else:
+        logger.info("Estimated transfer time: unknown (no measured throughput yet)")
+
+
+def delete_replaced_versions(session: SyncSession, bucket_name: str, listing: RemoteListing,
+                             files_processed: List[Dict[str, Any]]) -> None:
+    """Delete the versions `b2 sync` updates left behind while archiving keeps it off `--delete`.
+
+    Like the native engine, only the new version of a replaced file is kept
+    unless version retention is on. Relies on the listing re-listed after the sync.
+    """
+    if not session.config.archive_after_sync or listing.versions:
+        return
+    bucket_id = listing.api.get_bucket_id(bucket_name)
+
+    def delete_replaced(record: Dict[str, Any]) -> None:
+        live = listing.cache.get(record['b2_key'])
+        if live is None:
+            return
+        try:
+            delete_versions(listing.api, bucket_id, record['b2_key'], live.file_id)
+        except B2ApiError as e:
+            logger.error(f"Failed to delete replaced versions of {record['b2_key']}: {e}")
+            record.update(status='failed', error_type=type(e).__name__, error_message=str(e))
+
+    updated = [f for f in files_processed if f.get('action') == 'update' and f.get('status') == 'success']
+    list(run_bounded(delete_replaced, updated, session.config.sync_threads))
+
+
+def mirror_deletes(session: SyncSession, bucket_name: str, listing: RemoteListing) -> List[Dict[str, Any]]:
+    """Delete bucket objects whose files left the input tree, which `b2 sync` skips while archiving.
+
+    Planned from the listing like a native sync, so archived files are never deleted.
+    """
+    if not session.config.archive_after_sync:
+        return []
+    deletes = (entry for entry in session.sync_plan(listing.iter_files(), bucket_name)
+               if entry['action'] == 'delete')
+    engine = NativeSyncEngine(listing.api, FileUploader(listing.api, bucket_name), session.config.sync_threads,
+                              keep_history=listing.versions)
+    files_deleted = list(engine.execute(deletes))
+    listing.apply_sync_results(files_deleted, Config.get_input_path())
+    return files_deleted
@@ -0,0 +1,121 @@
+"""Optional pre-upload image optimization in a process pool, cached by source SHA1."""
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from .hashcache import HashCache
+
+try:
+    from PIL import Image, ImageOps
+    PILLOW_AVAILABLE = True
+except ImportError:
+    Image = ImageOps = None
+    PILLOW_AVAILABLE = False
+
+# Constants
+OPTIMIZABLE_SUFFIXES = {".jpg", ".jpeg", ".png"}
+MIN_SAVINGS_RATIO = 0.95  # Keep the original unless re-encoding saves at least 5%
+SKIP_MARKER_SUFFIX = ".orig"
+CACHE_FORMAT_VERSION = 2  # Bumped when the encoder output changes
+
+
+class OptimizedImage(NamedTuple):
+    """A cached optimized copy of a source image."""
+    path: Path
+    source_sha1: str
+
+
+def optimize_image(source_path: str, output_path: str, jpeg_quality: int) -> bool:
+    """Re-encode one image without metadata; True if the result was written and is worth uploading.
+
+    Runs in a worker process. JPEGs are re-quantized at `jpeg_quality`, PNGs
+    are recompressed losslessly; the ICC profile is kept, EXIF and text
+    chunks are dropped after the EXIF orientation is applied to the pixels.
+    """
+    temp_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        with Image.open(source_path) as image:
+            image_format = image.format
+            options = {"optimize": True}
+            if image.info.get("icc_profile"):
+                options["icc_profile"] = image.info["icc_profile"]
+            if image_format == "JPEG":
+                options.update(quality=jpeg_quality, progressive=True)
+            ImageOps.exif_transpose(image).save(temp_path, format=image_format, **options)
+        if os.path.getsize(temp_path) >= os.path.getsize(source_path) * MIN_SAVINGS_RATIO:
+            os.remove(temp_path)
+            return False
+        os.replace(temp_path, output_path)
+        return True
+    except Exception:
+        # Unreadable or unsupported images are uploaded as they are
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+
+
+class ImageOptimizer:
+    """Re-encode images across all cores before upload, re-using earlier results for unchanged sources."""
+
+    def __init__(self, cache_dir: Path, hash_cache: HashCache, jpeg_quality: int,
+                 processes: Optional[int] = None):
+        """Initialize with the result cache directory, source hash cache and encoder settings."""
+        if not PILLOW_AVAILABLE:
+            raise RuntimeError("Image optimization is enabled but Pillow is not installed (pip install Pillow)")
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hash_cache = hash_cache
+        self.jpeg_quality = jpeg_quality
+        self.settings_tag = f"v{CACHE_FORMAT_VERSION}q{jpeg_quality}"
+        self.processes = processes or None
+        self._executor = ProcessPoolExecutor(max_workers=self.processes)
+        self._executor_lock = threading.Lock()
+
+    @classmethod
+    def for_dir(cls, cache_dir: Path, hash_cache: HashCache, jpeg_quality: int,
+                processes: Optional[int] = None) -> 'ImageOptimizer':
+        """Open an optimizer whose results are cached under a cache directory."""
+        return cls(cache_dir / "optimized", hash_cache, jpeg_quality, processes)
+
+    def __enter__(self) -> 'ImageOptimizer':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._executor.shutdown()
+
+    def prepare(self, path: Path) -> Optional[OptimizedImage]:
+        """Return the optimized copy of an image, or None to upload the original.
+
+        Called from upload threads; the encode itself runs in the process pool.
+        """
+        suffix = path.suffix.lower()
+        if suffix not in OPTIMIZABLE_SUFFIXES:
+            return None
+        source_sha1 = self.hash_cache.sha1_of(path)
+        cached = self.cache_dir / f"{source_sha1}-{self.settings_tag}{suffix}"
+        skip_marker = cached.with_name(cached.name + SKIP_MARKER_SUFFIX)
+        if skip_marker.exists():
+            return None
+        if not cached.exists():
+            if not self._optimize(path, cached):
+                skip_marker.touch()
+                return None
+        return OptimizedImage(cached, source_sha1)
+
+    def _optimize(self, path: Path, cached: Path) -> bool:
+        """Encode one image in the pool, replacing the pool if a worker died (e.g. killed for memory).
+
+        The BrokenProcessPool is re-raised so the caller can fall back to the original.
+        """
+        executor = self._executor
+        try:
+            return executor.submit(optimize_image, str(path), str(cached), self.jpeg_quality).result()
+        except BrokenProcessPool:
+            with self._executor_lock:
+                if self._executor is executor:
+                    self._executor = ProcessPoolExecutor(max_workers=self.processes)
+            raise
@@ -0,0 +1,176 @@
+"""Streaming sync planner: merge-join of the local scan and the remote listing in B2 key order."""
+
+import heapq
+import itertools
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from loguru import logger
+
+from .listing import RemoteFile
+
+# Constants
+SPILL_THRESHOLD = 50000  # Directory entries held in memory before sorting via disk runs
+
+
+class LocalFile(NamedTuple):
+    """One file from the local scan, keyed the way it will be named in the bucket."""
+    key: str
+    path: str
+    size: int
+    mtime_ms: int
+
+
+def sorted_runs(items: Iterable[Any], key: Callable[[Any], Any], run_size: int = SPILL_THRESHOLD) -> Iterator[Any]:
+    """Sort JSON-serializable items with bounded memory, spilling sorted runs to temp files."""
+    items = iter(items)
+    first = list(itertools.islice(items, run_size))
+    first.sort(key=key)
+    if len(first) < run_size:
+        yield from first
+        return
+    with tempfile.TemporaryDirectory(prefix="b2sync_runs_") as run_dir:
+        run_paths = [_write_run(Path(run_dir), 0, first)]
+        del first
+        for index in itertools.count(1):
+            chunk = sorted(itertools.islice(items, run_size), key=key)
+            if not chunk:
+                break
+            run_paths.append(_write_run(Path(run_dir), index, chunk))
+        logger.debug(f"Merging {len(run_paths)} sorted runs from {run_dir}")
+        yield from heapq.merge(*(_read_run(path) for path in run_paths), key=key)
+
+
+def _write_run(run_dir: Path, index: int, chunk: List[Any]) -> Path:
+    """Write one sorted run as JSON lines."""
+    run_path = run_dir / f"run_{index:05d}.jsonl"
+    with open(run_path, 'w') as f:
+        for item in chunk:
+            f.write(json.dumps(item) + "\n")
+    return run_path
+
+
+def _read_run(run_path: Path) -> Iterator[Any]:
+    """Stream a sorted run back, restoring lists as tuples."""
+    with open(run_path) as f:
+        for line in f:
+            yield tuple(json.loads(line))
+
+
+def _dir_entries(directory: Path) -> Iterator[tuple]:
+    """Yield (sort_name, name, is_dir, size, mtime_ms) for each entry of one directory."""
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            is_dir = entry.is_dir()
+            if is_dir:
+                yield (entry.name + "/", entry.name, True, 0, 0)
+            elif entry.is_file():
+                stat = entry.stat()
+                yield (entry.name, entry.name, False, stat.st_size, int(stat.st_mtime * 1000))
+
+
+def scan_local(input_dir: Path, exclude_patterns: Iterable[str] = ()) -> Iterator[LocalFile]:
+    """Walk the input tree emitting files in B2 key order.
+
+    Sorting each directory's children by name, with '/' appended to directories,
+    makes a depth-first walk produce keys in exact lexicographic order while
+    only holding one directory listing at a time.
+    """
+    yield from _scan_directory(input_dir, "", _compile_excludes(exclude_patterns))
+
+
+def _compile_excludes(exclude_patterns: Iterable[str]) -> List[re.Pattern]:
+    """Compile `--exclude-regex` style patterns, matched against whole keys from the start."""
+    return [re.compile(pattern) for pattern in exclude_patterns]
+
+
+def _is_excluded(key: str, excludes: List[re.Pattern]) -> bool:
+    """True if a key matches any exclude pattern."""
+    return any(pattern.match(key) for pattern in excludes)
+
+
+def without_excluded(remote_files: Iterable[RemoteFile], exclude_patterns: Iterable[str]) -> Iterator[RemoteFile]:
+    """Drop bucket objects whose keys are excluded, as `b2 sync --exclude-regex` ignores both sides."""
+    excludes = _compile_excludes(exclude_patterns)
+    return (remote for remote in remote_files if not _is_excluded(remote.key, excludes))
+
+
+def _scan_directory(directory: Path, prefix: str, excludes: List[re.Pattern]) -> Iterator[LocalFile]:
+    """Recursively emit one directory's files in key order."""
+    for sort_name, name, is_dir, size, mtime_ms in sorted_runs(_dir_entries(directory), key=lambda e: e[0]):
+        key = prefix + sort_name
+        if is_dir:
+            yield from _scan_directory(directory / name, key, excludes)
+        elif not _is_excluded(key, excludes):
+            yield LocalFile(key, str(directory / name), size, mtime_ms)
+
+
+def _file_action(local: Optional[LocalFile], remote: Optional[RemoteFile], delete: bool) -> Optional[str]:
+    """Decide what to do with one key present locally, remotely, or both."""
+    if remote is None:
+        return 'upload'
+    if local is None:
+        return 'delete' if delete else None
+    remote_mtime = remote.src_mtime_ms or remote.upload_timestamp
+    remote_size = remote.src_size if remote.src_size is not None else remote.size
+    if local.size != remote_size or local.mtime_ms != remote_mtime:
+        return 'update'
+    return 'skip'
+
+
+def _plan_entry(action: str, local: Optional[LocalFile], remote: Optional[RemoteFile]) -> Dict[str, Any]:
+    """Build a plan record in the same shape parse_b2_sync_output produces."""
+    entry = {
+        'local_path': local.path if local else '',
+        'b2_key': local.key if local else remote.key,
+        'action': action,
+        'status': 'pending',
+        'file_size_bytes': local.size if local else remote.size
+    }
+    if action == 'delete':
+        entry['file_id'] = remote.file_id
+    return entry
+
+
+def join_keys(local_files: Iterable[LocalFile],
+              remote_files: Iterable[RemoteFile]) -> Iterator[Tuple[Optional[LocalFile], Optional[RemoteFile]]]:
+    """Full outer merge-join of two key-ordered streams, pairing entries with equal keys."""
+    local_iter, remote_iter = iter(local_files), iter(remote_files)
+    local, remote = next(local_iter, None), next(remote_iter, None)
+    while local is not None or remote is not None:
+        if remote is None or (local is not None and local.key < remote.key):
+            yield local, None
+            local = next(local_iter, None)
+        elif local is None or remote.key < local.key:
+            yield None, remote
+            remote = next(remote_iter, None)
+        else:
+            yield local, remote
+            local, remote = next(local_iter, None), next(remote_iter, None)
+
+
+def merge_plan(local_files: Iterable[LocalFile], remote_files: Iterable[RemoteFile],
+               delete: bool = True, exclude_patterns: Iterable[str] = ()) -> Iterator[Dict[str, Any]]:
+    """Merge-join two key-ordered streams into upload/update/delete/skip actions.
+
+    Memory stays O(1) beyond whatever the input iterators buffer (a directory
+    listing locally, a page remotely). Remote keys matching `exclude_patterns`
+    are left alone, so excluded objects are never deleted.
+    """
+    for local, remote in join_keys(local_files, without_excluded(remote_files, exclude_patterns)):
+        action = _file_action(local, remote, delete)
+        if action:
+            yield _plan_entry(action, local, remote)
+
+
+def summarize_plan(plan: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+    """Count actions and bytes to transfer in one pass over a plan."""
+    summary = {'upload': 0, 'update': 0, 'delete': 0, 'skip': 0, 'bytes_to_transfer': 0}
+    for entry in plan:
+        summary[entry['action']] += 1
+        if entry['action'] in ('upload', 'update'):
+            summary['bytes_to_transfer'] += entry['file_size_bytes']
+    return summary
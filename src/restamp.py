@@ -0,0 +1,110 @@
+"""Bulk metadata re-stamping: server-side copies of existing objects with replaced metadata."""
+
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+from loguru import logger
+
+from .b2api import B2Api, B2ApiError
+from .engine import run_bounded
+from .listing import ListingCache, RemoteFile
+from .metadata import AUTO_CONTENT_TYPE, MAGIC_HEAD_BYTES, UploadMetadata
+from .session import SyncSession
+
+# Constants
+MAX_COPY_SIZE = 5 * 1000 ** 3  # b2_copy_file limit; larger files would need part copies
+
+
+class Restamper:
+    """Bring existing objects' metadata in line with the rules by server-side copy, without re-uploading."""
+
+    def __init__(self, api: B2Api, bucket_name: str, metadata: UploadMetadata, threads: int,
+                 cache: Optional[ListingCache] = None, keep_history: bool = False):
+        """Initialize with an authorized client, the bucket, the rules and the listing cache to keep current.
+
+        Like a native update, a copy deletes the version it replaced unless
+        `keep_history`, in which case the replaced version is recorded for retention pruning.
+        """
+        self.api = api
+        self.bucket_name = bucket_name
+        self.metadata = metadata
+        self.threads = max(1, threads)
+        self.cache = cache
+        self.keep_history = keep_history
+
+    def restamp(self, entries: Iterable[Dict[str, Any]], dry_run: bool = False) -> Iterator[Dict[str, Any]]:
+        """Re-stamp listed objects concurrently, yielding a record per object a rule matches."""
+        def run(entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            return self._restamp_one(entry, dry_run)
+        return (record for record in run_bounded(run, entries, self.threads) if record is not None)
+
+    def _read_remote_head(self, key: str) -> Callable[[], bytes]:
+        """Reader of an object's leading bytes via a ranged download."""
+        def read_head() -> bytes:
+            return self.api.open_download(self.bucket_name, key, (0, MAGIC_HEAD_BYTES - 1)).read()
+        return read_head
+
+    def _restamp_one(self, entry: Dict[str, Any], dry_run: bool) -> Optional[Dict[str, Any]]:
+        """Copy one object onto itself with the resolved metadata if it differs."""
+        key = entry['fileName']
+        if not self.metadata.matches(key):
+            return None
+        record: Dict[str, Any] = {'local_path': '', 'b2_key': key, 'action': 'skip', 'status': 'success',
+                                  'file_size_bytes': entry.get('contentLength', 0)}
+        try:
+            content_type, rule_info = self.metadata.resolve(key, self._read_remote_head(key))
+            current_info = entry.get('fileInfo') or {}
+            content_type = content_type if content_type not in (None, AUTO_CONTENT_TYPE) else entry['contentType']
+            if content_type != entry['contentType'] or any(current_info.get(k) != v for k, v in rule_info.items()):
+                record['action'] = 'restamp'
+                record.update(content_type=content_type, file_info=rule_info)
+                if entry.get('contentLength', 0) > MAX_COPY_SIZE:
+                    raise B2ApiError(0, 'too_large', "objects over 5 GB cannot be re-stamped by b2_copy_file")
+                if not dry_run:
+                    result = self.api.copy_file(entry['fileId'], key, content_type, {**current_info, **rule_info})
+                    record['file_id'] = result['fileId']
+                    self._supersede(entry, result)
+                    logger.debug(f"restamp: {key}")
+        except B2ApiError as e:
+            logger.error(f"Failed to re-stamp {key}: {e}")
+            record.update(status='failed', error_type=type(e).__name__, error_message=str(e))
+        record['sync_time'] = datetime.now().isoformat()
+        return record
+
+    def _supersede(self, entry: Dict[str, Any], result: Dict[str, Any]) -> None:
+        """Retire the version a copy replaced and make the copy the cached live object."""
+        if not self.keep_history:
+            self.api.delete_file_version(entry['fileName'], entry['fileId'])
+        if self.cache is None:
+            return
+        if self.keep_history:
+            self.cache.demote(RemoteFile.from_api(entry), result['uploadTimestamp'])
+        self.cache.upsert([RemoteFile.from_api(result)])
+
+
+def restamp_operation(session: SyncSession, prefix: str = "", dry_run: bool = False) -> int:
+    """Apply the upload metadata rules to objects already in the bucket by server-side copy."""
+    start_time = time.time()
+    metadata = session.upload_metadata()
+    if not metadata:
+        logger.error("No upload_metadata rules are configured; nothing to re-stamp")
+        return 1
+    bucket_name, output_dir, listing = session.open_bucket()
+    if listing is None:
+        return 1
+    if dry_run:
+        logger.info("DRY RUN MODE - No actual changes will be made")
+
+    restamper = Restamper(listing.api, bucket_name, metadata, session.config.sync_threads,
+                          None if dry_run else listing.cache, listing.versions)
+    files_processed = list(restamper.restamp(listing.stream_entries(prefix), dry_run))
+    execution_time = time.time() - start_time
+    errors = session.write_log(output_dir, "restamp", files_processed, execution_time, bucket_name,
+                               dry_run=dry_run)
+
+    restamped = sum(1 for f in files_processed if f['action'] == 'restamp' and f['status'] == 'success')
+    logger.info(f"Restamp completed in {execution_time:.2f} seconds")
+    logger.info(f"{'Would re-stamp' if dry_run else 'Re-stamped'}: {restamped}, already current: "
+                f"{sum(1 for f in files_processed if f['action'] == 'skip')}, failed: {len(errors)}")
+    logger.info(f"Output directory: {output_dir}")
+    return 1 if errors else 0
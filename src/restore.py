@@ -0,0 +1,188 @@
+"""Restore bucket contents to a local directory with concurrent, ranged downloads."""
+
+import hashlib
+import http.client
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, Optional
+from loguru import logger
+
+from .b2api import B2Api, B2ApiError
+from .config import Config
+from .engine import run_bounded
+from .hashcache import HashCache
+from .listing import RemoteFile
+from .session import SyncSession
+from .variants import without_prefix
+
+# Constants
+CHUNK_SIZE = 1024 * 1024
+TEMP_SUFFIX = ".b2restore"
+
+
+class Restorer:
+    """Download objects into a target directory, skipping files that already match.
+
+    Optimized uploads are matched against the source they were made from, and
+    an existing local file is never overwritten with an optimized copy.
+    """
+
+    def __init__(self, api: B2Api, bucket_name: str, target_dir: Path, hash_cache: HashCache,
+                 threads: int, part_size: int):
+        """Initialize with an authorized client, the target root and transfer settings."""
+        self.api = api
+        self.bucket_name = bucket_name
+        self.target_dir = target_dir.resolve()
+        self.hash_cache = hash_cache
+        self.threads = max(1, threads)
+        self.part_size = part_size
+        self._part_executor = ThreadPoolExecutor(max_workers=self.threads)
+
+    def restore(self, remote_files: Iterable[RemoteFile]) -> Iterator[Dict[str, Any]]:
+        """Restore every listed object, yielding a record per file as it finishes."""
+        try:
+            yield from run_bounded(self._restore_one, remote_files, self.threads)
+        finally:
+            self._part_executor.shutdown()
+            self.hash_cache.flush()
+
+    def _restore_one(self, remote: RemoteFile) -> Dict[str, Any]:
+        """Restore one object, recording failures on the returned record."""
+        target = self.target_dir / remote.key
+        record: Dict[str, Any] = {
+            'local_path': str(target),
+            'b2_key': remote.key,
+            'action': 'download',
+            'status': 'success',
+            'file_size_bytes': remote.size
+        }
+        try:
+            if not target.resolve().is_relative_to(self.target_dir):
+                raise ValueError(f"Key escapes the target directory: {remote.key}")
+            if self._already_present(target, remote):
+                record['action'] = 'skip'
+                return record
+            if target.exists() and _is_optimized(remote):
+                logger.warning(f"Kept local {remote.key}: the bucket only holds an optimized copy")
+                record['action'] = 'optimized'
+                return record
+            self._download(target, remote)
+            logger.debug(f"Restored {remote.key}")
+        except (B2ApiError, OSError, ValueError) as e:
+            logger.error(f"Failed to restore {remote.key}: {e}")
+            record.update(status='failed', error_type=type(e).__name__, error_message=str(e))
+        return record
+
+    def _already_present(self, target: Path, remote: RemoteFile) -> bool:
+        """Whether the target already holds this object's content (or the source it was optimized from)."""
+        size = remote.src_size if remote.src_size is not None else remote.size
+        sha1 = remote.src_sha1 or remote.sha1
+        if not target.is_file() or target.stat().st_size != size or not sha1:
+            return False
+        return self.hash_cache.sha1_of(target) == sha1
+
+    def _download(self, target: Path, remote: RemoteFile) -> None:
+        """Download to a temp file next to the target, verify it, then rename into place."""
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = target.with_name(f".{target.name}{TEMP_SUFFIX}")
+        try:
+            if remote.size >= 2 * self.part_size:
+                sha1 = self._download_ranged(temp_path, remote)
+            else:
+                with open(temp_path, 'wb') as f:
+                    sha1 = self._with_retries(lambda: self._copy_range(f, remote, None))
+            if remote.sha1 and sha1 != remote.sha1:
+                raise B2ApiError(0, 'checksum_mismatch', f"Downloaded SHA1 {sha1} != stored SHA1 {remote.sha1}")
+            if remote.src_mtime_ms:
+                os.utime(temp_path, ns=(remote.src_mtime_ms * 1_000_000,) * 2)
+            os.replace(temp_path, target)
+        finally:
+            temp_path.unlink(missing_ok=True)
+        stat = target.stat()
+        self.hash_cache.put(target, stat.st_size, stat.st_mtime_ns, sha1)
+
+    def _download_ranged(self, temp_path: Path, remote: RemoteFile) -> str:
+        """Fetch a large object as parallel byte ranges written at their offsets."""
+        with open(temp_path, 'wb') as f:
+            f.truncate(remote.size)
+        ranges = [(start, min(start + self.part_size, remote.size) - 1)
+                  for start in range(0, remote.size, self.part_size)]
+        futures = [self._part_executor.submit(self._download_part, temp_path, remote, byte_range)
+                   for byte_range in ranges]
+        for future in futures:
+            future.result()
+        return self._hash_file(temp_path)
+
+    def _download_part(self, temp_path: Path, remote: RemoteFile, byte_range: tuple) -> None:
+        """Write one byte range of an object into the preallocated temp file."""
+        with open(temp_path, 'r+b') as f:
+            self._with_retries(lambda: self._copy_range(f, remote, byte_range))
+
+    def _copy_range(self, f: BinaryIO, remote: RemoteFile, byte_range: Optional[tuple]) -> str:
+        """Stream a download into an open file at the range's offset, hashing as it arrives."""
+        sha1 = hashlib.sha1()
+        f.seek(byte_range[0] if byte_range else 0)
+        response = self.api.open_download(self.bucket_name, remote.key, byte_range)
+        while True:
+            chunk = response.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            sha1.update(chunk)
+            f.write(chunk)
+        expected = byte_range[1] - byte_range[0] + 1 if byte_range else remote.size
+        if f.tell() - (byte_range[0] if byte_range else 0) != expected:
+            raise OSError(f"Short read downloading {remote.key}")
+        return sha1.hexdigest()
+
+    def _with_retries(self, attempt_fn: Any) -> Any:
+        """Run a transfer, retrying connection failures and transient errors."""
+        for attempt in range(1, self.api.retry_attempts + 1):
+            try:
+                return attempt_fn()
+            except (B2ApiError, OSError, http.client.HTTPException) as e:
+                self.api.reset_connections()
+                if attempt == self.api.retry_attempts:
+                    raise B2ApiError(getattr(e, 'status', 0), 'download_failed', str(e))
+                logger.debug(f"Download attempt {attempt} failed ({e}), retrying")
+
+    @staticmethod
+    def _hash_file(path: Path) -> str:
+        """Hash an assembled file (its pages are still in the OS cache after the write)."""
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                sha1.update(chunk)
+        return sha1.hexdigest()
+
+
+def _is_optimized(remote: RemoteFile) -> bool:
+    """Whether an object is an optimized re-encode rather than the original bytes."""
+    return remote.src_size is not None or bool(remote.src_sha1)
+
+
+def restore_operation(session: SyncSession, target: str = 'input', prefix: str = "") -> int:
+    """Download bucket contents into the input or done directory."""
+    start_time = time.time()
+    bucket_name, output_dir, listing = session.open_bucket()
+    target_dir = Config.get_done_path() if target == 'done' else Config.get_input_path()
+    if listing is None:
+        return 1
+    listing.ensure_fresh(session.config.listing_cache_max_age)
+
+    restorer = Restorer(listing.api, bucket_name, target_dir, session.hash_cache(),
+                        session.config.sync_threads, session.config.part_size)
+    logger.info(f"Restoring b2://{bucket_name}/{prefix} into {target_dir}")
+    files_processed = list(restorer.restore(without_prefix(listing.iter_files(prefix), session.variant_prefix())))
+    execution_time = time.time() - start_time
+    errors = session.write_log(output_dir, "restore", files_processed, execution_time, bucket_name,
+                               target_dir=str(target_dir))
+
+    restored = sum(1 for f in files_processed if f['action'] == 'download' and f['status'] == 'success')
+    logger.info(f"Restore completed in {execution_time:.2f} seconds")
+    logger.info(f"Files restored: {restored}, already present: "
+                f"{sum(1 for f in files_processed if f['action'] == 'skip')}, kept over an optimized copy: "
+                f"{sum(1 for f in files_processed if f['action'] == 'optimized')}, failed: {len(errors)}")
+    logger.info(f"Output directory: {output_dir}")
+    return 1 if errors else 0
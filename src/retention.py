@@ -0,0 +1,98 @@
+"""Version retention: prune old file versions and hide markers recorded by the bucket listing."""
+
+import itertools
+from datetime import datetime
+from operator import attrgetter
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from loguru import logger
+
+from .b2api import B2Api, B2ApiError
+from .engine import run_bounded
+from .versions import OldVersion, VersionedListingCache
+
+# Constants
+MILLIS_PER_DAY = 86400000
+
+
+class RetentionPolicy(NamedTuple):
+    """Which old versions to keep: the newest `keep_versions` per key, or any replaced within `keep_days`.
+
+    The live version (or the hide marker of a deleted file) counts as the
+    first of `keep_versions`. Zero disables a limit; both zero keeps everything.
+    """
+    keep_versions: int
+    keep_days: int
+
+    @property
+    def enabled(self) -> bool:
+        """Whether anything is ever pruned."""
+        return self.keep_versions > 0 or self.keep_days > 0
+
+    def _keeps(self, version: OldVersion, cutoff_ms: int) -> bool:
+        """Whether one old version is still within the policy."""
+        return ((self.keep_versions > 0 and version.position < self.keep_versions)
+                or (self.keep_days > 0 and version.superseded_at >= cutoff_ms))
+
+    def prunable(self, versions: List[OldVersion], now_ms: int) -> List[OldVersion]:
+        """The versions of one key to delete, in a safe order.
+
+        A hide marker on top of a deleted file goes only once every version
+        under it has gone, and last, so no old version is ever exposed as live.
+        """
+        cutoff_ms = now_ms - self.keep_days * MILLIS_PER_DAY
+        marker = versions[0] if versions[0].position == 0 else None
+        older = [v for v in versions if v is not marker]
+        doomed = [v for v in older if not self._keeps(v, cutoff_ms)]
+        if marker is not None and len(doomed) == len(older):
+            doomed.append(marker)
+        return doomed
+
+
+class VersionPruner:
+    """Delete old versions outside the retention policy concurrently, one worker per key at a time."""
+
+    def __init__(self, api: B2Api, cache: VersionedListingCache, policy: RetentionPolicy, threads: int):
+        """Initialize with an authorized client, the listing cache holding old versions and the policy."""
+        self.api = api
+        self.cache = cache
+        self.policy = policy
+        self.threads = max(1, threads)
+
+    def prune(self) -> List[Dict[str, Any]]:
+        """Prune every key with versions outside the policy, returning a 'prune' record per key."""
+        now_ms = int(datetime.now().timestamp() * 1000)
+        groups = ((key, list(versions), now_ms) for key, versions
+                  in itertools.groupby(self.cache.iter_old_versions(), key=attrgetter('key')))
+        records = [record for record in run_bounded(self._prune_key, groups, self.threads) if record]
+        pruned = sum(record['versions_pruned'] for record in records)
+        reclaimed = sum(record['file_size_bytes'] for record in records)
+        logger.info(f"Pruned {pruned} old versions of {len(records)} files ({reclaimed / 1024**2:.1f} MB)")
+        return records
+
+    def _prune_key(self, group: Tuple[str, List[OldVersion], int]) -> Optional[Dict[str, Any]]:
+        """Delete one key's prunable versions in order, stopping at the first failure."""
+        key, versions, now_ms = group
+        doomed = self.policy.prunable(versions, now_ms)
+        if not doomed:
+            return None
+        record: Dict[str, Any] = {'local_path': '', 'b2_key': key, 'action': 'prune', 'status': 'success'}
+        deleted: List[OldVersion] = []
+        try:
+            for version in doomed:
+                self._delete(version)
+                deleted.append(version)
+        except B2ApiError as e:
+            logger.error(f"Failed to prune old versions of {key}: {e}")
+            record.update(status='failed', error_type=type(e).__name__, error_message=str(e))
+        self.cache.remove_old_versions([v.file_id for v in deleted])
+        record.update(versions_pruned=len(deleted), file_size_bytes=sum(v.size for v in deleted),
+                      sync_time=datetime.now().isoformat())
+        return record
+
+    def _delete(self, version: OldVersion) -> None:
+        """Delete one version, treating one that is already gone as deleted."""
+        try:
+            self.api.delete_file_version(version.key, version.file_id)
+        except B2ApiError as e:
+            if e.code != 'file_not_present':
+                raise
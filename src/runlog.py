@@ -0,0 +1,106 @@
+"""Streaming run log writer: one record at a time, stats in one pass, metadata written last."""
+
+import gzip
+import io
+import json
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable
+from loguru import logger
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None
+    ZSTD_AVAILABLE = False
+
+# Constants
+LOG_FORMATS = {"json": ".json", "ndjson": ".ndjson"}
+COMPRESSION_SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+ACTION_STATS = {"upload": "files_uploaded", "update": "files_updated", "delete": "files_deleted", "skip": "files_skipped"}
+COMPACT = (',', ':')
+
+
+def _open_text(path: Path, compression: str) -> IO[str]:
+    """Open a text stream for writing, compressed as requested."""
+    if compression == "gzip":
+        return gzip.open(path, 'wt', encoding='utf-8')
+    if compression == "zstd":
+        return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(open(path, 'wb')), encoding='utf-8')
+    return open(path, 'w', encoding='utf-8')
+
+
+def _file_size(record: Dict[str, Any]) -> int:
+    """Size of an uploaded file: the one recorded from the scan, else stat it (b2 CLI output has none)."""
+    if 'file_size_bytes' in record:
+        return record['file_size_bytes']
+    try:
+        return Path(record['local_path']).stat().st_size
+    except OSError:
+        return 0
+
+
+class RunLogWriter:
+    """Write a run log record by record without holding the records in memory.
+
+    'json' writes one document whose `run_metadata` follows the records and
+    errors; 'ndjson' writes one `{"file": ...}` or `{"error": ...}` object per
+    line and a final `{"run_metadata": ...}` line.
+    """
+
+    def __init__(self, path: Path, log_format: str = "json", compression: str = "none"):
+        """Open the log file (`path` plus format and compression suffixes) for streaming."""
+        if log_format not in LOG_FORMATS:
+            raise ValueError(f"Unsupported log format '{log_format}' (use {', '.join(LOG_FORMATS)})")
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unsupported log compression '{compression}' (use {', '.join(COMPRESSION_SUFFIXES)})")
+        if compression == "zstd" and not ZSTD_AVAILABLE:
+            logger.warning("zstandard is not installed (pip install zstandard); compressing the log with gzip")
+            compression = "gzip"
+        self.path = path.with_name(path.name + LOG_FORMATS[log_format] + COMPRESSION_SUFFIXES[compression])
+        self.ndjson = log_format == "ndjson"
+        self.stats: Dict[str, int] = {"total_files": 0, **{name: 0 for name in ACTION_STATS.values()},
+                                      "files_failed": 0, "versions_pruned": 0}
+        self._stream = _open_text(self.path, compression)
+        self._separator = ""
+        if not self.ndjson:
+            self._stream.write('{"files_processed":[')
+
+    def __enter__(self) -> 'RunLogWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stream.close()
+
+    def _write(self, name: str, item: Dict[str, Any]) -> None:
+        """Append one file or error record."""
+        if self.ndjson:
+            self._stream.write(json.dumps({name: item}, separators=COMPACT) + "\n")
+        else:
+            self._stream.write(self._separator + "\n" + json.dumps(item, separators=COMPACT))
+            self._separator = ","
+
+    def write_file(self, record: Dict[str, Any]) -> None:
+        """Stream one file record, counting it into the stats."""
+        action = record.get('action')
+        if action in ('upload', 'update') and record.get('local_path'):
+            record['file_size_bytes'] = _file_size(record)
+        self.stats["total_files"] += 1
+        if action in ACTION_STATS:
+            self.stats[ACTION_STATS[action]] += 1
+        if record.get('status') == 'failed':
+            self.stats["files_failed"] += 1
+        self.stats["versions_pruned"] += record.get('versions_pruned', 0)
+        self._write("file", record)
+
+    def finish(self, errors: Iterable[Dict[str, Any]], run_metadata: Dict[str, Any]) -> None:
+        """Stream the errors, then the run metadata."""
+        if not self.ndjson:
+            self._stream.write('\n],"errors":[')
+            self._separator = ""
+        for error in errors:
+            self._write("error", error)
+        if self.ndjson:
+            self._stream.write(json.dumps({"run_metadata": run_metadata}, separators=COMPACT) + "\n")
+        else:
+            self._stream.write(f'\n],"run_metadata":{json.dumps(run_metadata, separators=COMPACT)}}}\n')
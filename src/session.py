@@ -0,0 +1,216 @@
+"""Shared setup and bookkeeping for sync, verify, restore and restamp runs."""
+
+import re
+from contextlib import nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Dict, Iterable, Iterator, List, Optional, Tuple
+from loguru import logger
+
+from .archive import ArchiveIndex, Archiver, protect_archived, without_archived
+from .auth import B2AuthError, authenticate_b2, save_resolved_bucket
+from .autotune import AutoTuner, RunHistory, summarize_run
+from .b2api import B2Api, B2ApiError
+from .config import Config
+from .hashcache import HashCache
+from .links import DownloadAuthorizer
+from .listing import RemoteFile, RemoteListing, open_listing
+from .metadata import UploadMetadata
+from .optimize import PILLOW_AVAILABLE, ImageOptimizer
+from .planner import merge_plan, scan_local
+from .retention import RetentionPolicy, VersionPruner
+from .variants import without_prefix
+from .utils import create_timestamped_output_dir, generate_failure_report, generate_json_log, generate_link_files
+
+
+class SyncSession:
+    """What every operation needs from the config: the bucket, the listing, the plan and the run's logs."""
+
+    def __init__(self, config: Config):
+        """Initialize with configuration."""
+        self.config = config
+
+    def run(self, operation: str, body: Callable[[], int]) -> int:
+        """Validate the environment and run an operation, turning auth and unexpected errors into exit code 1."""
+        try:
+            logger.info(f"Starting B2 {operation} operation")
+            if not self.validate_environment():
+                return 1
+            return body()
+        except B2AuthError as e:
+            logger.error(f"Authentication error: {e}")
+            return 1
+        except Exception as e:
+            logger.error(f"Unexpected error during {operation}: {e}")
+            return 1
+
+    def validate_environment(self) -> bool:
+        """Validate environment and log errors."""
+        if not Config.validate_environment():
+            logger.error("Environment validation failed")
+            return False
+        image_stages = self.config.optimize_images or self.config.thumbnail_sizes
+        if image_stages and not PILLOW_AVAILABLE:
+            logger.error("optimize_images/thumbnail_sizes are enabled but Pillow is not installed (pip install Pillow)")
+            return False
+        if image_stages and self.config.upload_engine != 'native':
+            logger.warning("optimize_images and thumbnail_sizes only apply to the native upload engine")
+        try:
+            metadata = self.upload_metadata()
+        except (ValueError, re.error) as e:
+            logger.error(f"Invalid upload_metadata configuration: {e}")
+            return False
+        if metadata and self.config.upload_engine != 'native':
+            logger.warning("upload_metadata only applies to native uploads; run 'restamp' after a b2 CLI sync")
+        return True
+
+    def upload_metadata(self) -> UploadMetadata:
+        """Per-pattern upload headers from the config."""
+        return UploadMetadata(self.config.upload_metadata)
+
+    def resolve_bucket(self) -> str:
+        """Authenticate and return the bucket to work on, saving it for offline dry runs."""
+        bucket_name = authenticate_b2(self.config).get_bucket_name()
+        save_resolved_bucket(Config.get_cache_path(), self.config, bucket_name)
+        return bucket_name
+
+    def open_listing(self, bucket_name: str) -> Optional[RemoteListing]:
+        """Open the cached bucket listing, or None if the native API is unavailable."""
+        try:
+            api = B2Api.from_config(self.config)
+            return open_listing(api, bucket_name, Config.get_cache_path(), self.config.listing_threads,
+                                versions=self.retention_policy().enabled)
+        except (B2ApiError, B2AuthError, OSError) as e:
+            logger.warning(f"Bucket listing cache unavailable, falling back to B2 CLI listing: {e}")
+            return None
+
+    def open_bucket(self) -> Tuple[str, Path, Optional[RemoteListing]]:
+        """Resolve the bucket, create this run's output directory and open the listing."""
+        bucket_name = self.resolve_bucket()
+        output_dir = create_timestamped_output_dir(Config.get_output_path())
+        return bucket_name, output_dir, self.open_listing(bucket_name)
+
+    def hash_cache(self) -> HashCache:
+        """The persistent local SHA1 cache."""
+        return HashCache.for_dir(Config.get_cache_path())
+
+    def retention_policy(self) -> RetentionPolicy:
+        """Old-version retention from the config (disabled when both limits are 0)."""
+        return RetentionPolicy(self.config.keep_versions, self.config.keep_version_days)
+
+    def variant_prefix(self) -> str:
+        """Key prefix holding thumbnails, or '' when thumbnails are disabled."""
+        return self.config.thumbnail_prefix if self.config.thumbnail_sizes else ""
+
+    def auto_tuner(self) -> AutoTuner:
+        """Resolve 'auto' thread count and part size from run history; the tuner also measures the run."""
+        return AutoTuner(RunHistory.for_dir(Config.get_cache_path()), self.config.sync_threads,
+                         self.config.part_size, self.config.auto_sync_threads, self.config.auto_part_size)
+
+    def image_optimizer(self, hash_cache: HashCache) -> ContextManager[Optional[ImageOptimizer]]:
+        """Build the optional pre-upload image optimizer (a no-op context when disabled)."""
+        if not self.config.optimize_images:
+            return nullcontext()
+        return ImageOptimizer.for_dir(Config.get_cache_path(), hash_cache,
+                                      self.config.jpeg_quality, self.config.optimize_processes)
+
+    def mirrored_remote(self, remote_files: Iterable[RemoteFile], bucket_name: str) -> Iterator[RemoteFile]:
+        """The part of a listing the input tree mirrors: no thumbnails and no archived files."""
+        archive_index = ArchiveIndex.for_bucket(Config.get_cache_path(), bucket_name)
+        return without_archived(without_prefix(remote_files, self.variant_prefix()), archive_index.iter_keys())
+
+    def protected_plan(self, plan: Iterable[Dict[str, Any]], bucket_name: str) -> Iterator[Dict[str, Any]]:
+        """Drop planned deletes of files that were archived to 06.DONE."""
+        return protect_archived(plan, Config.get_done_path(),
+                                ArchiveIndex.for_bucket(Config.get_cache_path(), bucket_name))
+
+    def sync_plan(self, remote_files: Iterable[RemoteFile], bucket_name: str) -> Iterator[Dict[str, Any]]:
+        """Plan mirroring the input tree onto a listing, never deleting archived files."""
+        local_files = scan_local(Config.get_input_path(), self.config.exclude_patterns)
+        plan = merge_plan(local_files, self.mirrored_remote(remote_files, bucket_name),
+                          exclude_patterns=self.config.exclude_patterns)
+        return self.protected_plan(plan, bucket_name)
+
+    def prune_versions(self, listing: RemoteListing) -> List[Dict[str, str]]:
+        """Delete old versions and hide markers the retention policy no longer keeps."""
+        policy = self.retention_policy()
+        if not policy.enabled:
+            return []
+        return VersionPruner(listing.api, listing.cache, policy, self.config.sync_threads).prune()
+
+    def archive_synced(self, bucket_name: str, files_processed: List[Dict[str, str]],
+                       listing: RemoteListing, hash_cache: HashCache) -> None:
+        """Move verified uploads into 06.DONE when archiving is enabled."""
+        if not self.config.archive_after_sync:
+            return
+        archiver = Archiver(Config.get_input_path(), Config.get_done_path(), listing.cache, hash_cache,
+                            ArchiveIndex.for_bucket(Config.get_cache_path(), bucket_name), self.config.sync_threads)
+        archiver.archive(files_processed)
+
+    @staticmethod
+    def collect_errors(files_processed: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Turn failed file records into failure report entries."""
+        return [{
+            'file': f['b2_key'],
+            'error_type': f.get('error_type', 'Unknown'),
+            'error_message': f.get('error_message', ''),
+            'timestamp': f.get('sync_time', datetime.now().isoformat())
+        } for f in files_processed if f.get('status') == 'failed']
+
+    def write_log(self, output_dir: Path, operation: str, files_processed: List[Dict[str, str]],
+                  execution_time: float, bucket_name: str, **extra: Any) -> List[Dict[str, str]]:
+        """Write the failure report and JSON log of a run, returning its errors."""
+        errors = self.collect_errors(files_processed)
+        generate_failure_report(output_dir, errors, operation)
+        generate_json_log(
+            output_dir=output_dir,
+            operation=operation,
+            files_processed=files_processed,
+            errors=errors,
+            execution_time=execution_time,
+            log_format=self.config.log_format,
+            compression=self.config.log_compression,
+            bucket_name=bucket_name,
+            **extra
+        )
+        return errors
+
+    def write_sync_outputs(self, output_dir: Path, files_processed: List[Dict[str, str]], bucket_name: str,
+                           execution_time: float, listing: Optional[RemoteListing] = None,
+                           tuning: Optional[Dict[str, Any]] = None) -> List[Dict[str, str]]:
+        """Write a sync's failure report, JSON log and link files, returning its errors."""
+        errors = self.write_log(output_dir, "sync", files_processed, execution_time, bucket_name,
+                                **({'tuning': tuning} if tuning else {}))
+        generate_link_files(output_dir, files_processed, bucket_name, listing, self.variant_prefix(),
+                            self.download_authorizer(listing))
+        return errors
+
+    def download_authorizer(self, listing: Optional[RemoteListing]) -> Optional[DownloadAuthorizer]:
+        """Prepare per-folder download tokens for private-bucket links, or None for public links."""
+        if self.config.link_mode != 'authorized':
+            return None
+        if listing is None:
+            logger.error("Authorized links need the B2 native API; writing public URLs instead")
+            return None
+        authorizer = DownloadAuthorizer.for_listing(listing, self.config.link_validity_seconds,
+                                                    self.config.listing_threads)
+        try:
+            authorizer.prepare(f.key for f in listing.iter_files())
+        except B2ApiError as e:
+            logger.error(f"Failed to get download authorizations, writing public URLs instead: {e}")
+            return None
+        return authorizer
+
+    def record_run(self, files_processed: List[Dict[str, str]], execution_time: float, engine: str,
+                   tuner: Optional[AutoTuner] = None) -> None:
+        """Add this run's throughput to the history used for dry-run estimates and auto-tuning."""
+        run = summarize_run(files_processed, execution_time, engine, tuner)
+        if run['files'] or run['error_rate']:
+            RunHistory.for_dir(Config.get_cache_path()).record(run)
+
+    def log_sync_summary(self, execution_time: float, files_processed: List[Dict[str, str]],
+                         output_dir: Path) -> None:
+        """Log summary information for the sync operation."""
+        logger.info(f"Sync completed successfully in {execution_time:.2f} seconds")
+        logger.info(f"Files processed: {len(files_processed)}")
+        logger.info(f"Output directory: {output_dir}")
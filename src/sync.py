@@ -6,39 +6,55 @@ from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 from loguru import logger
 
-from .auth import B2AuthError, authenticate_b2
+from .archive import ArchiveIndex
+from .auth import authenticate_b2
+from .b2api import B2ApiError
 from .config import Config
+from .distributed import default_worker_id, distributed_sync
+from .listing import RemoteListing
+from .native import delete_replaced_versions, local_dry_run, mirror_deletes, native_sync
+from .restamp import restamp_operation
+from .restore import restore_operation
+from .session import SyncSession
+from .verify import verify_operation
+from .versions import VersionedListingCache
 from .utils import (
     create_timestamped_output_dir,
     generate_failure_report,
     generate_json_log,
-    generate_link_files,
     parse_b2_sync_output,
     run_b2_command
 )
 
 
 class B2Sync:
-    """Handle B2 sync operations."""
+    """Handle B2 sync operations.
+    
+    The native, distributed, verify, restore and restamp runs live in their own
+    modules; this class runs `b2 sync` and `clean` and dispatches the rest.
+    """
     
     def __init__(self, config: Optional[Config] = None):
         """Initialize with configuration."""
         self.config = config or Config()
-    
-    def _validate_environment(self) -> bool:
-        """Validate environment and log errors."""
-        if not Config.validate_environment():
-            logger.error("Environment validation failed")
-            return False
-        return True
+        self.session = SyncSession(self.config)
     
     def _prepare_sync_command(self, input_path: Path, bucket_name: str, dry_run: bool) -> List[str]:
         """Build the B2 sync command with all necessary options."""
         sync_command = [
             Config.B2_CLI, "sync",
             "--replace-newer",  # Allow older local files to replace newer destination files
-            "--delete",  # Delete files from destination that are not in source (true mirroring)
         ]
+        if self.config.archive_after_sync:
+            # b2 sync cannot tell archived files from deleted ones; deletions are mirrored afterwards
+            logger.info("archive_after_sync is enabled: running b2 sync without --delete, "
+                        "deleted files are removed from the bucket after the sync")
+        else:
+            sync_command.append("--delete")  # Delete files from destination that are not in source (true mirroring)
+        if self.config.auto_sync_threads or self.config.auto_part_size:
+            # Only the native engine runs the auto-tuner; b2 sync picks its own threads and part size
+            logger.warning("sync_threads/part_size_mb 'auto' is ignored by the b2 sync engine; "
+                           "set upload_engine: native to auto-tune")
         
         # Add exclusion patterns
         for pattern in self.config.exclude_patterns:
@@ -71,26 +87,25 @@ class B2Sync:
         generate_failure_report(output_dir, errors, "sync")
         return return_code
     
-    def _generate_sync_outputs(self, output_dir: Path, files_processed: List[Dict[str, str]], 
-                              bucket_name: str, execution_time: float) -> None:
-        """Generate all output files for the sync operation."""
-        generate_json_log(
-            output_dir=output_dir,
-            operation="sync",
-            files_processed=files_processed,
-            errors=[],
-            execution_time=execution_time,
-            bucket_name=bucket_name
-        )
-        
-        generate_link_files(output_dir, files_processed, bucket_name)
-    
-    def _log_sync_summary(self, execution_time: float, files_processed: List[Dict[str, str]], 
-                         output_dir: Path) -> None:
-        """Log summary information for the sync operation."""
-        logger.info(f"Sync completed successfully in {execution_time:.2f} seconds")
-        logger.info(f"Files processed: {len(files_processed)}")
-        logger.info(f"Output directory: {output_dir}")
+    def _update_listing(self, bucket_name: str, files_processed: List[Dict[str, str]],
+                        dry_run: bool) -> Optional[RemoteListing]:
+        """Bring the listing cache up to date after a sync without re-listing when possible."""
+        listing = self.session.open_listing(bucket_name)
+        if listing is None:
+            return None
+        try:
+            age = listing.cache.age_seconds()
+            # Archiving verifies against stored SHA1s, which b2 sync output does not report
+            needs_sha1s = self.config.archive_after_sync and not dry_run
+            needs_versions = listing.versions and not listing.cache.get_meta('versions_listed')
+            if age is None or age > self.config.listing_cache_max_age or needs_sha1s or needs_versions:
+                listing.refresh()
+            elif not dry_run:
+                listing.apply_sync_results(files_processed, Config.get_input_path())
+            return listing
+        except (B2ApiError, OSError) as e:
+            logger.warning(f"Failed to refresh bucket listing cache: {e}")
+            return None
     
     def _verify_bucket_access(self, bucket_name: str) -> int:
         """Verify bucket exists and is accessible."""
@@ -105,6 +120,13 @@ class B2Sync:
     
     def _get_file_count(self, bucket_name: str) -> Tuple[int, int]:
         """Get count of files in bucket."""
+        listing = self.session.open_listing(bucket_name)
+        if listing is not None:
+            try:
+                return 0, listing.refresh()
+            except (B2ApiError, OSError) as e:
+                logger.warning(f"Sharded listing failed, falling back to B2 CLI: {e}")
+        
         list_command = [Config.B2_CLI, "ls", "--long", f"b2://{bucket_name}"]
         return_code, stdout, stderr = run_b2_command(list_command)
         
@@ -152,126 +174,153 @@ class B2Sync:
         if cancel_return_code == 0:
             logger.info("Cleaned up unfinished large files")
         
-    def sync_operation(self, dry_run: bool = False) -> int:
-        """Execute sync operation to mirror input directory to B2 bucket."""
+    def _clear_listing_cache(self, bucket_name: str) -> None:
+        """Forget the cached listing, its old versions and archived keys after the bucket has been emptied."""
+        VersionedListingCache.for_bucket(Config.get_cache_path(), bucket_name).clear()
+        ArchiveIndex.for_bucket(Config.get_cache_path(), bucket_name).clear()
+    
+    def sync_operation(self, dry_run: bool = False, verify_remote: bool = False, cli_dry_run: bool = False,
+                       shared_dir: Optional[Path] = None, shards: Optional[int] = None,
+                       worker_id: Optional[str] = None) -> int:
+        """Execute sync operation to mirror input directory to B2 bucket.
+        
+        Dry runs are planned locally from the cached listing unless `cli_dry_run`
+        asks for the full `b2 sync --dry-run`. With `shared_dir`, this process
+        joins a distributed run as one of several workers.
+        """
+        return self.session.run("sync", lambda: self._sync(dry_run, verify_remote, cli_dry_run, shared_dir,
+                                                            shards, worker_id))
+    
+    def _sync(self, dry_run: bool, verify_remote: bool, cli_dry_run: bool, shared_dir: Optional[Path],
+              shards: Optional[int], worker_id: Optional[str]) -> int:
+        """Pick the sync flow for the options and engine, running `b2 sync` unless the native API handles it."""
         start_time = time.time()
+        if dry_run and not cli_dry_run:
+            return local_dry_run(self.session, verify_remote)
         
-        try:
-            logger.info("Starting B2 sync operation")
-            
-            # Validate environment
-            if not self._validate_environment():
-                return 1
-            
-            # Authenticate with B2
-            auth = authenticate_b2(self.config)
-            bucket_name = auth.get_bucket_name()
-            
-            # Create output directory with timestamp
-            output_dir = create_timestamped_output_dir(Config.get_output_path())
-            
-            # Prepare sync command
-            input_path = Config.get_input_path()
-            sync_command = self._prepare_sync_command(input_path, bucket_name, dry_run)
-            
-            # Execute sync
-            return_code, stdout, stderr = run_b2_command(sync_command, self.config.sync_timeout)
-            
-            execution_time = time.time() - start_time
-            
-            if return_code != 0:
-                return self._handle_sync_error(output_dir, return_code, stderr)
-            
-            # Parse sync output
-            files_processed = parse_b2_sync_output(stdout)
-            
-            # Generate output files
-            self._generate_sync_outputs(output_dir, files_processed, bucket_name, execution_time)
-            
-            # Log summary
-            self._log_sync_summary(execution_time, files_processed, output_dir)
-            
-            return 0
-            
-        except B2AuthError as e:
-            logger.error(f"Authentication error: {e}")
-            return 1
-        except Exception as e:
-            logger.error(f"Unexpected error during sync: {e}")
-            return 1
+        # Authenticate with B2
+        bucket_name = self.session.resolve_bucket()
+        
+        if shared_dir is not None:
+            return distributed_sync(self.session, bucket_name, shared_dir, shards, worker_id or default_worker_id())
+        
+        # Create output directory with timestamp
+        output_dir = create_timestamped_output_dir(Config.get_output_path())
+        
+        if self.config.upload_engine == 'native' and not dry_run:
+            return native_sync(self.session, output_dir, bucket_name, start_time)
+        
+        # Prepare sync command
+        input_path = Config.get_input_path()
+        sync_command = self._prepare_sync_command(input_path, bucket_name, dry_run)
+        
+        # Execute sync
+        return_code, stdout, stderr = run_b2_command(sync_command, self.config.sync_timeout)
+        
+        execution_time = time.time() - start_time
+        
+        if return_code != 0:
+            return self._handle_sync_error(output_dir, return_code, stderr)
+        
+        # Parse sync output
+        files_processed = parse_b2_sync_output(stdout)
+        
+        # Keep the listing cache current, then generate output files
+        listing = self._update_listing(bucket_name, files_processed, dry_run)
+        if listing is None and self.config.archive_after_sync and not dry_run:
+            logger.warning("Bucket listing unavailable: files deleted from the input folder "
+                           "were not removed from the bucket")
+        if listing is not None and not dry_run:
+            delete_replaced_versions(self.session, bucket_name, listing, files_processed)
+            files_processed.extend(mirror_deletes(self.session, bucket_name, listing))
+            files_processed.extend(self.session.prune_versions(listing))
+            self.session.archive_synced(bucket_name, files_processed, listing, self.session.hash_cache())
+        self.session.write_sync_outputs(output_dir, files_processed, bucket_name, execution_time, listing)
+        if not dry_run:
+            self.session.record_run(files_processed, execution_time, 'cli')
+        
+        # Log summary
+        self.session.log_sync_summary(execution_time, files_processed, output_dir)
+        
+        return 0
     
     def clean_operation(self, force: bool = False, dry_run: bool = False) -> int:
         """Execute clean operation to remove all files from B2 bucket."""
+        return self.session.run("clean", lambda: self._clean(force, dry_run))
+    
+    def _clean(self, force: bool, dry_run: bool) -> int:
+        """Empty the bucket after confirmation and forget its cached listing."""
         start_time = time.time()
         
-        try:
-            logger.info("Starting B2 clean operation")
-            
-            # Validate environment
-            if not self._validate_environment():
-                return 1
-            
-            # Authenticate with B2
-            auth = authenticate_b2(self.config)
-            bucket_name = auth.get_bucket_name()
-            
-            # Create output directory
-            output_dir = create_timestamped_output_dir(Config.get_output_path())
-            
-            # Verify bucket access
-            if self._verify_bucket_access(bucket_name) != 0:
-                return 1
-            
-            # Get file count
-            return_code, file_count = self._get_file_count(bucket_name)
-            if return_code != 0:
-                return return_code
-            
-            # Get user confirmation
-            if not self._get_user_confirmation(file_count, bucket_name, force, dry_run):
-                return 0
-            
-            # Execute clean command
-            return_code, stdout, stderr = self._execute_clean_command(bucket_name)
-            
-            execution_time = time.time() - start_time
-            
-            if return_code != 0:
-                logger.error(f"B2 clean failed with return code {return_code}")
-                logger.error(f"Error output: {stderr}")
-                return return_code
-            
-            # Clean up unfinished files
-            self._cleanup_unfinished_files(bucket_name)
-            
-            # Generate log
-            files_processed = [{
-                'local_path': '',
-                'b2_key': f'bucket://{bucket_name}',
-                'action': 'delete_all',
-                'status': 'success',
-                'file_count': file_count
-            }]
-            
-            generate_json_log(
-                output_dir=output_dir,
-                operation="clean",
-                files_processed=files_processed,
-                errors=[],
-                execution_time=execution_time,
-                bucket_name=bucket_name,
-                files_deleted=file_count
-            )
-            
-            logger.info(f"Clean completed successfully in {execution_time:.2f} seconds")
-            logger.info(f"Files deleted: {file_count}")
-            logger.info(f"Output directory: {output_dir}")
-            
-            return 0
-            
-        except B2AuthError as e:
-            logger.error(f"Authentication error: {e}")
+        # Authenticate with B2
+        auth = authenticate_b2(self.config)
+        bucket_name = auth.get_bucket_name()
+        
+        # Create output directory
+        output_dir = create_timestamped_output_dir(Config.get_output_path())
+        
+        # Verify bucket access
+        if self._verify_bucket_access(bucket_name) != 0:
             return 1
-        except Exception as e:
-            logger.error(f"Unexpected error during clean: {e}")
-            return 1
\ No newline at end of file
+        
+        # Get file count
+        return_code, file_count = self._get_file_count(bucket_name)
+        if return_code != 0:
+            return return_code
+        
+        # Get user confirmation
+        if not self._get_user_confirmation(file_count, bucket_name, force, dry_run):
+            return 0
+        
+        # Execute clean command
+        return_code, stdout, stderr = self._execute_clean_command(bucket_name)
+        
+        execution_time = time.time() - start_time
+        
+        if return_code != 0:
+            logger.error(f"B2 clean failed with return code {return_code}")
+            logger.error(f"Error output: {stderr}")
+            return return_code
+        
+        # Clean up unfinished files
+        self._cleanup_unfinished_files(bucket_name)
+        self._clear_listing_cache(bucket_name)
+        
+        # Generate log
+        files_processed = [{
+            'local_path': '',
+            'b2_key': f'bucket://{bucket_name}',
+            'action': 'delete_all',
+            'status': 'success',
+            'file_count': file_count
+        }]
+        
+        generate_json_log(
+            output_dir=output_dir,
+            operation="clean",
+            files_processed=files_processed,
+            errors=[],
+            execution_time=execution_time,
+            log_format=self.config.log_format,
+            compression=self.config.log_compression,
+            bucket_name=bucket_name,
+            files_deleted=file_count
+        )
+        
+        logger.info(f"Clean completed successfully in {execution_time:.2f} seconds")
+        logger.info(f"Files deleted: {file_count}")
+        logger.info(f"Output directory: {output_dir}")
+        
+        return 0
+    
+    def verify_operation(self) -> int:
+        """Check that the bucket matches the input directory using stored SHA1s, without downloading."""
+        return self.session.run("verify", lambda: verify_operation(self.session))
+    
+    def restamp_operation(self, prefix: str = "", dry_run: bool = False) -> int:
+        """Apply the upload metadata rules to objects already in the bucket by server-side copy."""
+        return self.session.run("restamp", lambda: restamp_operation(self.session, prefix, dry_run))
+    
+    def restore_operation(self, target: str = 'input', prefix: str = "") -> int:
+        """Download bucket contents into the input or done directory."""
+        return self.session.run("restore", lambda: restore_operation(self.session, target, prefix))
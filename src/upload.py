@@ -0,0 +1,251 @@
+"""Single-pass native uploads: stream file bytes and compute SHA1 in the same read."""
+
+import hashlib
+import http.client
+import os
+import queue
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import quote
+from loguru import logger
+
+from .b2api import B2Api, B2ApiError, RETRYABLE_STATUSES, _decode_json
+from .hashcache import HashCache
+from .metadata import AUTO_CONTENT_TYPE, UploadMetadata, buffer_head, local_head
+from .watchdog import PROGRESS_BYTES, TransferProgress, TransferStalled, TransferWatchdog, shutdown_socket
+
+# Constants
+CHUNK_SIZE = 1024 * 1024
+SHA1_HEX_LENGTH = 40
+
+
+class HashingBody:
+    """Iterable request body that hashes each chunk as it is sent and appends the hex digest.
+
+    Used with B2's `hex_digits_at_end` mode, so every byte is read exactly once and
+    files stream through one reused chunk buffer regardless of their size.
+    """
+
+    def __init__(self, source: Union[bytes, BinaryIO], start: int = 0, end: Optional[int] = None,
+                 running_sha1: Optional[Any] = None):
+        """Wrap in-memory bytes or an open binary file, and the byte range to send.
+
+        A copy of `running_sha1` (a whole-file hash, left untouched) is extended
+        with this range, so multi-part uploads get the full-file SHA1 for free.
+        """
+        if end is None:
+            end = os.fstat(source.fileno()).st_size if _is_file(source) else len(source)
+        self.source = source
+        self.start = start
+        self.end = end
+        self.running_base = running_sha1
+        self.sha1 = hashlib.sha1()
+        self.running_sha1 = running_sha1
+        self.progress: Optional[TransferProgress] = None
+
+    @property
+    def content_length(self) -> int:
+        """Bytes on the wire: the payload plus the trailing hex digest."""
+        return self.end - self.start + SHA1_HEX_LENGTH
+
+    def _chunks(self) -> Iterator[memoryview]:
+        """Yield the payload range without copying it into new buffers."""
+        if not _is_file(self.source):
+            view = memoryview(self.source)
+            for offset in range(self.start, self.end, CHUNK_SIZE):
+                yield view[offset:min(offset + CHUNK_SIZE, self.end)]
+            return
+        buffer = bytearray(CHUNK_SIZE)
+        view = memoryview(buffer)
+        self.source.seek(self.start)
+        remaining = self.end - self.start
+        while remaining > 0:
+            read = self.source.readinto(view[:min(CHUNK_SIZE, remaining)])
+            if not read:
+                raise OSError(f"File shrank while uploading ({remaining} bytes missing)")
+            remaining -= read
+            yield view[:read]
+
+    def __iter__(self) -> Iterator[memoryview]:
+        """Yield the payload in chunks, then the SHA1 hex digest.
+
+        Chunks are handed to the socket in PROGRESS_BYTES slices so the stall
+        watchdog sees progress on slow links too, and it stops watching once the
+        digest, the last byte of the body, has been taken.
+        """
+        self.sha1 = hashlib.sha1()
+        self.running_sha1 = self.running_base.copy() if self.running_base is not None else None
+        for chunk in self._chunks():
+            self.sha1.update(chunk)
+            if self.running_sha1 is not None:
+                self.running_sha1.update(chunk)
+            for offset in range(0, len(chunk), PROGRESS_BYTES):
+                piece = chunk[offset:offset + PROGRESS_BYTES]
+                yield piece
+                if self.progress is not None:
+                    self.progress.add(len(piece))
+        yield memoryview(self.sha1.hexdigest().encode())
+        if self.progress is not None:
+            self.progress.mark_sent()
+
+
+class FileUploader:
+    """Upload files and byte buffers through the native API, reusing upload URLs across calls."""
+
+    def __init__(self, api: B2Api, bucket_name: str, part_size: Optional[int] = None,
+                 large_file_threshold: Optional[int] = None, watchdog: Optional[TransferWatchdog] = None,
+                 metadata: Optional[UploadMetadata] = None, hash_cache: Optional[HashCache] = None):
+        """Initialize with an authorized client, large-file settings, an optional stall watchdog and metadata rules.
+
+        Large files are stored with their whole-file SHA1 (`large_file_sha1`) when
+        `hash_cache` already holds it for the unchanged file; otherwise B2 keeps
+        only the per-part SHA1s, since hashing first would read the file twice.
+        """
+        self.api = api
+        self.watchdog = watchdog
+        self.metadata = metadata
+        self.hash_cache = hash_cache
+        self.bucket_name = bucket_name
+        self.bucket_id = api.get_bucket_id(bucket_name)
+        self.part_size = part_size or api.recommended_part_size
+        self.large_file_threshold = large_file_threshold or 2 * self.part_size
+        self._upload_urls: queue.Queue = queue.Queue()
+
+    def upload_file(self, path: Path, key: str, file_info: Optional[Dict[str, str]] = None,
+                    content_type: str = AUTO_CONTENT_TYPE) -> Dict[str, Any]:
+        """Upload one local file, choosing single-part or large-file upload by size.
+
+        Metadata rules add their headers and, unless a content type is given, set it.
+        """
+        stat = path.stat()
+        info = {"src_last_modified_millis": str(int(stat.st_mtime * 1000)), **(file_info or {})}
+        info, content_type = self._apply_rules(key, local_head(path), info, content_type)
+        with open(path, 'rb') as f:
+            if stat.st_size >= self.large_file_threshold:
+                cached_sha1 = self.hash_cache.get(path, stat.st_size, stat.st_mtime_ns) if self.hash_cache else None
+                if cached_sha1:
+                    info.setdefault("large_file_sha1", cached_sha1)
+                return self._upload_large(f, stat.st_size, key, info, content_type)
+            return self._upload_single(f, key, info, content_type)
+
+    def upload_bytes(self, data: Union[bytes, BinaryIO], key: str, file_info: Optional[Dict[str, str]] = None,
+                     content_type: str = AUTO_CONTENT_TYPE) -> Dict[str, Any]:
+        """Upload in-memory bytes (or an open file) as a single-part file, applying the metadata rules."""
+        info, content_type = self._apply_rules(key, buffer_head(data), file_info or {}, content_type)
+        return self._upload_single(data, key, info, content_type)
+
+    def _apply_rules(self, key: str, read_head: Callable[[], bytes], file_info: Dict[str, str],
+                     content_type: str) -> Tuple[Dict[str, str], str]:
+        """Add the metadata rules' headers under the given file info and, unless a content type is given, set it."""
+        if not self.metadata:
+            return file_info, content_type
+        rule_type, rule_info = self.metadata.resolve(key, read_head)
+        if content_type == AUTO_CONTENT_TYPE and rule_type:
+            content_type = rule_type
+        return {**rule_info, **file_info}, content_type
+
+    def _upload_single(self, data: Union[bytes, BinaryIO], key: str, file_info: Dict[str, str],
+                       content_type: str) -> Dict[str, Any]:
+        """Upload a buffer or open file in one request, retrying on a fresh upload URL."""
+        headers = {
+            "X-Bz-File-Name": quote(key, safe='/'),
+            "Content-Type": content_type,
+        }
+        for name, value in file_info.items():
+            headers[f"X-Bz-Info-{name}"] = quote(str(value), safe='')
+        for attempt in range(1, self.api.retry_attempts + 1):
+            upload_url = self._take_upload_url()
+            body = HashingBody(data)
+            try:
+                result = self._post(upload_url, headers, body)
+                self._upload_urls.put(upload_url)
+                return {**result, "sha1": body.sha1.hexdigest()}
+            except TransferStalled:
+                raise
+            except B2ApiError as e:
+                if attempt == self.api.retry_attempts or not _is_transient(e):
+                    raise
+                logger.debug(f"Upload of {key} failed ({e}), retrying with a fresh upload URL")
+        raise B2ApiError(0, 'retries_exhausted', key)
+
+    def _take_upload_url(self) -> Dict[str, Any]:
+        """Reuse an idle upload URL or request a new one (B2 allows one upload per URL at a time)."""
+        try:
+            return self._upload_urls.get_nowait()
+        except queue.Empty:
+            return self.api.get_upload_url(self.bucket_id)
+
+    def _post(self, upload_url: Dict[str, Any], headers: Dict[str, str], body: HashingBody) -> Dict[str, Any]:
+        """Send one upload body to an upload URL, under the stall watchdog when one is set."""
+        headers = {
+            **headers,
+            "Authorization": upload_url['authorizationToken'],
+            "Content-Length": str(body.content_length),
+            "X-Bz-Content-Sha1": "hex_digits_at_end",
+        }
+        if self.watchdog is None:
+            return self._send(upload_url['uploadUrl'], headers, body)
+        abort = shutdown_socket(self.api.connection_for(upload_url['uploadUrl']))
+        with self.watchdog.track(headers.get("X-Bz-File-Name", "part"), abort) as progress:
+            body.progress = progress
+            try:
+                return self._send(upload_url['uploadUrl'], headers, body)
+            except B2ApiError:
+                if progress.stalled:
+                    self.api.reset_connections()
+                    raise TransferStalled(progress.key, self.watchdog.window_seconds)
+                raise
+
+    def _send(self, url: str, headers: Dict[str, str], body: HashingBody) -> Dict[str, Any]:
+        """POST a body and decode the JSON response."""
+        try:
+            status, _, data = self.api.request("POST", url, headers, body)
+        except (OSError, http.client.HTTPException) as e:
+            raise B2ApiError(0, 'connection_error', str(e))
+        return _decode_json(status, data)
+
+    def _upload_large(self, f: BinaryIO, size: int, key: str, file_info: Dict[str, str],
+                      content_type: str) -> Dict[str, Any]:
+        """Upload a large file part by part, hashing each part as it streams."""
+        large_file = self.api.start_large_file(self.bucket_id, key, content_type, file_info)
+        file_id = large_file['fileId']
+        whole_sha1 = hashlib.sha1()
+        try:
+            part_url = self.api.get_upload_part_url(file_id)
+            part_sha1s: List[str] = []
+            for part_number, start in enumerate(range(0, size, self.part_size), 1):
+                end = min(start + self.part_size, size)
+                body = self._upload_part(file_id, part_url, part_number, HashingBody(f, start, end, whole_sha1))
+                part_sha1s.append(body.sha1.hexdigest())
+                whole_sha1 = body.running_sha1
+            if file_info.get("large_file_sha1", whole_sha1.hexdigest()) != whole_sha1.hexdigest():
+                raise OSError(f"{key} changed while uploading")
+            result = self.api.finish_large_file(file_id, part_sha1s)
+        except Exception:
+            self.api.cancel_large_file(file_id)
+            raise
+        return {**result, "sha1": whole_sha1.hexdigest()}
+
+    def _upload_part(self, file_id: str, part_url: Dict[str, Any], part_number: int,
+                     body: HashingBody) -> HashingBody:
+        """Upload one part, fetching a fresh part URL on transient failures."""
+        headers = {"X-Bz-Part-Number": str(part_number)}
+        for attempt in range(1, self.api.retry_attempts + 1):
+            try:
+                self._post(part_url, headers, body)
+                return body
+            except B2ApiError as e:
+                if attempt == self.api.retry_attempts or not _is_transient(e):
+                    raise
+                part_url.update(self.api.get_upload_part_url(file_id))
+        raise B2ApiError(0, 'retries_exhausted', f"part {part_number}")
+
+
+def _is_transient(error: B2ApiError) -> bool:
+    """Upload errors that warrant a new upload URL and another attempt."""
+    return error.status in RETRYABLE_STATUSES or error.status in (0, 401)
+
+
+def _is_file(source: Any) -> bool:
+    """Whether an upload source is an open file rather than an in-memory buffer."""
+    return hasattr(source, 'readinto')
@@ -5,10 +5,13 @@ import re
 import subprocess
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 from loguru import logger
 
 from .config import Config
+from .links import DownloadAuthorizer
+from .listing import RemoteListing
+from .runlog import RunLogWriter
 
 # Constants
 DEFAULT_TIMEOUT_SECONDS = 1800  # 30 minutes
@@ -66,12 +69,22 @@ def parse_b2_sync_output(output: str) -> List[Dict[str, str]]:
     return files
 
 
-def get_actual_download_urls(bucket_name: str) -> List[Tuple[str, str]]:
+def get_actual_download_urls(bucket_name: str, listing: Optional[RemoteListing] = None,
+                             authorizer: Optional[DownloadAuthorizer] = None) -> List[Tuple[str, str]]:
     """Get actual download URLs from B2 for all files in the bucket.
     
+    Uses the cached bucket listing when one is given instead of running `b2 ls`,
+    and stamps each URL with its folder's download token when an authorizer is given.
+    
     Returns:
         List of tuples: (download_url, relative_path)
     """
+    if listing is not None:
+        file_url = listing.api.file_url
+        if authorizer is not None:
+            return [(authorizer.sign(file_url(bucket_name, f.key), f.key), f.key) for f in listing.iter_files()]
+        return [(file_url(bucket_name, f.key), f.key) for f in listing.iter_files()]
+    
     url_path_pairs = []
     try:
         # Get list of files in bucket (recursive to get all files in subdirectories)
@@ -158,17 +171,29 @@ def _create_link_file(output_dir: Path, file_path: Path, url: str) -> bool:
         return False
 
 
-def generate_link_files(output_dir: Path, files_processed: List[Dict[str, str]], bucket_name: str) -> Path:
-    """Generate individual link files for each uploaded file with B2 friendly URLs, preserving directory structure."""
+def _link_source_path(b2_key: str, variant_prefix: str) -> Path:
+    """Relative path a key's link file is named after; variants land next to their original."""
+    if variant_prefix and b2_key.startswith(variant_prefix):
+        return Path(b2_key[len(variant_prefix):])
+    return Path(b2_key)
+
+
+def generate_link_files(output_dir: Path, files_processed: List[Dict[str, str]], bucket_name: str,
+                        listing: Optional[RemoteListing] = None, variant_prefix: str = "",
+                        authorizer: Optional[DownloadAuthorizer] = None) -> Path:
+    """Generate individual link files for each uploaded file with B2 friendly URLs, preserving directory structure.
+    
+    Thumbnails under `variant_prefix` get `{name}.{size}.txt` link files beside the original's.
+    """
     # Get actual download URLs from B2 with relative paths
-    url_path_pairs = get_actual_download_urls(bucket_name)
+    url_path_pairs = get_actual_download_urls(bucket_name, listing, authorizer)
     
     files_created = 0
     
     if url_path_pairs:
         # Create individual text files for each URL, preserving directory structure
         for url, relative_path in url_path_pairs:
-            file_path = Path(relative_path)
+            file_path = _link_source_path(relative_path, variant_prefix)
             if _create_link_file(output_dir, file_path, url):
                 files_created += 1
     else:
@@ -177,7 +202,7 @@ def generate_link_files(output_dir: Path, files_processed: List[Dict[str, str]],
         for file_info in files_processed:
             b2_key = file_info.get('b2_key', '')
             if b2_key and file_info.get('action') in ['upload', 'update']:
-                file_path = Path(b2_key)
+                file_path = _link_source_path(b2_key, variant_prefix)
                 # Generate the friendly URL (using f003 as default)
                 public_url = f"https://f003.backblazeb2.com/file/{bucket_name}/{b2_key}"
                 if _create_link_file(output_dir, file_path, public_url):
@@ -190,53 +215,34 @@ def generate_link_files(output_dir: Path, files_processed: List[Dict[str, str]],
 def generate_json_log(
     output_dir: Path,
     operation: str,
-    files_processed: List[Dict[str, str]],
+    files_processed: Iterable[Dict[str, str]],
     errors: List[Dict[str, str]],
     execution_time: float,
+    log_format: str = "json",
+    compression: str = "none",
     **kwargs
 ) -> Path:
-    """Generate comprehensive JSON log file."""
-    timestamp = datetime.now().isoformat()
+    """Generate comprehensive JSON log file.
     
-    # Calculate statistics
-    stats = {
-        "files_uploaded": len([f for f in files_processed if f.get('action') == 'upload']),
-        "files_updated": len([f for f in files_processed if f.get('action') == 'update']),
-        "files_deleted": len([f for f in files_processed if f.get('action') == 'delete']),
-        "files_skipped": len([f for f in files_processed if f.get('action') == 'skip']),
-        "files_failed": len([f for f in files_processed if f.get('status') == 'failed']),
-    }
-    
-    # Add file size information for uploaded/updated files
-    for file_info in files_processed:
-        if file_info.get('action') in ['upload', 'update'] and file_info.get('local_path'):
-            local_path = Path(file_info['local_path'])
-            if local_path.exists():
-                try:
-                    file_info['file_size_bytes'] = local_path.stat().st_size
-                except Exception:
-                    file_info['file_size_bytes'] = 0
+    Records are streamed to disk as they are read, so `files_processed` may be
+    any iterable; statistics are gathered in the same pass and written last.
+    """
+    timestamp = datetime.now().isoformat()
+    log_file = output_dir / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{operation}_log"
     
-    log_data = {
-        "run_metadata": {
+    with RunLogWriter(log_file, log_format, compression) as writer:
+        for file_info in files_processed:
+            writer.write_file(file_info)
+        writer.finish(errors, {
             "timestamp": timestamp,
             "operation": operation,
-            "total_files": len(files_processed),
             "execution_time_seconds": execution_time,
-            **stats,
+            **writer.stats,
             **kwargs
-        },
-        "files_processed": files_processed,
-        "errors": errors
-    }
-    
-    log_file = output_dir / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{operation}_log.json"
-    
-    with open(log_file, 'w') as f:
-        json.dump(log_data, f, indent=2)
+        })
     
-    logger.info(f"Generated JSON log: {log_file}")
-    return log_file
+    logger.info(f"Generated JSON log: {writer.path}")
+    return writer.path
 
 
 def generate_failure_report(output_dir: Path, errors: List[Dict[str, str]], operation: str) -> Optional[Path]:
@@ -0,0 +1,175 @@
+"""Thumbnail variants rendered in a process pool and uploaded under a parallel key prefix."""
+
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from loguru import logger
+
+from .b2api import B2ApiError
+from .engine import delete_versions, remove_key, run_bounded
+from .hashcache import HashCache
+from .listing import RemoteFile
+from .planner import LocalFile, join_keys, sorted_runs
+from .upload import FileUploader
+
+try:
+    from PIL import Image, ImageOps
+    PILLOW_AVAILABLE = True
+except ImportError:
+    Image = ImageOps = None
+    PILLOW_AVAILABLE = False
+
+# Constants
+FORMAT_SUFFIXES = {"webp": ".webp", "jpeg": ".jpg", "png": ".png"}
+ALPHA_MODES = {"RGBA", "LA", "PA"}
+
+
+class PlannedVariant(NamedTuple):
+    """One thumbnail that should exist for a local source image."""
+    key: str
+    size: int
+    source_key: str
+    source_path: str
+
+
+def variant_key(source_key: str, size: int, image_format: str, prefix: str) -> str:
+    """Bucket key of a source's thumbnail: `{prefix}{dir}/{name}.{size}{suffix}`.
+
+    The full source name (extension included) keeps `img.jpg` and `img.png` apart.
+    """
+    source = PurePosixPath(source_key)
+    return f"{prefix}{source.with_name(f'{source.name}.{size}{FORMAT_SUFFIXES[image_format]}')}"
+
+
+def without_prefix(remote_files: Iterable[RemoteFile], prefix: str) -> Iterator[RemoteFile]:
+    """Drop variant objects from a listing so the main plan never deletes them."""
+    return (remote for remote in remote_files if not prefix or not remote.key.startswith(prefix))
+
+
+def render_variant(source_path: str, output_path: str, size: int, image_format: str) -> int:
+    """Render one thumbnail that fits in size x size (never upscaled); returns its byte size.
+
+    Runs in a worker process.
+    """
+    temp_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        with Image.open(source_path) as source:
+            image = ImageOps.exif_transpose(source)
+            has_alpha = image.mode in ALPHA_MODES or 'transparency' in image.info
+            image = image.convert("RGBA" if has_alpha and image_format != "jpeg" else "RGB")
+            image.thumbnail((size, size))
+            image.save(temp_path, format=image_format.upper(), optimize=True)
+        os.replace(temp_path, output_path)
+        return os.path.getsize(output_path)
+    except Exception as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise OSError(f"Cannot render {size}px variant of {source_path}: {e}") from e
+
+
+class VariantSync:
+    """Keep each source image's thumbnails in the bucket, re-rendering only when the source changes.
+
+    Variant objects carry their source's SHA1 in file info; a variant is
+    rendered and uploaded again only when that no longer matches the local
+    source.
+    """
+
+    def __init__(self, uploader: FileUploader, hash_cache: HashCache, cache_dir: Path, sizes: List[int],
+                 image_format: str, prefix: str, threads: int, processes: Optional[int] = None,
+                 keep_history: bool = False):
+        """Initialize with the uploader, render settings, pool sizes and whether replaced variants are kept."""
+        if not PILLOW_AVAILABLE:
+            raise RuntimeError("Thumbnail generation is enabled but Pillow is not installed (pip install Pillow)")
+        if image_format not in FORMAT_SUFFIXES:
+            raise ValueError(f"Unsupported thumbnail format '{image_format}' (use {', '.join(FORMAT_SUFFIXES)})")
+        self.uploader = uploader
+        self.hash_cache = hash_cache
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.sizes = sorted(set(sizes))
+        self.image_format = image_format
+        self.prefix = prefix
+        self.threads = max(1, threads)
+        self.keep_history = keep_history
+        self._executor = ProcessPoolExecutor(max_workers=processes or None)
+
+    def __enter__(self) -> 'VariantSync':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._executor.shutdown()
+
+    def sync(self, local_files: Iterable[LocalFile], remote_variants: Iterable[RemoteFile],
+             archived_keys: Iterable[str] = ()) -> Iterator[Dict[str, Any]]:
+        """Bring the variant prefix in line with the local images, yielding a record per variant key.
+
+        Variants of archived images are kept as they are.
+        """
+        expected = sorted_runs(itertools.chain(self._expected(local_files), self._kept(archived_keys)),
+                               key=lambda item: item[0])
+        pairs = join_keys((PlannedVariant(*item) for item in expected), remote_variants)
+        try:
+            yield from (record for record in run_bounded(self._run, pairs, self.threads) if record is not None)
+        finally:
+            self.hash_cache.flush()
+
+    def _expected(self, local_files: Iterable[LocalFile]) -> Iterator[Tuple[str, int, str, str]]:
+        """Every (variant_key, size, source_key, source_path) the local tree calls for, unsorted."""
+        for local in local_files:
+            for size in self.sizes:
+                yield (variant_key(local.key, size, self.image_format, self.prefix), size, local.key, local.path)
+
+    def _kept(self, archived_keys: Iterable[str]) -> Iterator[Tuple[str, int, str, str]]:
+        """Variant keys of archived images, with no local source to render from."""
+        for key in archived_keys:
+            for size in self.sizes:
+                yield (variant_key(key, size, self.image_format, self.prefix), size, key, '')
+
+    def _run(self, pair: Tuple[Optional[PlannedVariant], Optional[RemoteFile]]) -> Optional[Dict[str, Any]]:
+        """Skip, render and upload, or delete one variant key (None for an archived image without one)."""
+        planned, remote = pair
+        if planned is not None and not planned.source_path and remote is None:
+            return None
+        record: Dict[str, Any] = {
+            'local_path': planned.source_path if planned else '',
+            'b2_key': planned.key if planned else remote.key,
+            'action': 'skip',
+            'status': 'success',
+            'file_size_bytes': remote.size if remote else 0,
+            'variant_of': planned.source_key if planned else ''
+        }
+        try:
+            if planned is None:
+                record['action'] = 'delete'
+                remove_key(self.uploader.api, self.uploader.bucket_id, record, self.keep_history)
+            elif planned.source_path:
+                source_sha1 = self.hash_cache.sha1_of(Path(planned.source_path))
+                if remote is None or remote.src_sha1 != source_sha1:
+                    record['action'] = 'update' if remote else 'upload'
+                    self._upload(planned, source_sha1, record)
+                    if remote is not None and not self.keep_history:
+                        delete_versions(self.uploader.api, self.uploader.bucket_id, planned.key, record['file_id'])
+        except (B2ApiError, OSError) as e:
+            logger.error(f"Failed to {record['action']} variant {record['b2_key']}: {e}")
+            record.update(status='failed', error_type=type(e).__name__, error_message=str(e))
+        record['sync_time'] = datetime.now().isoformat()
+        return record
+
+    def _upload(self, planned: PlannedVariant, source_sha1: str, record: Dict[str, Any]) -> None:
+        """Render a variant (or reuse the cached render) and upload it tagged with its source's SHA1."""
+        rendered = self.cache_dir / f"{source_sha1}-{planned.size}{FORMAT_SUFFIXES[self.image_format]}"
+        if not rendered.exists():
+            self._executor.submit(render_variant, planned.source_path, str(rendered),
+                                  planned.size, self.image_format).result()
+        file_info = {
+            "src_sha1": source_sha1,
+            "src_last_modified_millis": str(int(os.stat(planned.source_path).st_mtime * 1000))
+        }
+        result = self.uploader.upload_file(rendered, planned.key, file_info)
+        record.update(file_id=result['fileId'], sha1=result['sha1'], src_sha1=source_sha1,
+                      file_size_bytes=result['contentLength'])
+        logger.debug(f"Uploaded variant {planned.key}")
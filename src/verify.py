@@ -0,0 +1,95 @@
+"""Integrity verification: compare local SHA1s with the SHA1s stored in the bucket."""
+
+import time
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from loguru import logger
+
+from .config import Config
+from .engine import run_bounded
+from .hashcache import HashCache
+from .listing import RemoteFile
+from .planner import LocalFile, join_keys, scan_local, without_excluded
+from .session import SyncSession
+
+
+def verify_files(local_files: Iterable[LocalFile], remote_files: Iterable[RemoteFile],
+                 hash_cache: HashCache, threads: int) -> Iterator[Dict[str, Any]]:
+    """Check every key present on either side, hashing local files in parallel."""
+    check = partial(_check_pair, hash_cache)
+    yield from run_bounded(check, join_keys(local_files, remote_files), threads)
+
+
+def _check_pair(hash_cache: HashCache, pair: Tuple[Optional[LocalFile], Optional[RemoteFile]]) -> Dict[str, Any]:
+    """Compare one local file with its bucket object."""
+    local, remote = pair
+    record: Dict[str, Any] = {
+        'local_path': local.path if local else '',
+        'b2_key': local.key if local else remote.key,
+        'action': 'verify',
+        'status': 'success',
+        'result': 'match'
+    }
+    if remote is None:
+        return _failed(record, 'missing', 'MissingRemote', "File exists locally but not in the bucket")
+    if local is None:
+        return _failed(record, 'extra', 'ExtraRemote', "File exists in the bucket but not locally")
+    # Optimized uploads are checked against the source they were made from
+    remote_size = remote.src_size if remote.src_size is not None else remote.size
+    remote_sha1 = remote.src_sha1 or remote.sha1
+    if local.size != remote_size:
+        return _failed(record, 'mismatch', 'SizeMismatch', f"Local size {local.size} != remote size {remote_size}")
+    if not remote_sha1:
+        record['result'] = 'unverified'
+        return record
+    try:
+        local_sha1 = hash_cache.sha1_of(Path(local.path))
+    except OSError as e:
+        return _failed(record, 'unreadable', 'LocalReadError', str(e))
+    if local_sha1 != remote_sha1:
+        return _failed(record, 'mismatch', 'ChecksumMismatch', f"Local SHA1 {local_sha1} != remote SHA1 {remote_sha1}")
+    return record
+
+
+def _failed(record: Dict[str, Any], result: str, error_type: str, message: str) -> Dict[str, Any]:
+    """Mark a verification record as failed."""
+    record.update(status='failed', result=result, error_type=error_type, error_message=message)
+    return record
+
+
+def verify_operation(session: SyncSession) -> int:
+    """Check that the bucket matches the input directory using stored SHA1s, without downloading."""
+    start_time = time.time()
+    config = session.config
+    bucket_name, output_dir, listing = session.open_bucket()
+    if listing is None:
+        return 1
+    listing.refresh()
+
+    hash_cache = session.hash_cache()
+    local_files = scan_local(Config.get_input_path(), config.exclude_patterns)
+    remote_files = without_excluded(session.mirrored_remote(listing.iter_files(), bucket_name),
+                                    config.exclude_patterns)
+    files_processed = list(verify_files(local_files, remote_files, hash_cache, config.sync_threads))
+    hash_cache.flush()
+    execution_time = time.time() - start_time
+
+    counts = _log_verify_summary(execution_time, files_processed, output_dir)
+    errors = session.write_log(output_dir, "verify", files_processed, execution_time, bucket_name,
+                               verify_results=counts)
+    return 1 if errors else 0
+
+
+def _log_verify_summary(execution_time: float, files_processed: List[Dict[str, str]],
+                        output_dir: Path) -> Dict[str, int]:
+    """Log and return per-result counts for a verify run."""
+    counts: Dict[str, int] = {}
+    for record in files_processed:
+        counts[record['result']] = counts.get(record['result'], 0) + 1
+    logger.info(f"Verify completed in {execution_time:.2f} seconds")
+    logger.info(f"Matching: {counts.get('match', 0)}, mismatched: {counts.get('mismatch', 0)}, "
+                f"missing: {counts.get('missing', 0)}, extra: {counts.get('extra', 0)}, "
+                f"unverified (no stored SHA1): {counts.get('unverified', 0)}")
+    logger.info(f"Output directory: {output_dir}")
+    return counts
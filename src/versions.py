@@ -0,0 +1,172 @@
+"""Versions-mode bucket listing: old versions and hide markers cached for retention pruning."""
+
+import queue
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+from .listing import PAGE_SIZE, ListingCache, RemoteFile, RemoteListing
+
+
+class OldVersion(NamedTuple):
+    """A version that is not the live copy of its key: a previous upload or a hide marker."""
+    key: str
+    file_id: str
+    position: int  # 0 = newest version of the key (only ever a hide marker here)
+    action: str
+    size: int
+    superseded_at: int  # Millis when a newer version replaced or hid it
+
+
+class VersionedListingCache(ListingCache):
+    """Listing cache that also keeps every old version and hide marker, positioned as B2 lists them."""
+
+    def __init__(self, db_path: Path):
+        """Open (and create if needed) the cache database with its old versions table."""
+        super().__init__(db_path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS old_versions (
+                key TEXT,
+                file_id TEXT PRIMARY KEY,
+                position INTEGER,
+                action TEXT,
+                size INTEGER,
+                superseded_at INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS old_versions_by_key ON old_versions (key, position);
+        """)
+
+    def delete(self, keys: List[str]) -> None:
+        """Remove cached objects, and any old versions recorded for them, by key."""
+        super().delete(keys)
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM old_versions WHERE key = ?", [(key,) for key in keys])
+
+    def clear(self) -> None:
+        """Remove every cached object, old version and the refresh state."""
+        super().clear()
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM old_versions")
+
+    def add_old_versions(self, versions: List[OldVersion]) -> None:
+        """Insert or replace old versions."""
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO old_versions VALUES (?, ?, ?, ?, ?, ?)",
+                                  [(v.key, v.file_id, v.position, v.action, v.size, v.superseded_at)
+                                   for v in versions])
+
+    def remove_old_versions(self, file_ids: List[str]) -> None:
+        """Forget old versions that were deleted from the bucket."""
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM old_versions WHERE file_id = ?", [(i,) for i in file_ids])
+
+    def _make_room(self, key: str, superseded_at: int) -> None:
+        """Shift a key's old versions down one position under a new newest version; caller holds the lock.
+
+        A hide marker on top is superseded by the new version at that moment.
+        """
+        self.conn.execute("UPDATE old_versions SET superseded_at = ? WHERE key = ? AND position = 0",
+                          (superseded_at, key))
+        self.conn.execute("UPDATE old_versions SET position = position + 1 WHERE key = ?", (key,))
+
+    def supersede(self, key: str, superseded_at: int) -> None:
+        """Record a new live version of a key that had none (e.g. a hidden file uploaded again)."""
+        with self.lock, self.conn:
+            self._make_room(key, superseded_at)
+
+    def demote(self, previous: RemoteFile, superseded_at: int) -> None:
+        """Record a replaced live object as its key's newest old version."""
+        with self.lock, self.conn:
+            self._make_room(previous.key, superseded_at)
+            self.conn.execute("INSERT OR REPLACE INTO old_versions VALUES (?, ?, 1, 'upload', ?, ?)",
+                              (previous.key, previous.file_id, previous.size, superseded_at))
+
+    def hide(self, key: str, marker_id: str, hidden_at: int) -> None:
+        """Record a hide marker on top of a key, demoting its live object."""
+        previous = self.get(key)
+        with self.lock, self.conn:
+            self._make_room(key, hidden_at)
+            if previous is not None:
+                self.conn.execute("INSERT OR REPLACE INTO old_versions VALUES (?, ?, 1, 'upload', ?, ?)",
+                                  (key, previous.file_id, previous.size, hidden_at))
+            self.conn.execute("INSERT OR REPLACE INTO old_versions VALUES (?, ?, 0, 'hide', 0, ?)",
+                              (key, marker_id, hidden_at))
+            self.conn.execute("DELETE FROM files WHERE key = ?", (key,))
+
+    def iter_old_versions(self) -> Iterator[OldVersion]:
+        """Stream old versions ordered by key, newest first within a key."""
+        query = ("SELECT * FROM old_versions WHERE key > ? OR (key = ? AND position > ?) "
+                 f"ORDER BY key, position LIMIT {PAGE_SIZE}")
+        last_key, last_position = "", -1
+        while True:
+            with self.lock:
+                rows = self.conn.execute(query, (last_key, last_key, last_position)).fetchall()
+            yield from (OldVersion(*row) for row in rows)
+            if len(rows) < PAGE_SIZE:
+                return
+            last_key, last_position = rows[-1][0], rows[-1][2]
+
+
+class VersionedListing(RemoteListing):
+    """Remote listing that pages through b2_list_file_versions, caching the live
+    objects as usual and recording every older version and hide marker."""
+
+    versions = True
+
+    def _list_shard(self, start: str, end: Optional[str], pages: queue.Queue) -> int:
+        """Page through every version in one key range, splitting live objects from old versions.
+
+        A key's versions can span pages, so its position counter carries over.
+        Unfinished large files ('start' entries) are left to the clean command.
+        """
+        next_name: Optional[str] = start or None
+        next_id: Optional[str] = None
+        last_key, position, newer_timestamp, listed = None, 0, 0, 0
+        while True:
+            page = self.api.list_file_versions(self.bucket_id, next_name, next_id, max_file_count=PAGE_SIZE)
+            listed_page: List[Any] = []
+            for entry in page['files']:
+                key, action = entry['fileName'], entry.get('action', 'upload')
+                if end is not None and key >= end:
+                    break
+                if action not in ('upload', 'hide'):
+                    continue
+                if key != last_key:
+                    last_key, position = key, 0
+                timestamp = entry.get('uploadTimestamp', 0)
+                if position == 0 and action == 'upload':
+                    listed_page.append(RemoteFile.from_api(entry))
+                    listed += 1
+                else:
+                    listed_page.append(OldVersion(key, entry['fileId'], position, action,
+                                                  entry.get('contentLength', 0),
+                                                  newer_timestamp if position else timestamp))
+                position, newer_timestamp = position + 1, timestamp
+            pages.put(listed_page)
+            next_name, next_id = page.get('nextFileName'), page.get('nextFileId')
+            if next_name is None or (end is not None and next_name >= end):
+                return listed
+
+    def _write_batch(self, batch: List[Any]) -> None:
+        """Store listed live objects and old versions."""
+        self.cache.upsert([entry for entry in batch if isinstance(entry, RemoteFile)])
+        self.cache.add_old_versions([entry for entry in batch if isinstance(entry, OldVersion)])
+
+    def _record_upload(self, entry: RemoteFile) -> None:
+        """Push the key's current live object (or hide marker) down under a new upload.
+
+        `b2 sync` results carry no file ID, and it deletes the versions it replaces itself.
+        """
+        if not entry.file_id:
+            return
+        previous = self.cache.get(entry.key)
+        if previous is None:
+            self.cache.supersede(entry.key, entry.upload_timestamp)
+        elif previous.file_id != entry.file_id:
+            self.cache.demote(previous, entry.upload_timestamp)
+
+    def _record_hide(self, file_info: Dict[str, Any]) -> bool:
+        """Record the hide marker a delete left, if it hid the key rather than deleting it."""
+        if 'hide_file_id' not in file_info:
+            return False
+        self.cache.hide(file_info['b2_key'], file_info['hide_file_id'], file_info['hidden_at'])
+        return True
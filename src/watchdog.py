@@ -0,0 +1,130 @@
+"""Stall detection for in-flight transfers."""
+
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+from loguru import logger
+
+from .b2api import B2ApiError
+
+# Constants
+CHECK_INTERVAL_SECONDS = 1.0
+PROGRESS_BYTES = 64 * 1024  # Transfers report progress at least every this many bytes
+
+
+class TransferStalled(B2ApiError):
+    """A transfer was aborted because its throughput stayed below the stall threshold."""
+
+    def __init__(self, key: str, window_seconds: float):
+        super().__init__(0, 'transfer_stalled', f"{key} stalled for {window_seconds:.0f}s")
+
+
+class TransferProgress:
+    """Byte counter for one in-flight transfer, updated by the transferring thread."""
+
+    def __init__(self, key: str, abort: Callable[[], None]):
+        """Initialize with the transfer's key and a callback that breaks its connection."""
+        self.key = key
+        self.abort = abort
+        self.bytes_done = 0
+        self.stalled = False
+        self.sent = False
+        self._checked_bytes = 0
+        self._checked_at = time.monotonic()
+        self._slow_since: Optional[float] = None
+
+    def add(self, count: int) -> None:
+        """Record bytes moved."""
+        self.bytes_done += count
+
+    def mark_sent(self) -> None:
+        """Record that the whole request body is sent; waiting for the response is left to the HTTP timeout."""
+        self.sent = True
+
+
+class TransferWatchdog:
+    """Background thread that aborts transfers whose rate stays below a threshold for a window."""
+
+    def __init__(self, min_bytes_per_sec: int, window_seconds: float):
+        """Initialize with the stall threshold and how long a transfer may stay below it.
+
+        The window is raised to at least two progress reports at the threshold
+        rate, since a slower but healthy transfer reports nothing in between.
+        """
+        min_window = 2 * PROGRESS_BYTES / min_bytes_per_sec if min_bytes_per_sec > 0 else 0
+        if window_seconds < min_window:
+            logger.warning(f"A {window_seconds}s stall window is too short to measure {min_bytes_per_sec} B/s; "
+                           f"using {min_window:.0f}s")
+            window_seconds = min_window
+        self.min_bytes_per_sec = min_bytes_per_sec
+        self.window_seconds = window_seconds
+        self._transfers: Dict[int, TransferProgress] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> 'TransferWatchdog':
+        self._thread = threading.Thread(target=self._watch, name="transfer-watchdog", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    @contextmanager
+    def track(self, key: str, abort: Callable[[], None]) -> Iterator[TransferProgress]:
+        """Watch a transfer for the duration of the block."""
+        progress = TransferProgress(key, abort)
+        with self._lock:
+            self._transfers[id(progress)] = progress
+        try:
+            yield progress
+        finally:
+            with self._lock:
+                self._transfers.pop(id(progress), None)
+
+    def _watch(self) -> None:
+        """Check every tracked transfer once per interval until stopped."""
+        while not self._stop.wait(CHECK_INTERVAL_SECONDS):
+            with self._lock:
+                transfers = list(self._transfers.values())
+            now = time.monotonic()
+            for progress in transfers:
+                self._check(progress, now)
+
+    def _check(self, progress: TransferProgress, now: float) -> None:
+        """Update one transfer's rate and abort it once it has been slow for the whole window.
+
+        Transfers whose body is fully sent are skipped: B2 may take a while to
+        check a large part's SHA1 before it responds.
+        """
+        if progress.sent:
+            return
+        elapsed = now - progress._checked_at
+        rate = (progress.bytes_done - progress._checked_bytes) / elapsed if elapsed > 0 else 0
+        progress._checked_bytes, progress._checked_at = progress.bytes_done, now
+        if rate >= self.min_bytes_per_sec:
+            progress._slow_since = None
+        elif progress._slow_since is None:
+            progress._slow_since = now
+        elif now - progress._slow_since >= self.window_seconds and not progress.stalled:
+            logger.warning(f"Transfer of {progress.key} stalled below {self.min_bytes_per_sec} B/s "
+                           f"for {self.window_seconds:.0f}s, aborting")
+            progress.stalled = True
+            progress.abort()
+
+
+def shutdown_socket(connection: object) -> Callable[[], None]:
+    """Build an abort callback that breaks a connection's socket from another thread."""
+    def abort() -> None:
+        sock = getattr(connection, 'sock', None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+    return abort
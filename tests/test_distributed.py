@@ -0,0 +1,119 @@
+"""Tests for distributed-run leases, shard plans and worker result publishing."""
+
+from typing import Any, Dict, Iterator, List
+
+import pytest
+
+from src.distributed import (
+    DistributedWorker,
+    LeaseStore,
+    ShardPlans,
+    read_results,
+    result_path,
+    shard_of
+)
+
+
+def _store(tmp_path, shards: int = 2) -> LeaseStore:
+    store = LeaseStore(tmp_path / "leases.sqlite")
+    store.join_run(shards, default_shards=8)
+    return store
+
+
+def test_claims_hand_out_each_open_shard_once(tmp_path):
+    store = _store(tmp_path)
+    assert store.claim("a", lease_seconds=60) == 0
+    assert store.claim("b", lease_seconds=60) == 1
+    assert store.claim("c", lease_seconds=60) is None
+    assert store.remaining() == 2
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    store = _store(tmp_path, shards=1)
+    assert store.claim("a", lease_seconds=-1) == 0
+    assert store.claim("b", lease_seconds=60) == 0
+    # The original holder can neither renew nor complete the shard any more
+    assert not store.renew(0, "a", lease_seconds=60)
+    assert not store.complete(0, "a")
+    assert store.renew(0, "b", lease_seconds=60)
+    assert store.complete(0, "b")
+    assert store.completed() == [(0, "b")]
+
+
+def test_only_one_worker_merges_once_every_shard_is_done(tmp_path):
+    store = _store(tmp_path)
+    store.claim("a", lease_seconds=60)
+    store.complete(0, "a")
+    assert not store.claim_merge("a")
+    store.claim("b", lease_seconds=60)
+    store.complete(1, "b")
+    assert store.claim_merge("b")
+    assert not store.claim_merge("a")
+
+
+def test_join_run_reuses_the_run_in_progress(tmp_path):
+    store = LeaseStore(tmp_path / "leases.sqlite")
+    run_id, shards, _ = store.join_run(None, default_shards=3)
+    assert shards == 3
+    other = LeaseStore(tmp_path / "leases.sqlite")
+    assert other.join_run(None, default_shards=5)[:2] == (run_id, 3)
+    with pytest.raises(ValueError):
+        other.join_run(4, default_shards=5)
+
+
+def test_a_merged_run_is_replaced_by_a_new_one(tmp_path):
+    store = _store(tmp_path, shards=1)
+    store.claim("a", lease_seconds=60)
+    store.complete(0, "a")
+    store.claim_merge("a")
+    store.join_run(2, default_shards=8)
+    assert store.remaining() == 2
+    assert store.completed() == []
+
+
+def test_worker_publishes_each_shards_results(tmp_path):
+    store = _store(tmp_path)
+    worker = DistributedWorker(store, tmp_path / "results", "a", lease_seconds=60)
+
+    def sync_shard(shard: int) -> Iterator[Dict[str, Any]]:
+        yield {'b2_key': f"file{shard}", 'status': 'failed' if shard else 'success'}
+
+    worker.run(sync_shard)
+    assert (worker.shards_done, worker.failed) == (2, 1)
+    assert [r['b2_key'] for r in read_results(store, tmp_path / "results")] == ["file0", "file1"]
+
+
+def test_worker_discards_a_shard_whose_lease_was_taken_over(tmp_path):
+    store = _store(tmp_path, shards=1)
+    results_dir = tmp_path / "results"
+    worker = DistributedWorker(store, results_dir, "a", lease_seconds=60)
+
+    def sync_shard(shard: int) -> Iterator[Dict[str, Any]]:
+        # Another worker takes the shard over (as if our lease had expired) and finishes it first
+        store.conn.execute("UPDATE shards SET lease_expires = 0")
+        assert store.claim("b", lease_seconds=60) == shard
+        result_path(results_dir, shard, "b").write_text('{"b2_key": "by-b"}\n')
+        store.complete(shard, "b")
+        yield {'b2_key': "by-a", 'status': 'success'}
+
+    worker.run(sync_shard)
+    assert worker.shards_done == 0
+    assert not result_path(results_dir, 0, "a").exists()
+    assert [r['b2_key'] for r in read_results(store, results_dir)] == ["by-b"]
+
+
+def test_shard_plans_split_the_plan_once_and_keep_key_order():
+    keys = [f"key{n:03d}" for n in range(200)]
+    calls: List[int] = []
+
+    def plan() -> Iterator[Dict[str, Any]]:
+        calls.append(1)
+        return ({'b2_key': key, 'action': 'upload'} for key in keys)
+
+    with ShardPlans(plan, shards=3) as plans:
+        split = {shard: [entry['b2_key'] for entry in plans.entries(shard)] for shard in range(3)}
+    assert calls == [1]
+    assert sorted(key for shard_keys in split.values() for key in shard_keys) == keys
+    for shard, shard_keys in split.items():
+        assert shard_keys == sorted(shard_keys)
+        assert all(shard_of(key, 3) == shard for key in shard_keys)
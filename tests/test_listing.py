@@ -0,0 +1,110 @@
+"""Tests for the sharded bucket listing and its learned split points."""
+
+from typing import Any, Dict, List, Optional
+
+import src.listing as listing_module
+from src.listing import ListingCache, RemoteFile, RemoteListing
+
+KEYS = sorted([f"photos/{n:03d}.jpg" for n in range(40)] + [f"docs/{n:03d}.txt" for n in range(25)]
+              + ["readme.txt", "videos/clip.mp4"])
+
+
+class ListApi:
+    """Just enough of B2Api to page through b2_list_file_names and record each call."""
+
+    def __init__(self, keys: List[str]):
+        self.entries = [{"fileName": key, "fileId": f"id-{key}", "contentLength": 1, "contentSha1": "abc",
+                         "uploadTimestamp": 1, "action": "upload", "fileInfo": {}} for key in keys]
+        self.calls: List[Dict[str, Any]] = []
+
+    def get_bucket_id(self, bucket_name: str) -> str:
+        return "bucket-id"
+
+    def list_file_names(self, bucket_id: str, start_file_name: Optional[str] = None, prefix: str = "",
+                        delimiter: Optional[str] = None, max_file_count: int = 10000) -> Dict[str, Any]:
+        self.calls.append({"start": start_file_name, "delimiter": delimiter})
+        entries = [e for e in self.entries if e["fileName"] >= (start_file_name or "")
+                   and e["fileName"].startswith(prefix)]
+        if delimiter:
+            folders = sorted({e["fileName"].split(delimiter)[0] + delimiter for e in entries
+                              if delimiter in e["fileName"]})
+            return {"files": [{"fileName": folder, "action": "folder"} for folder in folders], "nextFileName": None}
+        page = entries[:max_file_count]
+        next_name = entries[max_file_count]["fileName"] if len(entries) > max_file_count else None
+        return {"files": page, "nextFileName": next_name}
+
+
+def _listing(tmp_path, api: ListApi, threads: int = 2) -> RemoteListing:
+    return RemoteListing(api, "bucket", ListingCache.for_bucket(tmp_path, "bucket"), threads)
+
+
+def test_first_refresh_shards_by_top_level_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(listing_module, "PAGE_SIZE", 7)
+    api = ListApi(KEYS)
+    listing = _listing(tmp_path, api)
+    assert listing.plan_shards() == [("", "docs/"), ("docs/", "photos/"), ("photos/", "videos/"), ("videos/", None)]
+    assert listing.refresh() == len(KEYS)
+    assert [f.key for f in listing.iter_files()] == KEYS
+    assert {"start": "photos/", "delimiter": None} in api.calls
+
+
+def test_shards_never_list_past_their_end(tmp_path, monkeypatch):
+    monkeypatch.setattr(listing_module, "PAGE_SIZE", 100)
+    api = ListApi(KEYS)
+    listing = _listing(tmp_path, api)
+    listing.refresh()
+    # One page per shard: each stops as soon as the page reaches the next shard's start
+    assert sum(1 for call in api.calls if call["delimiter"] is None) == 4
+    assert listing.cache.count() == len(KEYS)
+
+
+def test_refresh_skips_hidden_files(tmp_path):
+    api = ListApi(["a.txt", "b.txt"])
+    api.entries[1]["action"] = "hide"
+    listing = _listing(tmp_path, api)
+    listing.refresh()
+    assert [f.key for f in listing.iter_files()] == ["a.txt"]
+
+
+def test_refresh_learns_split_points_for_the_next_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(listing_module, "MIN_SHARD_FILES", 10)
+    api = ListApi(KEYS)
+    listing = _listing(tmp_path, api, threads=1)
+    listing.refresh()
+    learned = listing.cache.get_meta("split_points")
+    # SHARDS_PER_THREAD shards for one thread, spaced evenly through the 67 keys
+    assert learned == [KEYS[15], KEYS[31], KEYS[47]]
+
+    api.calls.clear()
+    assert listing.plan_shards() == [("", KEYS[15]), (KEYS[15], KEYS[31]), (KEYS[31], KEYS[47]), (KEYS[47], None)]
+    listing.refresh()
+    assert not any(call["delimiter"] for call in api.calls)
+    assert [f.key for f in listing.iter_files()] == KEYS
+
+
+def test_learn_split_points_uses_fewer_shards_for_small_listings(tmp_path, monkeypatch):
+    monkeypatch.setattr(listing_module, "MIN_SHARD_FILES", 20)
+    cache = ListingCache.for_bucket(tmp_path, "bucket")
+    cache.upsert([RemoteFile(key, "id", 1, None, 1, None) for key in KEYS])
+    assert len(cache.learn_split_points(16)) == 2  # 67 keys // 20 -> 3 shards
+    cache.delete(KEYS[30:])
+    assert cache.learn_split_points(16) == []
+
+
+def test_sync_results_update_the_cache_and_b2_sync_results_mark_it_incomplete(tmp_path):
+    (tmp_path / "in").mkdir()
+    (tmp_path / "in" / "new.txt").write_bytes(b"new")
+    listing = _listing(tmp_path, ListApi(["old.txt"]))
+    listing.refresh()
+    listing.apply_sync_results([
+        {"b2_key": "new.txt", "action": "upload", "status": "success", "file_id": "id-new"},
+        {"b2_key": "old.txt", "action": "delete", "status": "success"},
+    ], tmp_path / "in")
+    assert [(f.key, f.file_id, f.size) for f in listing.iter_files()] == [("new.txt", "id-new", 3)]
+    assert not listing.cache.get_meta("incomplete")
+
+    listing.apply_sync_results([{"b2_key": "new.txt", "action": "update", "status": "success"}], tmp_path / "in")
+    assert listing.cache.get_meta("incomplete")
+    listing.ensure_fresh(max_age_seconds=3600)
+    assert [f.key for f in listing.iter_files()] == ["old.txt"]
+    assert not listing.cache.get_meta("incomplete")
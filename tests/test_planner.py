@@ -0,0 +1,100 @@
+"""Tests for the streaming sync planner: scan order, excludes and merge decisions."""
+
+import os
+from pathlib import Path
+from typing import List, Optional
+
+from src.listing import RemoteFile
+from src.planner import LocalFile, merge_plan, scan_local, sorted_runs, summarize_plan
+
+
+def _local(key: str, size: int = 10, mtime_ms: int = 1000) -> LocalFile:
+    return LocalFile(key, f"/in/{key}", size, mtime_ms)
+
+
+def _remote(key: str, size: int = 10, src_mtime_ms: Optional[int] = 1000, src_size: Optional[int] = None) -> RemoteFile:
+    return RemoteFile(key=key, file_id=f"id-{key}", size=size, sha1="", upload_timestamp=5,
+                      src_mtime_ms=src_mtime_ms, src_size=src_size)
+
+
+def _write(path: Path, data: bytes = b"x") -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+
+def _actions(local: List[LocalFile], remote: List[RemoteFile], **kwargs) -> List[tuple]:
+    return [(entry['b2_key'], entry['action']) for entry in merge_plan(local, remote, **kwargs)]
+
+
+def test_scan_local_emits_keys_in_b2_order(tmp_path):
+    # '-' (0x2d) sorts before '/' (0x2f), so "a-b.txt" comes before the files under "a/"
+    for name in ["a/z.txt", "a-b.txt", "a/b/c.txt", "B.txt", "a.txt"]:
+        _write(tmp_path / name)
+    keys = [f.key for f in scan_local(tmp_path)]
+    assert keys == ["B.txt", "a-b.txt", "a.txt", "a/b/c.txt", "a/z.txt"]
+    assert keys == sorted(keys)
+
+
+def test_scan_local_skips_excluded_keys(tmp_path):
+    for name in ["keep.jpg", "tmp/scratch.jpg", "notes.tmp"]:
+        _write(tmp_path / name)
+    assert [f.key for f in scan_local(tmp_path, [r"tmp/", r".*\.tmp$"])] == ["keep.jpg"]
+
+
+def test_scan_local_records_size_and_path(tmp_path):
+    _write(tmp_path / "dir" / "file.bin", b"12345")
+    (entry,) = scan_local(tmp_path)
+    assert entry.size == 5
+    assert entry.path == str(tmp_path / "dir" / "file.bin")
+    assert entry.mtime_ms == int(os.stat(entry.path).st_mtime * 1000)
+
+
+def test_merge_plan_decides_each_key():
+    local = [_local("grown.txt", size=11), _local("new.txt"), _local("same.txt"),
+             _local("touched.txt", mtime_ms=2000)]
+    remote = [_remote("gone.txt"), _remote("grown.txt"), _remote("same.txt"), _remote("touched.txt")]
+    assert _actions(local, remote) == [("gone.txt", "delete"), ("grown.txt", "update"), ("new.txt", "upload"),
+                                       ("same.txt", "skip"), ("touched.txt", "update")]
+
+
+def test_merge_plan_without_delete_leaves_remote_only_keys():
+    assert _actions([_local("a.txt")], [_remote("a.txt"), _remote("b.txt")], delete=False) == [("a.txt", "skip")]
+
+
+def test_merge_plan_never_deletes_excluded_remote_keys():
+    plan = _actions([], [_remote("cache/x.bin"), _remote("old.txt")], exclude_patterns=[r"cache/"])
+    assert plan == [("old.txt", "delete")]
+
+
+def test_merge_plan_compares_optimized_uploads_with_their_source():
+    remote = _remote("cat.jpg", size=3, src_size=10)
+    assert _actions([_local("cat.jpg", size=10)], [remote]) == [("cat.jpg", "skip")]
+
+
+def test_merge_plan_falls_back_to_upload_timestamp_without_src_mtime():
+    remote = _remote("a.txt", src_mtime_ms=None)
+    assert _actions([_local("a.txt", mtime_ms=5)], [remote]) == [("a.txt", "skip")]
+    assert _actions([_local("a.txt", mtime_ms=6)], [remote]) == [("a.txt", "update")]
+
+
+def test_delete_entries_carry_the_file_id():
+    (entry,) = merge_plan([], [_remote("gone.txt", size=7)])
+    assert entry['file_id'] == "id-gone.txt"
+    assert entry['file_size_bytes'] == 7
+
+
+def test_summarize_plan_counts_transfer_bytes():
+    local = [_local("grown.txt", size=20), _local("new.txt", size=3), _local("same.txt")]
+    remote = [_remote("gone.txt", size=100), _remote("grown.txt"), _remote("same.txt")]
+    assert summarize_plan(merge_plan(local, remote)) == {'upload': 1, 'update': 1, 'delete': 1, 'skip': 1,
+                                                         'bytes_to_transfer': 23}
+
+
+def test_sorted_runs_spills_and_merges_in_order():
+    items = [(n * 7919 % 1000, f"item{n}") for n in range(1000)]
+    assert list(sorted_runs(items, key=lambda item: item[0], run_size=64)) == sorted(items)
+
+
+def test_sorted_runs_keeps_small_inputs_in_memory():
+    items = [("b",), ("a",), ("c",)]
+    assert list(sorted_runs(iter(items), key=lambda item: item[0], run_size=10)) == [("a",), ("b",), ("c",)]
@@ -0,0 +1,81 @@
+"""Tests for Restorer decisions about what to download."""
+
+import hashlib
+import io
+from pathlib import Path
+from typing import Dict, List
+
+from src.hashcache import HashCache
+from src.listing import RemoteFile
+from src.restore import Restorer
+
+ORIGINAL = b"original image bytes " * 64
+OPTIMIZED = b"smaller re-encode"
+
+
+def _sha1(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+class DownloadApi:
+    """Just enough of B2Api to serve whole-object downloads and record them."""
+
+    retry_attempts = 1
+
+    def __init__(self, objects: Dict[str, bytes]):
+        self.objects = objects
+        self.downloads: List[str] = []
+
+    def open_download(self, bucket_name: str, key: str, byte_range=None):
+        self.downloads.append(key)
+        return io.BytesIO(self.objects[key])
+
+    def reset_connections(self) -> None:
+        pass
+
+
+def _optimized_remote(key: str) -> RemoteFile:
+    return RemoteFile(key=key, file_id="id", size=len(OPTIMIZED), sha1=_sha1(OPTIMIZED), upload_timestamp=0,
+                      src_mtime_ms=None, src_size=len(ORIGINAL), src_sha1=_sha1(ORIGINAL))
+
+
+def _restore(tmp_path: Path, api: DownloadApi, remotes: List[RemoteFile]) -> Dict[str, str]:
+    target = tmp_path / "input"
+    target.mkdir(exist_ok=True)
+    restorer = Restorer(api, "bucket", target, HashCache.for_dir(tmp_path / "cache"), threads=2,
+                        part_size=1024 * 1024)
+    return {record['b2_key']: record['action'] for record in restorer.restore(remotes)}
+
+
+def test_original_of_an_optimized_upload_counts_as_present(tmp_path):
+    (tmp_path / "input").mkdir()
+    (tmp_path / "input" / "cat.jpg").write_bytes(ORIGINAL)
+    api = DownloadApi({"cat.jpg": OPTIMIZED})
+    assert _restore(tmp_path, api, [_optimized_remote("cat.jpg")]) == {"cat.jpg": "skip"}
+    assert api.downloads == []
+    assert (tmp_path / "input" / "cat.jpg").read_bytes() == ORIGINAL
+
+
+def test_optimized_copy_never_overwrites_a_local_file(tmp_path):
+    (tmp_path / "input").mkdir()
+    (tmp_path / "input" / "cat.jpg").write_bytes(b"edited locally")
+    api = DownloadApi({"cat.jpg": OPTIMIZED})
+    assert _restore(tmp_path, api, [_optimized_remote("cat.jpg")]) == {"cat.jpg": "optimized"}
+    assert api.downloads == []
+    assert (tmp_path / "input" / "cat.jpg").read_bytes() == b"edited locally"
+
+
+def test_missing_file_is_downloaded_even_when_optimized(tmp_path):
+    api = DownloadApi({"cat.jpg": OPTIMIZED})
+    assert _restore(tmp_path, api, [_optimized_remote("cat.jpg")]) == {"cat.jpg": "download"}
+    assert (tmp_path / "input" / "cat.jpg").read_bytes() == OPTIMIZED
+
+
+def test_changed_plain_upload_is_replaced(tmp_path):
+    (tmp_path / "input").mkdir()
+    (tmp_path / "input" / "notes.txt").write_bytes(b"stale")
+    remote = RemoteFile(key="notes.txt", file_id="id", size=len(ORIGINAL), sha1=_sha1(ORIGINAL),
+                        upload_timestamp=0, src_mtime_ms=None)
+    api = DownloadApi({"notes.txt": ORIGINAL})
+    assert _restore(tmp_path, api, [remote]) == {"notes.txt": "download"}
+    assert (tmp_path / "input" / "notes.txt").read_bytes() == ORIGINAL
@@ -0,0 +1,99 @@
+"""Tests for old-version retention windows and the pruner that applies them."""
+
+from typing import List, Set, Tuple
+
+from src.b2api import B2ApiError
+from src.retention import MILLIS_PER_DAY, RetentionPolicy, VersionPruner
+from src.versions import OldVersion, VersionedListingCache
+
+NOW_MS = 1000 * MILLIS_PER_DAY
+
+
+def _days_ago(days: float) -> int:
+    return int(NOW_MS - days * MILLIS_PER_DAY)
+
+
+def _versions(*superseded_days: float, key: str = "a.txt", hidden: bool = False) -> List[OldVersion]:
+    """Old versions of one key, newest first, superseded the given number of days ago."""
+    versions = [OldVersion(key, f"{key}-hide", 0, 'hide', 0, _days_ago(superseded_days[0]))] if hidden else []
+    versions += [OldVersion(key, f"{key}-v{n}", n + 1, 'upload', 10, _days_ago(days))
+                 for n, days in enumerate(superseded_days[1:] if hidden else superseded_days)]
+    return versions
+
+
+def _ids(versions: List[OldVersion]) -> List[str]:
+    return [v.file_id for v in versions]
+
+
+def test_disabled_policy():
+    assert not RetentionPolicy(0, 0).enabled
+    assert RetentionPolicy(0, 30).enabled
+
+
+def test_keep_versions_counts_the_live_version():
+    # Live version at position 0, old ones at 1..3: keeping 2 leaves only the newest old version
+    assert _ids(RetentionPolicy(2, 0).prunable(_versions(1, 2, 3), NOW_MS)) == ["a.txt-v1", "a.txt-v2"]
+
+
+def test_keep_days_keeps_versions_replaced_within_the_window():
+    assert _ids(RetentionPolicy(0, 7).prunable(_versions(1, 6.9, 7.1, 30), NOW_MS)) == ["a.txt-v2", "a.txt-v3"]
+
+
+def test_either_limit_keeps_a_version():
+    # Position 1 is kept by count, the 3-day-old one at position 2 by age
+    assert _ids(RetentionPolicy(2, 5).prunable(_versions(40, 3, 40), NOW_MS)) == ["a.txt-v2"]
+
+
+def test_hide_marker_goes_last_once_everything_under_it_is_gone():
+    doomed = RetentionPolicy(0, 7).prunable(_versions(30, 40, 50, hidden=True), NOW_MS)
+    assert _ids(doomed) == ["a.txt-v0", "a.txt-v1", "a.txt-hide"]
+
+
+def test_hide_marker_stays_while_a_version_under_it_is_kept():
+    doomed = RetentionPolicy(0, 7).prunable(_versions(30, 2, 50, hidden=True), NOW_MS)
+    assert _ids(doomed) == ["a.txt-v1"]
+
+
+def test_hide_marker_counts_as_the_first_kept_version():
+    doomed = RetentionPolicy(2, 0).prunable(_versions(1, 2, 3, hidden=True), NOW_MS)
+    assert _ids(doomed) == ["a.txt-v1"]
+
+
+class DeleteApi:
+    """Just enough of B2Api to delete file versions and record them."""
+
+    def __init__(self, missing: Set[str] = frozenset(), failing: Set[str] = frozenset()):
+        self.missing = missing
+        self.failing = failing
+        self.deleted: List[Tuple[str, str]] = []
+
+    def delete_file_version(self, key: str, file_id: str) -> None:
+        if file_id in self.failing:
+            raise B2ApiError(500, 'internal_error', "boom")
+        if file_id in self.missing:
+            raise B2ApiError(400, 'file_not_present', "gone")
+        self.deleted.append((key, file_id))
+
+
+def _pruner(tmp_path, api: DeleteApi, versions: List[OldVersion]) -> VersionPruner:
+    cache = VersionedListingCache.for_bucket(tmp_path, "bucket")
+    cache.add_old_versions(versions)
+    return VersionPruner(api, cache, RetentionPolicy(1, 0), threads=2)
+
+
+def test_pruner_deletes_and_forgets_old_versions(tmp_path):
+    api = DeleteApi(missing={"b.txt-v0"})
+    pruner = _pruner(tmp_path, api, _versions(1, 2, key="a.txt") + _versions(1, key="b.txt"))
+    records = {r['b2_key']: (r['status'], r['versions_pruned'], r['file_size_bytes']) for r in pruner.prune()}
+    assert records == {"a.txt": ("success", 2, 20), "b.txt": ("success", 1, 10)}
+    assert api.deleted == [("a.txt", "a.txt-v0"), ("a.txt", "a.txt-v1")]
+    assert list(pruner.cache.iter_old_versions()) == []
+
+
+def test_pruner_stops_a_key_at_the_first_failure(tmp_path):
+    api = DeleteApi(failing={"a.txt-v1"})
+    pruner = _pruner(tmp_path, api, _versions(30, 40, 50, hidden=True))
+    (record,) = pruner.prune()
+    assert (record['status'], record['versions_pruned'], record['error_type']) == ("failed", 1, "B2ApiError")
+    # The hide marker stays, so the version that could not be deleted is never exposed
+    assert _ids(list(pruner.cache.iter_old_versions())) == ["a.txt-hide", "a.txt-v1"]
@@ -0,0 +1,107 @@
+"""Tests for the streaming run log writer: formats, compression and stats."""
+
+import gzip
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+import src.runlog as runlog
+from src.runlog import RunLogWriter
+from src.utils import generate_json_log
+
+RECORDS = [
+    {'local_path': '', 'b2_key': 'a.txt', 'action': 'upload', 'status': 'success', 'file_size_bytes': 5},
+    {'local_path': '', 'b2_key': 'b.txt', 'action': 'update', 'status': 'failed', 'error_type': 'Boom'},
+    {'local_path': '', 'b2_key': 'c.txt', 'action': 'delete', 'status': 'success'},
+    {'local_path': '', 'b2_key': 'd.txt', 'action': 'prune', 'status': 'success', 'versions_pruned': 3},
+]
+ERRORS = [{'file': 'b.txt', 'error_type': 'Boom', 'error_message': 'it broke'}]
+
+
+def _write(path: Path, records: List[Dict[str, Any]], **kwargs) -> RunLogWriter:
+    with RunLogWriter(path, **kwargs) as writer:
+        for record in records:
+            writer.write_file(dict(record))
+        writer.finish(ERRORS, {"operation": "sync", **writer.stats})
+    return writer
+
+
+def _ndjson(text: str) -> List[Dict[str, Any]]:
+    return [json.loads(line) for line in text.splitlines()]
+
+
+def test_json_log_puts_metadata_after_records_and_errors(tmp_path):
+    writer = _write(tmp_path / "run_log", RECORDS)
+    assert writer.path == tmp_path / "run_log.json"
+    document = json.loads(writer.path.read_text())
+    assert list(document) == ["files_processed", "errors", "run_metadata"]
+    assert [r['b2_key'] for r in document['files_processed']] == ['a.txt', 'b.txt', 'c.txt', 'd.txt']
+    assert document['errors'] == ERRORS
+    assert document['run_metadata'] == {"operation": "sync", "total_files": 4, "files_uploaded": 1,
+                                        "files_updated": 1, "files_deleted": 1, "files_skipped": 0,
+                                        "files_failed": 1, "versions_pruned": 3}
+
+
+def test_empty_json_log_is_valid(tmp_path):
+    writer = _write(tmp_path / "run_log", [])
+    document = json.loads(writer.path.read_text())
+    assert document['files_processed'] == []
+    assert document['run_metadata']['total_files'] == 0
+
+
+def test_ndjson_log_writes_one_object_per_line(tmp_path):
+    writer = _write(tmp_path / "run_log", RECORDS, log_format="ndjson")
+    lines = _ndjson(writer.path.read_text())
+    assert writer.path.name == "run_log.ndjson"
+    assert [list(line)[0] for line in lines] == ["file"] * 4 + ["error", "run_metadata"]
+    assert lines[-1]["run_metadata"]["files_failed"] == 1
+
+
+def test_gzip_log_round_trips(tmp_path):
+    writer = _write(tmp_path / "run_log", RECORDS, log_format="ndjson", compression="gzip")
+    assert writer.path.name == "run_log.ndjson.gz"
+    with gzip.open(writer.path, 'rt') as f:
+        assert len(_ndjson(f.read())) == 6
+
+
+def test_zstd_log_round_trips(tmp_path):
+    zstandard = pytest.importorskip("zstandard")
+    writer = _write(tmp_path / "run_log", RECORDS, compression="zstd")
+    assert writer.path.name == "run_log.json.zst"
+    with zstandard.ZstdDecompressor().stream_reader(open(writer.path, 'rb')) as reader:
+        assert json.loads(reader.read())['run_metadata']['total_files'] == 4
+
+
+def test_zstd_falls_back_to_gzip_when_unavailable(tmp_path, monkeypatch):
+    monkeypatch.setattr(runlog, "ZSTD_AVAILABLE", False)
+    writer = _write(tmp_path / "run_log", RECORDS, compression="zstd")
+    assert writer.path.name == "run_log.json.gz"
+    with gzip.open(writer.path, 'rt') as f:
+        assert json.load(f)['run_metadata']['total_files'] == 4
+
+
+def test_unknown_format_or_compression_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        RunLogWriter(tmp_path / "run_log", log_format="xml")
+    with pytest.raises(ValueError):
+        RunLogWriter(tmp_path / "run_log", compression="lz4")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_upload_size_is_taken_from_the_file_when_not_recorded(tmp_path):
+    local = tmp_path / "big.bin"
+    local.write_bytes(b"x" * 123)
+    writer = _write(tmp_path / "run_log", [{'local_path': str(local), 'b2_key': 'big.bin', 'action': 'upload',
+                                             'status': 'success'}])
+    assert json.loads(writer.path.read_text())['files_processed'][0]['file_size_bytes'] == 123
+
+
+def test_generate_json_log_streams_a_generator(tmp_path):
+    path = generate_json_log(tmp_path, "verify", (dict(r) for r in RECORDS), ERRORS, 1.5,
+                             log_format="ndjson", compression="gzip", bucket_name="bucket")
+    assert path.name.endswith("_verify_log.ndjson.gz")
+    with gzip.open(path, 'rt') as f:
+        metadata = _ndjson(f.read())[-1]["run_metadata"]
+    assert (metadata["operation"], metadata["bucket_name"], metadata["total_files"]) == ("verify", "bucket", 4)
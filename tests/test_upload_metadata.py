@@ -0,0 +1,74 @@
+"""Tests for upload metadata rules applied by FileUploader."""
+
+import json
+from typing import Any, Dict, List
+
+from src.metadata import AUTO_CONTENT_TYPE, UploadMetadata
+from src.upload import FileUploader
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+RULES = [
+    {"pattern": ".*", "content_type": "auto"},
+    {"pattern": "renders/.*", "cache_control": "public, max-age=86400", "content_disposition": "inline"},
+]
+
+
+class RecordingApi:
+    """Just enough of B2Api to accept single-part uploads and record their headers."""
+
+    retry_attempts = 1
+    recommended_part_size = 100 * 1024 * 1024
+
+    def __init__(self):
+        self.uploads: List[Dict[str, str]] = []
+
+    def get_bucket_id(self, bucket_name: str) -> str:
+        return "bucket-id"
+
+    def get_upload_url(self, bucket_id: str) -> Dict[str, str]:
+        return {"uploadUrl": "https://upload.example/b2api/v2/b2_upload_file", "authorizationToken": "token"}
+
+    def request(self, method: str, url: str, headers: Dict[str, str], body: Any):
+        payload = b"".join(body)
+        self.uploads.append(headers)
+        return 200, {}, json.dumps({"fileId": "file-1", "contentLength": len(payload)}).encode()
+
+
+def _uploader(rules: List[Dict[str, str]]) -> FileUploader:
+    return FileUploader(RecordingApi(), "bucket", metadata=UploadMetadata(rules))
+
+
+def test_upload_bytes_applies_rules_and_sniffs_content_type():
+    uploader = _uploader(RULES)
+    uploader.upload_bytes(PNG_BYTES, "renders/001")
+    headers = uploader.api.uploads[0]
+    assert headers["Content-Type"] == "image/png"
+    assert headers["X-Bz-Info-b2-cache-control"] == "public%2C%20max-age%3D86400"
+    assert headers["X-Bz-Info-b2-content-disposition"] == "inline"
+
+
+def test_upload_bytes_keeps_explicit_content_type_and_file_info():
+    uploader = _uploader(RULES)
+    uploader.upload_bytes(PNG_BYTES, "renders/002.png", {"b2-cache-control": "no-store"}, "image/x-custom")
+    headers = uploader.api.uploads[0]
+    assert headers["Content-Type"] == "image/x-custom"
+    assert headers["X-Bz-Info-b2-cache-control"] == "no-store"
+
+
+def test_upload_bytes_without_matching_rule_leaves_headers_alone():
+    uploader = _uploader([{"pattern": "renders/.*", "cache_control": "no-cache"}])
+    uploader.upload_bytes(PNG_BYTES, "other/003")
+    headers = uploader.api.uploads[0]
+    assert headers["Content-Type"] == AUTO_CONTENT_TYPE
+    assert not any(name.startswith("X-Bz-Info-b2-") for name in headers)
+
+
+def test_upload_file_and_upload_bytes_resolve_the_same_headers(tmp_path):
+    path = tmp_path / "004"
+    path.write_bytes(PNG_BYTES)
+    uploader = _uploader(RULES)
+    uploader.upload_file(path, "renders/004")
+    uploader.upload_bytes(PNG_BYTES, "renders/004")
+    from_file, from_bytes = uploader.api.uploads
+    assert from_file["Content-Type"] == from_bytes["Content-Type"] == "image/png"
+    assert from_file["X-Bz-Info-b2-cache-control"] == from_bytes["X-Bz-Info-b2-cache-control"]